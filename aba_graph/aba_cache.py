@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+
+import numpy as np
+
+from instrument import count
+
+cache_path = "./.cache/aba_frameworks.sqlite"
+#part of every key: bump it when the derivation or the entry format changes, the
+#entries of older versions are then never read again and age out of the cache
+CACHE_VERSION = 1
+#hits whose last_used update is delayed, written together in one transaction
+TOUCH_BATCH = 256
+#eviction goes down to this fraction of the bounds, so that it does not run on every put
+EVICT_TO = 0.9
+
+SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS frameworks (
+    key TEXT PRIMARY KEY, entry BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS frameworks_last_used ON frameworks (last_used);
+-- running totals, kept by triggers so that every process sharing the file sees them
+CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER NOT NULL, bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM frameworks;
+CREATE TRIGGER IF NOT EXISTS frameworks_insert AFTER INSERT ON frameworks BEGIN
+    UPDATE totals SET entries = entries + 1, bytes = bytes + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS frameworks_delete AFTER DELETE ON frameworks BEGIN
+    UPDATE totals SET entries = entries - 1, bytes = bytes - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS frameworks_update AFTER UPDATE OF size ON frameworks BEGIN
+    UPDATE totals SET bytes = bytes - OLD.size + NEW.size;
+END;
+COMMIT;
+"""
+
+
+def canonical_key(assumptions, rules, contraries):
+    """
+    sha256 of a framework, independent of the order of its assumptions, rules,
+    rule bodies and contraries, and of duplicated rules. rules are (head, body) pairs.
+    Only the contraries of assumptions matter for the arguments and the attacks,
+    and the language does not. CACHE_VERSION is hashed with the framework.
+    """
+    assumptions = sorted(set(assumptions))
+    payload = [
+        CACHE_VERSION,
+        assumptions,
+        sorted({(head, tuple(sorted(set(body)))) for head, body in rules}),
+        sorted((a, contraries[a]) for a in assumptions if a in contraries),
+    ]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def framework_key(aba_framework):
+    """
+    Key of a py_arg ABAF or of an ABA_Graph.
+    """
+    rules = ((rule.head, rule.body) for rule in aba_framework.rules)
+    return canonical_key(aba_framework.assumptions, rules, aba_framework.contraries)
+
+
+def graph_key(graph):
+    """
+    Key of a graph in the JSON format of gen_graph.py.
+    """
+    rules = ((rule["head"], rule["body"]) for rule in graph.get("rules", []))
+    return canonical_key(graph.get("assumptions", []), rules, graph.get("contraries", {}))
+
+
+def pack_entry(entry):
+    """
+    Pickles an entry with the supports as assumption ids and the defeats as an
+    int array: unpickling thousands of frozensets and tuples is slower than
+    deriving the arguments again.
+    """
+    arguments = entry["arguments"]
+    vocabulary = sorted(set().union(*(support for support, _ in arguments)))
+    ids = {a: i for i, a in enumerate(vocabulary)}
+    supports = [[ids[a] for a in support] for support, _ in arguments]
+    packed = {
+        "vocabulary": vocabulary,
+        "conclusions": [conclusion for _, conclusion in arguments],
+        "support_ids": np.array([i for support in supports for i in support], dtype=np.int32),
+        "support_sizes": np.array([len(support) for support in supports], dtype=np.int32),
+        "defeats": np.array(entry["defeats"], dtype=np.int32).reshape(-1, 2),
+        "extensions": {semantics: [sorted(ext) for ext in extensions]
+                       for semantics, extensions in entry["extensions"].items()},
+    }
+    return pickle.dumps(packed, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def unpack_entry(blob):
+    packed = pickle.loads(blob)
+    vocabulary = packed["vocabulary"]
+    support_ids = packed["support_ids"].tolist()
+    arguments, start = [], 0
+    for conclusion, size in zip(packed["conclusions"], packed["support_sizes"].tolist()):
+        arguments.append((frozenset([vocabulary[i] for i in support_ids[start:start + size]]), conclusion))
+        start += size
+    return {
+        "arguments": arguments,
+        "defeats": list(map(tuple, packed["defeats"].tolist())),
+        "extensions": {semantics: {frozenset(ext) for ext in extensions}
+                       for semantics, extensions in packed["extensions"].items()},
+    }
+
+
+class FrameworkCache:
+    """
+    Persistent cache of what ABA_Graph derives from a framework, keyed by its
+    canonical key: {"arguments": [(support, conclusion)], "defeats": [(i, j)],
+    "extensions": {semantics: set of frozensets}}, packed in a SQLite table.
+    Least recently used entries are evicted beyond max_entries or max_bytes of
+    pickled entries. Several processes can share the same file: a hit only
+    delays its last_used update (written with the next put, every TOUCH_BATCH hits
+    and on close), so that reads do not take the write lock.
+    """
+    def __init__(self, path=cache_path, max_entries=100_000, max_bytes=512 * 2 ** 20):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        #key -> time of the hits not written yet
+        self.touched = {}
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=60)
+        #readers do not block the writer of another worker
+        self.db.execute("PRAGMA journal_mode=WAL")
+        #a cache can lose its last writes on a power failure, not its consistency
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+
+    def get(self, key, semantics=None):
+        """
+        Entry of key, None on a miss. With semantics, an entry without the
+        extensions of that semantics is a partial hit: its arguments and defeats
+        are reused, the caller computes and puts the extensions.
+        """
+        row = self.db.execute("SELECT entry FROM frameworks WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            count("cache_misses")
+            return None
+        entry = unpack_entry(row[0])
+        if semantics is not None and semantics not in entry["extensions"]:
+            self.partial_hits += 1
+            count("cache_partial_hits")
+        else:
+            self.hits += 1
+            count("cache_hits")
+        self.touched[key] = time.time()
+        if len(self.touched) >= TOUCH_BATCH:
+            with self.db:
+                self.flush_touched()
+        return entry
+
+
+    def flush_touched(self):
+        """
+        Writes the delayed last_used updates, inside the caller's transaction.
+        """
+        if self.touched:
+            self.db.executemany("UPDATE frameworks SET last_used = ? WHERE key = ?",
+                                [(last_used, key) for key, last_used in self.touched.items()])
+            self.touched = {}
+
+
+    def put(self, key, entry):
+        blob = pack_entry(entry)
+        with self.db:
+            self.flush_touched()
+            self.db.execute("""INSERT INTO frameworks VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE
+                SET entry = excluded.entry, size = excluded.size, last_used = excluded.last_used""",
+                            (key, blob, len(blob), time.time()))
+            self.evict()
+
+
+    def totals(self):
+        return self.db.execute("SELECT entries, bytes FROM totals").fetchone()
+
+
+    def evict(self):
+        entries, size = self.totals()
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return
+        #oldest first, in batches sized from the mean entry, down to EVICT_TO of both bounds
+        max_entries, max_bytes = int(self.max_entries * EVICT_TO), int(self.max_bytes * EVICT_TO)
+        evicted = 0
+        while entries > max_entries or size > max_bytes:
+            n = max(entries - max_entries, -(-(size - max_bytes) * entries // max(size, 1)), 1)
+            evicted += self.db.execute("""DELETE FROM frameworks WHERE key IN
+                (SELECT key FROM frameworks ORDER BY last_used LIMIT ?)""", (n,)).rowcount
+            entries, size = self.totals()
+        self.evictions += evicted
+        count("cache_evictions", evicted)
+
+
+    def stats(self):
+        entries, size = self.totals()
+        lookups = self.hits + self.partial_hits + self.misses
+        return {
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+    def clear(self):
+        with self.db:
+            self.touched = {}
+            self.db.execute("DELETE FROM frameworks")
+
+
+    def close(self):
+        with self.db:
+            self.flush_touched()
+        self.db.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,28 +1,54 @@
-from py_arg.aba_classes.rule import Rule
-from py_arg.aba_classes.aba_framework import ABAF
 from py_arg.aba_classes.semantics.get_preferred_extensions import get_preferred_extensions
 from py_arg.abstract_argumentation_classes.abstract_argumentation_framework import AbstractArgumentationFramework
 from py_arg.abstract_argumentation_classes.argument import Argument
 from py_arg.abstract_argumentation_classes.defeat import Defeat
+from semantics import BitsetAF, iter_bits
+from instrument import count, timed
+from compact import ArgumentSet, CompactFramework
 
+from collections import defaultdict, deque
 import json
+import numpy as np
 import matplotlib.pyplot as plt
 import networkx as nx
+from scipy.sparse import csr_matrix
 import random
 import sys 
 import os
 
 
+EMPTY_FRAMEWORK = CompactFramework()
+
+
 class ABA_Graph:
-    def __init__(self):
-        # Set of logical symbols
-        self.language = set()
-        # Set of inference rules
-        self.rules = set()
-        # Set of assumptions
-        self.assumptions = set()
-        # Contrary functions
-        self.contraries = {}
+    # integer-encoded framework (see compact.py), the py_arg objects are only
+    # built at the boundary
+    __slots__ = ("framework", "cache")
+
+    def __init__(self, cache=None):
+        self.framework = EMPTY_FRAMEWORK
+        # FrameworkCache of the derived arguments, attacks and extensions (None: always computed)
+        self.cache = cache
+
+
+    # the sets below are new copies, changing them does not change the graph
+    # (load_json does)
+
+    # Set of logical symbols
+    def language_set(self):
+        return self.framework.language_set()
+
+    # Set of inference rules
+    def rule_set(self):
+        return self.framework.rule_set()
+
+    # Set of assumptions
+    def assumption_set(self):
+        return self.framework.assumption_set()
+
+    # Contrary functions
+    def contrary_dict(self):
+        return self.framework.contrary_dict()
         
 
     def load_json(self, json_data):
@@ -31,15 +57,7 @@ class ABA_Graph:
         """
 
         data = json.loads(json_data) if isinstance(json_data, str) else json_data
-        
-        self.language = set(data.get('language', []))
-        self.assumptions = set(data.get('assumptions', []))
-        self.contraries = data.get('contraries', {})
-
-        self.rules = {
-            Rule(f'Rule_{i+1}', set(rule['body']), rule['head'])
-            for i, rule in enumerate(data.get('rules', []))
-        }
+        self.framework = CompactFramework.from_json(data)
 
         return True
 
@@ -48,7 +66,18 @@ class ABA_Graph:
         """
         Building an ABA framework
         """
-        return ABAF(self.assumptions, self.rules, self.language, self.contraries)
+        return self.framework.to_abaf()
+
+
+    def compact(self, aba_framework):
+        """
+        CompactFramework of aba_framework: the one of this graph when given the graph
+        itself, else an encoding of the ABAF (nothing is kept of it, so changes made
+        to it since create_aba_framework are seen).
+        """
+        if aba_framework is self:
+            return self.framework
+        return CompactFramework.from_abaf(aba_framework)
     
     
     def aba_to_aaf(self, aba_framework):
@@ -57,81 +86,234 @@ class ABA_Graph:
         """
         # ABA argument creation: generates all the arguments of the ABA framework
         # Support: set of assumptions used and conclusion: deduced formula
-        aba_arguments = self.generate_arguments_from_framework(aba_framework)
+        aba_arguments, attacks, _ = self.derive(aba_framework)
         
         # Creation of abstract arguments
         abstract_arguments = []
         for support, conclusion in aba_arguments:
-            arg_name = f"{', '.join(support)} ⊢ {conclusion}" if support else conclusion
-            abstract_arguments.append(Argument(arg_name))
+            abstract_arguments.append(Argument(self.argument_name(support, conclusion)))
         
         # Creation of attacks
-        defeats = []
-        # Comparaison of each pair of ABA arguments
-        #i is the opponent and j is the proponent
-        for i, (support_i, conclusion_i) in enumerate(aba_arguments):
-            for j, (support_j, conclusion_j) in enumerate(aba_arguments):
-                # Checks if conclusion_i is the opposite of an assumption in support_j
-                for assumption in support_j:
-                    # If the argument i concludes ¬a 
-                    # And that a is an assumption used in the support of argument j
-                    # Then i attacks j (undercut)
-                    if assumption in aba_framework.contraries and aba_framework.contraries[assumption] == conclusion_i:
-                        # We therefore add an attack from argument i to j
-                        defeats.append(Defeat(abstract_arguments[i], abstract_arguments[j]))
+        defeats = [
+            Defeat(abstract_arguments[i], abstract_arguments[j])
+            for i, j in attacks
+        ]
         
         return AbstractArgumentationFramework('ABA_AF', abstract_arguments, defeats)
     
 
+    @staticmethod
+    def argument_name(support, conclusion):
+        return f"{', '.join(sorted(support))} ⊢ {conclusion}" if support else conclusion
+    
+
+    def compute_attacks(self, aba_arguments, aba_framework):
+        """
+        Computes the attacks between ABA arguments as sorted (i, j) index pairs:
+        argument i attacks argument j if i concludes the contrary of an assumption
+        in the support of j (undercut).
+        """
+        framework = self.compact(aba_framework)
+        return self.compact_attacks(framework, ArgumentSet.from_tuples(aba_arguments, framework))
+
+
+    @timed("compute_attacks")
+    def compact_attacks(self, framework, arguments):
+        """
+        compute_attacks on an ArgumentSet. Instead of comparing every pair of
+        arguments, two inverted indexes are joined on the assumptions: contrary
+        literal -> attacking arguments and assumption -> attacked arguments.
+        """
+        # conclusion -> arguments concluding it (i is the opponent)
+        attackers_by_conclusion = defaultdict(list)
+        for idx, conclusion in enumerate(arguments.conclusions):
+            attackers_by_conclusion[conclusion].append(idx)
+
+        # only the assumptions whose contrary is concluded can be attacked
+        attackable = 0
+        for assumption, contrary in enumerate(framework.contrary_of):
+            if contrary in attackers_by_conclusion:
+                attackable |= 1 << assumption
+
+        # assumption -> arguments whose support uses it (j is the proponent)
+        attacked_by_assumption = defaultdict(list)
+        for idx, support in enumerate(arguments.supports):
+            mask = support & attackable
+            while mask:
+                low_bit = mask & -mask
+                attacked_by_assumption[low_bit.bit_length() - 1].append(idx)
+                mask ^= low_bit
+
+        attacks = set()
+        for assumption, attacked in attacked_by_assumption.items():
+            attackers = attackers_by_conclusion[framework.contrary_of[assumption]]
+            attacks.update((i, j) for i in attackers for j in attacked)
+
+        count("defeats_emitted", len(attacks))
+        return sorted(attacks)
+    
+
+    def aba_to_adjacency(self, aba_framework):
+        """
+        Sparse alternative to aba_to_aaf that skips the py_arg objects.
+        Returns the ABA arguments and a CSR matrix where entry (i, j) is 1 if
+        argument i attacks argument j.
+        """
+        aba_arguments, attacks, _ = self.derive(aba_framework)
+
+        n = len(aba_arguments)
+        rows = np.fromiter((i for i, _ in attacks), dtype=np.int32, count=len(attacks))
+        cols = np.fromiter((j for _, j in attacks), dtype=np.int32, count=len(attacks))
+        data = np.ones(len(attacks), dtype=np.int8)
+        adjacency = csr_matrix((data, (rows, cols)), shape=(n, n))
+
+        return aba_arguments, adjacency
+    
+
     def generate_arguments_from_framework(self, aba_framework):
         """
         Generates all possible arguments from the ABA framework.
         Each argument is represented as a tuple: (support, conclusion).
 
-        Support: set of assumptions {a_1, a_2, ..., a_n}
+        Support: frozenset of assumptions {a_1, a_2, ..., a_n}
         Conclusion: deduction using rules and assumptions
         """
+        framework = self.compact(aba_framework)
+        return self.compact_arguments(framework).to_tuples(framework)
 
-        arguments = []
-        
-        for assumption in aba_framework.assumptions:
-            arguments.append(({assumption}, assumption))
-        
-        changed = True
-        while changed:
-            changed = False
-            new_arguments = []
-            
-            for rule in aba_framework.rules:
-                # Checks whether all the premises can be supported
-                supported_premises = []
-                for premise in rule.body:
-                    found = False
-                    for support, conclusion in arguments:
-                        if conclusion == premise:
-                            supported_premises.append((support, conclusion))
-                            found = True
-                            break
-                    if not found:
-                        break
-                
-                if len(supported_premises) == len(rule.body):
-                    # All premises are supported, we can create a new argument
-                    new_support = set()
-                    for s, _ in supported_premises:
-                        new_support.update(s)
-                    
-                    # Verifying if it's a new argument
-                    new_arg = (new_support, rule.head)
-                    if new_arg not in arguments:
-                        new_arguments.append(new_arg)
-                        changed = True
-            arguments.extend(new_arguments)
 
+    @timed("generate_arguments")
+    def compact_arguments(self, framework):
+        """
+        generate_arguments_from_framework as an ArgumentSet, supports are bitmasks.
+
+        Semi-naive fixpoint: arguments are indexed by conclusion and rules by
+        body literal, so a rule is only re-fired when one of its premises gains
+        a new argument, with every combination of supports for the other premises.
+        """
+        arguments = ArgumentSet()
+        supports, conclusions = arguments.supports, arguments.conclusions
+        # conclusion id -> supports already derived for it
+        # (a dict as an ordered set, so the argument order does not depend on hashing)
+        supports_by_conclusion = [{} for _ in framework.names]
+        # body literal -> rules using it as a premise
+        rules_by_premise = [[] for _ in framework.names]
+        worklist = deque()
+
+        def add_argument(support, conclusion):
+            known = supports_by_conclusion[conclusion]
+            if support not in known:
+                known[support] = None
+                supports.append(support)
+                conclusions.append(conclusion)
+                worklist.append((support, conclusion))
+
+        # the assumptions are the first ids, in name order
+        for assumption in range(framework.n_assumptions):
+            add_argument(1 << assumption, assumption)
+
+        for head, body in framework.rules:
+            if not body:
+                # facts hold without any assumption
+                add_argument(0, head)
+            for premise in body:
+                rules_by_premise[premise].append((head, body))
+
+        while worklist:
+            support, premise = worklist.popleft()
+            for head, body in rules_by_premise[premise]:
+                # the new argument fills this premise, every known argument the others,
+                # all the unions are built before adding any (the head may itself be
+                # one of the premises)
+                masks = [support]
+                for other in body:
+                    if other != premise:
+                        masks = [mask | s for mask in masks for s in supports_by_conclusion[other]]
+                for mask in masks:
+                    add_argument(mask, head)
+
+        count("arguments_generated", len(arguments))
         return arguments
     
 
-    def visualize(self, aba_framework, show_extensions=True):
+    def get_extensions(self, aba_framework, semantics="preferred"):
+        """
+        Computes the extensions of the ABA framework with the bitset solver of
+        semantics.py (grounded, complete, stable or preferred).
+        Same output as py_arg's ABA semantics: a set of frozensets of assumptions.
+        """
+        if self.cache is not None:
+            return self.derive(aba_framework, semantics)[2]
+        framework = self.compact(aba_framework)
+        arguments = self.compact_arguments(framework)
+        attacks = self.compact_attacks(framework, arguments)
+        return self.compact_extensions(framework, arguments, attacks, semantics)
+    
+
+    def derive(self, aba_framework, semantics=None):
+        """
+        Returns (arguments, attacks, extensions) of the framework, extensions is
+        None without semantics. With a cache, what was already derived for the same
+        framework (same canonical key, see aba_cache.py) is read from it and the
+        rest is computed and stored.
+        """
+        framework = self.compact(aba_framework)
+        if self.cache is None:
+            arguments = self.compact_arguments(framework)
+            attacks = self.compact_attacks(framework, arguments)
+            extensions = None
+            if semantics is not None:
+                extensions = self.compact_extensions(framework, arguments, attacks, semantics)
+            return arguments.to_tuples(framework), attacks, extensions
+
+        key = framework.key()
+        entry = self.cache.get(key, semantics)
+        changed = entry is None
+        arguments = None
+        if entry is None:
+            arguments = self.compact_arguments(framework)
+            attacks = self.compact_attacks(framework, arguments)
+            entry = {"arguments": arguments.to_tuples(framework), "defeats": attacks, "extensions": {}}
+        if semantics is not None and semantics not in entry["extensions"]:
+            if arguments is None:
+                arguments = ArgumentSet.from_tuples(entry["arguments"], framework)
+            entry["extensions"][semantics] = self.compact_extensions(framework, arguments, entry["defeats"], semantics)
+            changed = True
+        if changed:
+            self.cache.put(key, entry)
+        return entry["arguments"], entry["defeats"], entry["extensions"].get(semantics)
+    
+
+    def solve_extensions(self, aba_arguments, attacks, aba_framework, semantics="preferred"):
+        """
+        Same as get_extensions, from arguments and attacks that were already computed.
+        """
+        framework = self.compact(aba_framework)
+        return self.compact_extensions(framework, ArgumentSet.from_tuples(aba_arguments, framework), attacks, semantics)
+
+
+    @timed("solve_extensions")
+    def compact_extensions(self, framework, arguments, attacks, semantics="preferred"):
+        bitset_af = BitsetAF(len(arguments), attacks)
+
+        if semantics == "grounded":
+            masks = [bitset_af.grounded()]
+        elif semantics in ("complete", "stable", "preferred"):
+            masks = getattr(bitset_af, semantics)()
+        else:
+            raise ValueError(f"Unknown semantics: {semantics}")
+
+        # an assumption is accepted when its own argument ({a}, a) is
+        assumption_args = {
+            idx: framework.names[conclusion]
+            for idx, (support, conclusion) in enumerate(zip(arguments.supports, arguments.conclusions))
+            if conclusion < framework.n_assumptions and support == 1 << conclusion
+        }
+        assumption_mask = sum(1 << idx for idx in assumption_args)
+        return {frozenset(assumption_args[idx] for idx in iter_bits(mask & assumption_mask)) for mask in masks}
+    
+
+    def visualize(self, aba_framework, show_extensions=True, solver="native"):
         af = self.aba_to_aaf(aba_framework)
         
         G = nx.DiGraph()
@@ -161,7 +343,10 @@ class ABA_Graph:
         
         # Showing the extensions
         if show_extensions:
-            extensions = get_preferred_extensions(aba_framework)
+            if solver == "py_arg":
+                extensions = get_preferred_extensions(aba_framework)
+            else:
+                extensions = self.get_extensions(aba_framework, "preferred")
             ext_text = "\n".join([f"Extension {i+1}: {ext}" 
                                 for i, ext in enumerate(extensions)])
             plt.figtext(0.5, 0.01, f"Preferred Extensions:\n{ext_text}", 
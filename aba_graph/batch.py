@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing.util import Finalize
+
+from aba_cache import FrameworkCache, cache_path
+from aba_graph import ABA_Graph
+from graph_io import iter_graphs
+from instrument import count, stage
+
+
+#graphs per task when --chunksize is not given, the input is streamed so its size is unknown
+DEFAULT_CHUNKSIZE = 16
+#chunks submitted ahead per worker, bounds the graphs held in memory
+CHUNKS_PER_WORKER = 4
+
+
+#load_json -> create_aba_framework -> aba_to_aaf -> extensions for one graph
+def process_graph(name, aba, semantics="preferred", validate=True, cache=None):
+    timings = {}
+    record = {"file": name}
+
+    start = time.perf_counter()
+    build = ABA_Graph(cache)
+    build.load_json(aba)
+    timings["load"] = time.perf_counter() - start
+
+    # py_arg's checks only, the stages below use the graph's CompactFramework
+    # (skipped with validate=False)
+    start = time.perf_counter()
+    if validate:
+        try:
+            build.create_aba_framework()
+        except ValueError as e:
+            record["error"] = str(e)
+            record["timings"] = timings
+            return record
+    timings["framework"] = time.perf_counter() - start
+
+    if cache is not None:
+        # arguments, attacks and extensions in one cache lookup
+        start = time.perf_counter()
+        hits, partial_hits = cache.hits, cache.partial_hits
+        aba_arguments, attacks, extensions = build.derive(build, semantics)
+        timings["derive"] = time.perf_counter() - start
+        #partial: the arguments and defeats were cached, not the extensions of this semantics
+        if cache.hits > hits:
+            record["cache"] = "hit"
+        elif cache.partial_hits > partial_hits:
+            record["cache"] = "partial"
+        else:
+            record["cache"] = "miss"
+    else:
+        # the ArgumentSet goes from stage to stage, names are only built for the record
+        framework = build.framework
+        start = time.perf_counter()
+        arguments = build.compact_arguments(framework)
+        timings["arguments"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        attacks = build.compact_attacks(framework, arguments)
+        timings["attacks"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        extensions = build.compact_extensions(framework, arguments, attacks, semantics)
+        timings["extensions"] = time.perf_counter() - start
+        aba_arguments = arguments.to_tuples(framework)
+
+    record["arguments"] = [build.argument_name(s, c) for s, c in aba_arguments]
+    record["defeats"] = attacks
+    record["semantics"] = semantics
+    record["extensions"] = sorted(sorted(ext) for ext in extensions)
+    timings["total"] = sum(timings.values())
+    record["timings"] = timings
+    return record
+
+
+#the framework cache of a worker process, one SQLite connection per worker
+_worker_cache = None
+
+
+def init_worker(cache_args):
+    global _worker_cache
+    if cache_args is not None:
+        _worker_cache = FrameworkCache(*cache_args)
+        #the pool does not run atexit in its workers, close (and write the delayed
+        #last_used updates) when the worker exits
+        Finalize(_worker_cache, _worker_cache.close, exitpriority=10)
+
+
+def process_chunk(tasks):
+    return [process_graph(*task, cache=_worker_cache) for task in tasks]
+
+
+def iter_records(pool, tasks, chunksize, workers):
+    """
+    Records of the tasks in input order. Chunks are submitted as the tasks are read,
+    at most CHUNKS_PER_WORKER per worker ahead of the one being written, so the
+    graphs are never all in memory (pool.map would read them all first).
+    """
+    pending = deque()
+    while True:
+        while len(pending) < workers * CHUNKS_PER_WORKER:
+            chunk = list(islice(tasks, chunksize))
+            if not chunk:
+                break
+            pending.append(pool.submit(process_chunk, chunk))
+        if not pending:
+            return
+        yield from pending.popleft().result()
+
+
+def run_batch(input_dir, output_path, semantics="preferred", validate=True, workers=None, chunksize=None,
+              cache_args=None):
+    """
+    Runs the pipeline on every graph of input_dir (JSON Lines shards or *.json files)
+    with a process pool and writes one JSON line per graph to output_path, in input order.
+    The graphs are streamed to the workers chunksize at a time as they are read.
+    cache_args (path, max entries, max bytes) enables the framework cache of aba_cache.py.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunksize = chunksize or DEFAULT_CHUNKSIZE
+
+    tasks = ((name, aba, semantics, validate) for name, aba in iter_graphs(input_dir))
+    stats = {"files": 0, "errors": 0, "time": 0.0, "slowest": [], "cache_hits": 0,
+             "cache_partial_hits": 0, "cache_misses": 0}
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cache_args,)) as pool, \
+            open(output_path, "w") as out:
+        # records come in submission order, so the output does not depend on scheduling
+        for record in iter_records(pool, tasks, chunksize, workers):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            stats["files"] += 1
+            if "error" in record:
+                stats["errors"] += 1
+                count("graphs_rejected")
+                continue
+            #the workers' own counters stay in the workers, count from the records
+            count("graphs_processed")
+            count("arguments_generated", len(record["arguments"]))
+            count("defeats_emitted", len(record["defeats"]))
+            stats["time"] += record["timings"]["total"]
+            if "cache" in record:
+                cache_stat = {"hit": "cache_hits", "partial": "cache_partial_hits", "miss": "cache_misses"}[record["cache"]]
+                stats[cache_stat] += 1
+                count(cache_stat)
+            stats["slowest"].append((record["timings"]["total"], record["file"]))
+    stats["wall_time"] = time.perf_counter() - start
+    stats["slowest"] = sorted(stats["slowest"], reverse=True)[:5]
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute the AAF and extensions of a directory of ABA graphs (JSON Lines shards or JSON files)")
+    parser.add_argument("input_dir", nargs="?", default="./generated_graphs_augmented_by_topic")
+    parser.add_argument("-o", "--output", default="./aba_extensions.jsonl")
+    parser.add_argument("--semantics", default="preferred", choices=["grounded", "complete", "stable", "preferred"])
+    parser.add_argument("--no-validate", action="store_true",
+                        help="do not reject graphs that fail py_arg's ABAF checks")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=None)
+    parser.add_argument("--cache", nargs="?", const=cache_path, default=None,
+                        help=f"reuse the frameworks already derived, from a SQLite cache (default: {cache_path})")
+    parser.add_argument("--cache-max-entries", type=int, default=100_000)
+    parser.add_argument("--cache-max-mb", type=float, default=512)
+    args = parser.parse_args()
+
+    cache_args = None
+    if args.cache:
+        cache_args = (args.cache, args.cache_max_entries, int(args.cache_max_mb * 2 ** 20))
+    with stage("batch", semantics=args.semantics, workers=args.workers):
+        stats = run_batch(args.input_dir, args.output, args.semantics, not args.no_validate,
+                          args.workers, args.chunksize, cache_args)
+
+    print(f"{stats['files']} graphs processed ({stats['errors']} rejected) in {stats['wall_time']:.2f}s")
+    if stats["files"] > stats["errors"]:
+        print(f"Mean time per graph : {stats['time'] / (stats['files'] - stats['errors']):.4f}s")
+    for seconds, name in stats["slowest"]:
+        print(f"  {name}: {seconds:.4f}s")
+    if cache_args:
+        with FrameworkCache(*cache_args) as cache:
+            cached = cache.stats()
+        print(f"Cache : {stats['cache_hits']} hits, {stats['cache_partial_hits']} partial hits, "
+              f"{stats['cache_misses']} misses, "
+              f"{cached['entries']} frameworks ({cached['bytes'] / 2 ** 20:.1f} MB) in {args.cache}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import os
+import random
+import signal
+import time
+
+from py_arg.aba_classes.semantics.get_preferred_extensions import get_preferred_extensions
+
+from aba_graph import ABA_Graph
+from graph_io import iter_graphs
+
+
+class PyArgTimeout(Exception):
+    pass
+
+
+def on_alarm(signum, frame):
+    raise PyArgTimeout()
+
+
+#compare the native bitset solver with py_arg on preferred extensions
+def bench_graph(aba, py_arg_timeout):
+    build = ABA_Graph()
+    build.load_json(aba)
+    try:
+        aba_framework = build.create_aba_framework()
+    except ValueError:
+        # py_arg rejects graphs where an assumption lost its contrary during the merge,
+        # the native solver only needs the assumptions, rules and contraries of ABA_Graph
+        aba_framework = None
+
+    start = time.perf_counter()
+    native = build.get_extensions(aba_framework or build, "preferred")
+    native_time = time.perf_counter() - start
+
+    if aba_framework is None:
+        return native_time, None, None
+
+    #py_arg's preferred search can take minutes on the large merged graphs
+    signal.alarm(py_arg_timeout)
+    try:
+        start = time.perf_counter()
+        reference = get_preferred_extensions(aba_framework)
+        py_arg_time = time.perf_counter() - start
+    except PyArgTimeout:
+        return native_time, None, None
+    finally:
+        signal.alarm(0)
+
+    return native_time, py_arg_time, native == reference
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the native semantics solver against py_arg")
+    parser.add_argument("--examples", default="./json")
+    parser.add_argument("--generated", default="./generated_graphs_augmented_by_topic")
+    parser.add_argument("--limit", type=int, default=200, help="max number of generated graphs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--py-arg-timeout", type=int, default=10, help="seconds per graph")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGALRM, on_alarm)
+
+    datasets = {
+        "examples": list(iter_graphs(args.examples)) if os.path.exists(args.examples) else [],
+        "generated": list(iter_graphs(args.generated)) if os.path.exists(args.generated) else [],
+    }
+
+    #spread the sample over the small/medium/large categories and topics
+    if len(datasets["generated"]) > args.limit:
+        datasets["generated"] = sorted(random.Random(args.seed).sample(datasets["generated"], args.limit), key=lambda item: item[0])
+
+    for name, graphs in datasets.items():
+        if not graphs:
+            print(f"{name}: no graphs found")
+            continue
+
+        native_total, py_arg_total, compared_native = 0.0, 0.0, 0.0
+        compared, mismatches = 0, []
+        for graph_name, aba in graphs:
+            native_time, py_arg_time, same = bench_graph(aba, args.py_arg_timeout)
+            native_total += native_time
+            if same is None:
+                continue
+            compared += 1
+            compared_native += native_time
+            py_arg_total += py_arg_time
+            if not same:
+                mismatches.append(graph_name)
+
+        print(f"{name}: {len(graphs)} graphs, {compared} solved by py_arg")
+        print(f"  native (all)     : {native_total:.4f}s")
+        print(f"  native (solved)  : {compared_native:.4f}s")
+        print(f"  py_arg (solved)  : {py_arg_total:.4f}s")
+        if compared_native > 0:
+            print(f"  speedup: {py_arg_total / compared_native:.1f}x")
+        print(f"  mismatches: {mismatches if mismatches else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
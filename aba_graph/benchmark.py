@@ -0,0 +1,258 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from aba_graph import ABA_Graph
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "models"))
+from train import load_emb_tech_class
+
+#synthetic ABA frameworks: number of assumptions, rules, body length of the rules
+ABA_SIZES = {
+    "small": {"n_assumptions": 20, "n_rules": 40, "body_length": 2},
+    "medium": {"n_assumptions": 100, "n_rules": 300, "body_length": 3},
+    "large": {"n_assumptions": 400, "n_rules": 1200, "body_length": 3},
+}
+SEMANTICS = ["grounded", "stable", "preferred"]
+
+#synthetic knowledge graph and training settings of the embedding models
+KG_SIZE = {"n_entities": 2000, "n_relations": 20, "n_triples": 20000}
+EMBEDDING_MODELS = {
+    "TransE": ("transE", {"emb_dim": 50, "lr": 0.01, "margin": 1.0}),
+    "RotatE": ("rotatE", {"emb_dim": 50, "lr": 0.01, "gamma": 6.0}),
+}
+EPOCHS = 3
+EVAL_TRIPLES = 1000
+
+#metrics where a higher value is better, the others are timings
+THROUGHPUT_METRICS = ("epochs_per_sec", "triples_per_sec")
+MIN_SLOWDOWN = 0.001
+#timings are only compared with a baseline of the same machine
+MACHINE_KEYS = ("python", "numpy", "platform", "cpus")
+
+
+def synthetic_framework(n_assumptions, n_rules, body_length, depth=3, attack_ratio=0.2, seed=0):
+    """
+    ABA framework in the JSON format of gen_graph.py. The derived literals are split
+    into depth layers: a rule of layer 0 only has assumptions in its body, a rule of
+    layer k one literal of layer k - 1 and assumptions, so the number of arguments
+    stays bounded. attack_ratio of the assumptions have a derived literal as contrary,
+    the others a fresh literal no rule concludes.
+    """
+    rng = random.Random(seed)
+    assumptions = [f"a{i}" for i in range(n_assumptions)]
+    derived = [f"p{i}" for i in range(max(depth, n_rules // 2))]
+    layers = [derived[l::depth] for l in range(depth)]
+
+    rules = []
+    for k in range(n_rules):
+        layer = k % depth
+        body = {rng.choice(layers[layer - 1])} if layer else set()
+        while len(body) < min(body_length, n_assumptions + len(body)):
+            body.add(rng.choice(assumptions))
+        rules.append({"head": rng.choice(layers[layer]), "body": sorted(body)})
+
+    contraries = {
+        a: rng.choice(derived) if rng.random() < attack_ratio else f"not_{a}"
+        for a in assumptions
+    }
+    language = sorted(set(assumptions) | set(derived) | set(contraries.values()))
+    return {"language": language, "rules": rules, "assumptions": assumptions, "contraries": contraries}
+
+
+def synthetic_triples(n_entities, n_relations, n_triples, seed=0):
+    """
+    Distinct random label triples, every relation maps the entities with its own
+    permutation plus noise so that the models have something to learn.
+    """
+    rng = np.random.default_rng(seed)
+    perms = np.stack([rng.permutation(n_entities) for _ in range(n_relations)])
+    h = rng.integers(n_entities, size=2 * n_triples)
+    r = rng.integers(n_relations, size=2 * n_triples)
+    noise = rng.integers(-2, 3, size=2 * n_triples)
+    t = (perms[r, h] + noise) % n_entities
+    ids = np.unique(np.stack([h, r, t], axis=1), axis=0)
+    ids = ids[rng.permutation(len(ids))[:n_triples]]
+    return [(f"e{h}", f"r{r}", f"e{t}") for h, r, t in ids.tolist()]
+
+
+def measure(fn, repeat=3, setup=None):
+    """
+    Best wall time of repeat calls, then one more call under tracemalloc for the
+    peak of the Python allocations. Returns (seconds, peak MB, last result).
+    With setup, each call is fn(setup()) and setup is not measured.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        fn_args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        result = fn(*fn_args)
+        best = min(best, time.perf_counter() - start)
+
+    fn_args = (setup(),) if setup else ()
+    tracemalloc.start()
+    fn(*fn_args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 2 ** 20, result
+
+
+def bench_aba(seed, repeat):
+    results = {}
+    for size, params in ABA_SIZES.items():
+        graph = ABA_Graph()
+        graph.load_json(synthetic_framework(**params, seed=seed))
+        aba_framework = graph.create_aba_framework()
+
+        seconds, peak, arguments = measure(lambda: graph.generate_arguments_from_framework(aba_framework), repeat)
+        results[f"aba/{size}/generate_arguments"] = {"seconds": seconds, "peak_mb": peak, "arguments": len(arguments)}
+
+        seconds, peak, af = measure(lambda: graph.aba_to_aaf(aba_framework), repeat)
+        results[f"aba/{size}/aba_to_aaf"] = {"seconds": seconds, "peak_mb": peak, "defeats": len(af.defeats)}
+
+        for semantics in SEMANTICS:
+            seconds, peak, extensions = measure(lambda: graph.get_extensions(aba_framework, semantics), repeat)
+            results[f"aba/{size}/{semantics}"] = {"seconds": seconds, "peak_mb": peak, "extensions": len(extensions)}
+    return results
+
+
+def bench_embeddings(seed, repeat):
+    results = {}
+    triples = synthetic_triples(**KG_SIZE, seed=seed)
+    test_triples = triples[:EVAL_TRIPLES]
+    rotatE_eval = load_emb_tech_class("rotatE", "eval")
+
+    for name, (module, kwargs) in EMBEDDING_MODELS.items():
+        cls = load_emb_tech_class(module, name)
+
+        def build():
+            return cls(triples, seed=seed, **kwargs)
+
+        def train(model):
+            #the models print one line per epoch
+            with contextlib.redirect_stdout(io.StringIO()):
+                model.train_batch(epochs=EPOCHS)
+            return model
+
+        seconds, peak, _ = measure(build, repeat)
+        results[f"embedding/{name}/init"] = {"seconds": seconds, "peak_mb": peak}
+
+        #a new model for each call, its construction is not timed
+        seconds, peak, model = measure(train, repeat, setup=build)
+        results[f"embedding/{name}/train"] = {"epochs_per_sec": EPOCHS / seconds, "seconds": seconds, "peak_mb": peak}
+
+        seconds, peak, (mrr, _) = measure(lambda: rotatE_eval(model, test_triples), repeat)
+        results[f"embedding/{name}/eval"] = {"triples_per_sec": len(test_triples) / seconds, "seconds": seconds,
+                                             "peak_mb": peak, "mrr": mrr}
+    return results
+
+
+def environment(seed):
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": seed,
+        #peak resident memory of the whole run, kilobytes on linux
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def same_machine(environment, baseline_environment):
+    return all(environment.get(key) == baseline_environment.get(key) for key in MACHINE_KEYS)
+
+
+def compare(results, baseline, tolerance, timings=True):
+    """
+    Regressions of results against the baseline: a timing more than tolerance
+    (and 1 ms) slower, a throughput more than tolerance lower, or a different count of
+    arguments, defeats or extensions (the inputs are seeded, so the counts are exact).
+    timings=False only compares the counts.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric in ("arguments", "defeats", "extensions"):
+            if metric in metrics and metrics[metric] != reference.get(metric):
+                regressions.append(f"{name}: {metric} {reference.get(metric)} -> {metrics[metric]}")
+        if not timings:
+            continue
+
+        metric = next((m for m in THROUGHPUT_METRICS if m in metrics), "seconds")
+        old, new = reference.get(metric), metrics[metric]
+        if not old:
+            continue
+        ratio = old / new if metric in THROUGHPUT_METRICS else new / old
+        #sub-millisecond differences are timer noise
+        if metric == "seconds" and new - old < MIN_SLOWDOWN:
+            continue
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: {metric} {old:.4g} -> {new:.4g} ({ratio:.2f}x worse)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the ABA construction, the semantics and the embedding models")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default="bench_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--only", choices=["aba", "embedding"], default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = {}
+    if args.only in (None, "aba"):
+        results.update(bench_aba(args.seed, args.repeat))
+    if args.only in (None, "embedding"):
+        results.update(bench_embeddings(args.seed, args.repeat))
+
+    for name, metrics in results.items():
+        print(f"{name:40s} " + ", ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items()))
+
+    report = {"environment": environment(args.seed), "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline first")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline["environment"]["seed"] != args.seed:
+        print(f"The baseline was run with seed {baseline['environment']['seed']}, not {args.seed}")
+        return 1
+
+    timings = same_machine(report["environment"], baseline["environment"])
+    if not timings:
+        machine = ", ".join(f"{key}={baseline['environment'].get(key)}" for key in MACHINE_KEYS)
+        print(f"The baseline was recorded on another machine ({machine}), only the counts are compared")
+    regressions = compare(results, baseline["results"], args.tolerance, timings)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(regressions)} regression(s) against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import sys
+
+from py_arg.aba_classes.rule import Rule
+from py_arg.aba_classes.aba_framework import ABAF
+
+from aba_cache import canonical_key
+
+
+class CompactFramework:
+    """
+    Integer encoding of an ABA framework. Literals are interned into ids, the
+    assumptions first (in name order), so that the id of an assumption is also its
+    bit in the support masks of the arguments. Rules are (head id, body ids) tuples,
+    the body in name order like py_arg's rule strings. contrary_of gives the contrary
+    id of each assumption (-1 without one). The names are interned strings, shared
+    by all the frameworks that use them.
+    """
+    __slots__ = ("names", "ids", "n_assumptions", "language", "rules", "contraries", "contrary_of")
+
+    def __init__(self, language=(), assumptions=(), rules=(), contraries=None):
+        contraries = contraries or {}
+        assumptions = sorted(set(assumptions))
+        rules = {(head, tuple(sorted(set(body)))) for head, body in rules}
+        others = set(language).union(*((head, *body) for head, body in rules), *contraries.items())
+        names = assumptions + sorted(others - set(assumptions))
+
+        self.names = tuple(sys.intern(name) for name in names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.n_assumptions = len(assumptions)
+        ids = self.ids
+        self.language = frozenset(ids[name] for name in language)
+        #sorted like py_arg's "head<-body" rule strings, as the arguments were built
+        self.rules = tuple(
+            (ids[head], tuple(ids[b] for b in body))
+            for head, body in sorted(rules, key=lambda rule: rule[0] + "<-" + ",".join(rule[1]))
+        )
+        self.contraries = tuple((ids[a], ids[c]) for a, c in contraries.items())
+        contrary_of = [-1] * self.n_assumptions
+        for a, c in self.contraries:
+            if a < self.n_assumptions:
+                contrary_of[a] = c
+        self.contrary_of = tuple(contrary_of)
+
+
+    @classmethod
+    def from_json(cls, data):
+        rules = ((rule["head"], rule["body"]) for rule in data.get("rules", []))
+        return cls(data.get("language", []), data.get("assumptions", []), rules, data.get("contraries", {}))
+
+
+    @classmethod
+    def from_abaf(cls, aba_framework):
+        """
+        From a py_arg ABAF (or any object with its four attributes).
+        """
+        rules = ((rule.head, rule.body) for rule in aba_framework.rules)
+        return cls(aba_framework.language, aba_framework.assumptions, rules, aba_framework.contraries)
+
+
+    #py_arg-shaped views, only built at the boundary
+
+    def language_set(self):
+        return {self.names[i] for i in self.language}
+
+
+    def assumption_set(self):
+        return set(self.names[:self.n_assumptions])
+
+
+    def rule_set(self):
+        names = self.names
+        return {
+            Rule(f'Rule_{i+1}', {names[b] for b in body}, names[head])
+            for i, (head, body) in enumerate(self.rules)
+        }
+
+
+    def contrary_dict(self):
+        return {self.names[a]: self.names[c] for a, c in self.contraries}
+
+
+    def to_abaf(self):
+        return ABAF(self.assumption_set(), self.rule_set(), self.language_set(), self.contrary_dict())
+
+
+    def key(self):
+        """
+        canonical_key of aba_cache.py, the key of the framework cache.
+        """
+        names = self.names
+        rules = ((names[head], [names[b] for b in body]) for head, body in self.rules)
+        return canonical_key(names[:self.n_assumptions], rules, self.contrary_dict())
+
+
+    def support_names(self, mask):
+        names = self.names
+        support = []
+        while mask:
+            low_bit = mask & -mask
+            support.append(names[low_bit.bit_length() - 1])
+            mask ^= low_bit
+        return frozenset(support)
+
+
+class ArgumentSet:
+    """
+    Arguments of a CompactFramework as two parallel lists: the support of an
+    argument is a bitmask over the assumption ids, its conclusion a literal id.
+    """
+    __slots__ = ("supports", "conclusions")
+
+    def __init__(self, supports=None, conclusions=None):
+        self.supports = supports if supports is not None else []
+        self.conclusions = conclusions if conclusions is not None else []
+
+
+    def __len__(self):
+        return len(self.supports)
+
+
+    @classmethod
+    def from_tuples(cls, aba_arguments, framework):
+        """
+        From (support, conclusion) name tuples.
+        """
+        ids = framework.ids
+        supports = []
+        for support, _ in aba_arguments:
+            mask = 0
+            for a in support:
+                mask |= 1 << ids[a]
+            supports.append(mask)
+        return cls(supports, [ids[conclusion] for _, conclusion in aba_arguments])
+
+
+    def to_tuples(self, framework):
+        """
+        (frozenset of assumption names, conclusion name) of each argument.
+        """
+        names = framework.names
+        # many arguments share a support, build each frozenset once
+        support_sets = {}
+        arguments = []
+        for support, conclusion in zip(self.supports, self.conclusions):
+            support_set = support_sets.get(support)
+            if support_set is None:
+                support_set = support_sets[support] = framework.support_names(support)
+            arguments.append((support_set, names[conclusion]))
+        return arguments
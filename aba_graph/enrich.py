@@ -1,144 +1,332 @@
 import os
 import json
+import argparse
 import pandas as pd
 import glob
-
-output_dir = "./generated_graphs"
-os.makedirs(output_dir, exist_ok=True)
-
-json_files = glob.glob(os.path.join(output_dir, "graph_*.json"))
-
-#enrich attacks from a json file
-def enrich_json_with_attack_rules(json_data, undercut_dict):
-    assumptions = set(json_data.get("assumptions", []))
-    rules = json_data.get("rules", [])
-    contraries = json_data.get("contraries", {})
-    language = set(json_data.get("language", []))
-
-    new_rules = []
+import hashlib
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from graph_io import file_hash, iter_graphs, write_graphs_dir, write_graphs_jsonl
+from instrument import add_counts, collect, count, stage
+
+verify_dir = "./data/Verif"
+source_path = "./generated_graphs.jsonl"
+cache_path = "./.cache/verify_sheets.pkl"
+
+
+#one Verify sheet: A is an assumption and B its contrary
+#(the last "Yes" row wins, as A -> B is a dict per sheet)
+def read_verify_sheet(path):
+    verify_df = pd.read_excel(path)
+    count("files_read")
+
+    #filter rows with a "Yes" vote
+    valid_votes_df = verify_df[verify_df['Vote'].str.strip() == "Yes"]
+    valid_votes_df = valid_votes_df[valid_votes_df['A'].notna() & valid_votes_df['B'].notna()]
+
+    assumptions = valid_votes_df['A'].astype(str).str.strip().str.lower()
+    contraries = valid_votes_df['B'].astype(str).str.strip().str.lower()
+    return {a: b for a, b in zip(assumptions, contraries) if a and b}
+
+
+#parsed sheets are pickled, keyed by mtime and content hash: an untouched sheet is
+#not hashed again, a touched but identical one is not parsed again
+def read_verify_sheets(verify_paths, cache_path=None):
+    """
+    Returns ({path: undercut dict}, {path: sha256}) for the Verify sheets.
+    """
+    cache = {}
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            cache = pickle.load(f)
+
+    sheets, hashes = {}, {}
+    dirty = False
+    for path in verify_paths:
+        mtime = os.path.getmtime(path)
+        entry = cache.get(path)
+        if entry is None or entry["mtime"] != mtime:
+            sha = file_hash(path)
+            if entry is None or entry["sha"] != sha:
+                entry = {"sha": sha, "undercuts": read_verify_sheet(path)}
+            entry["mtime"] = mtime
+            cache[path] = entry
+            dirty = True
+        sheets[path] = entry["undercuts"]
+        hashes[path] = entry["sha"]
+
+    if cache_path and dirty:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with open(cache_path, 'wb') as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return sheets, hashes
+
+
+#build the undercut index of all the Verify sheets at once,
+#each sheet adds its own B to A
+def load_undercut_index(verify_paths, cache_path=None):
+    sheets, _ = read_verify_sheets(verify_paths, cache_path)
+    return build_undercut_index(sheets[path] for path in verify_paths)
+
+
+def build_undercut_index(undercut_dicts):
+    undercut_index = {}
+    for undercut_dict in undercut_dicts:
+        for a, b in undercut_dict.items():
+            bs = undercut_index.setdefault(a, [])
+            if b not in bs:
+                bs.append(b)
+    return UndercutIndex(undercut_index)
+
+
+class UndercutIndex(dict):
+    """
+    A -> [B, ...] that also remembers the position of each A.
+    """
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.positions = {a: i for i, a in enumerate(self)}
+
+    def position(self, a):
+        return self.positions[a]
+
+
+#enrich attacks from a json file, with inverse attack rules
+def enrich_json_with_attack_rules(json_data, undercut_index):
+    """
+    Applies the undercuts of every sheet in one pass. Returns the number of
+    added rules, contraries and assumptions and of removed duplicated
+    literals (0 when the graph is unchanged, e.g. when it was already enriched).
+    """
+    rules = json_data.setdefault("rules", [])
+    contraries = json_data.setdefault("contraries", {})
+    changes = 0
+
+    #duplicated assumptions and literals are dropped, as the sets of the old passes did
+    #(the first occurrence keeps its place)
+    for field in ("assumptions", "language"):
+        literals = json_data.get(field, [])
+        unique = list(dict.fromkeys(literals))
+        changes += len(literals) - len(unique)
+        json_data[field] = unique
+    assumptions, language = json_data["assumptions"], json_data["language"]
+
+    #hashed rules and literals of the graph
+    rule_keys = {(r["head"], frozenset(r["body"])) for r in rules}
+    assumption_set = set(assumptions)
+    language_set = set(language)
+    #the rule heads come from the contraries as they were before this pass
+    original_contraries = dict(contraries)
+    #b -> a, the last matched assumption wins when several share b
     new_contraries = {}
-    new_assumptions = set()
-
-    for a, b in undercut_dict.items():
-        #if an assumption a is in the graph
-        if a in assumptions:
-            #deduce contrary "no_evident_not_" from b
-            contr_head = contraries.get(a, f"no_evident_not_{a}")
-
-            rule = {
-                "head": contr_head,
-                "body": [b]
-            }
-
-            if not any(r["head"] == rule["head"] and r["body"] == rule["body"] for r in rules):
-                new_rules.append(rule)
-            new_contraries[b] = a
-            new_assumptions.add(b)
-
-            language.update([a, b, contr_head])
-
-    json_data["rules"].extend(new_rules)
-    json_data["assumptions"] = list(set(assumptions) | new_assumptions)
-    json_data["contraries"].update(new_contraries)
-    json_data["language"] = list(language)
-
-    return json_data
-
-
-verify_path = "./data/Verif/4. Verify - Task 3 - Staff (Silver).xlsx"
-verify_df = pd.read_excel(verify_path)
-
-#filter rows with a "Yes" vote 
-valid_votes_df = verify_df[verify_df['Vote'].str.strip() == "Yes"]
-
-#build dict where A is an assumption and B is its contrary
-undercut_dict = {}
-for _, row in valid_votes_df.iterrows():
-    assumption = str(row['A']).strip().lower()
-    contrary = str(row['B']).strip().lower()
-    if assumption and contrary:
-        undercut_dict[assumption] = contrary
-
-
-json_files = glob.glob("./generated_graphs/graph_*.json")
-updated_files = 0
 
-for path in json_files:
-    with open(path, 'r') as f:
-        aba_json = json.load(f)
+    #if an assumption a is in the graph (in index order, which decides the contrary
+    #of b when several assumptions share it)
+    matched = [a for a in assumptions if a in undercut_index]
+    for a in sorted(matched, key=undercut_index.position):
+        #deduce contrary "no_evident_not_" from b
+        contr_head = original_contraries.get(a, f"no_evident_not_{a}")
+        for b in undercut_index[a]:
+            key = (contr_head, frozenset([b]))
+            if key not in rule_keys:
+                rule_keys.add(key)
+                rules.append({"head": contr_head, "body": [b]})
+                changes += 1
 
-    enriched = enrich_json_with_attack_rules(aba_json, undercut_dict)
-
-    with open(path, 'w') as f:
-        json.dump(enriched, f, indent=4)
-
-    updated_files += 1
-
-print(f"{updated_files} fichiers enrichis avec règles d'attaque inversées.")
-
-
-verify_files = {
-    "check-in": "./data/Verif/2. Verify - Task 3 - Check-in (Silver).xlsx",
-    "check-out": "./data/Verif/1. Verify - Task 3 - Check-out (Silver).xlsx",
-    "price": "./data/Verif/3. Verify - Task 3 - Price (Silver).xlsx"
-}
-
-all_undercuts = {}
-for topic, path in verify_files.items():
-    df = pd.read_excel(path)
-    valid_votes_df = df[df['Vote'].str.strip() == "Yes"]
-    for _, row in valid_votes_df.iterrows():
-        a = str(row['A']).strip().lower()
-        b = str(row['B']).strip().lower()
-        if a and b:
-            all_undercuts[a] = b
-
-#enrichment function with inverse attack rules
-def enrich_json_with_attack_rules_2(json_data, undercut_dict):
-    assumptions = set(json_data.get("assumptions", []))
-    rules = json_data.get("rules", [])
-    contraries = json_data.get("contraries", {})
-    language = set(json_data.get("language", []))
-
-    new_rules = []
-    new_contraries = {}
-    new_assumptions = set()
-
-    for a, b in undercut_dict.items():
-        if a in assumptions:
-            contr_head = contraries.get(a, f"no_evident_not_{a}")
-            rule = {"head": contr_head, "body": [b]}
-            if not any(r["head"] == rule["head"] and r["body"] == rule["body"] for r in rules):
-                new_rules.append(rule)
             new_contraries[b] = a
-            new_assumptions.add(b)
-            language.update([a, b, contr_head])
-
-    json_data["rules"].extend(new_rules)
-    json_data["assumptions"] = list(set(assumptions) | new_assumptions)
-    json_data["contraries"].update(new_contraries)
-    json_data["language"] = list(language)
-
-    return json_data
-
-#apply enrichment to all generated JSON files
-output_dir = "./generated_graphs"
-json_files = glob.glob(os.path.join(output_dir, "graph_*.json"))
-
-updated_files = 0
-for path in json_files:
-    with open(path, 'r') as f:
-        aba_json = json.load(f)
-
-    enriched = enrich_json_with_attack_rules_2(aba_json, all_undercuts)
-
-    with open(path, 'w') as f:
-        json.dump(enriched, f, indent=4)
-
-    updated_files += 1
-    
-
-updated_files
 
-print("Available undercut examples :", list(all_undercuts.items())[:10])
+            if b not in assumption_set:
+                assumption_set.add(b)
+                assumptions.append(b)
+                changes += 1
 
+            for literal in (a, b, contr_head):
+                if literal not in language_set:
+                    language_set.add(literal)
+                    language.append(literal)
+                    changes += 1
+
+    #only the final contraries count, so that a re-run on an enriched graph changes nothing
+    for b, a in new_contraries.items():
+        if contraries.get(b) != a:
+            contraries[b] = a
+            changes += 1
+
+    return changes
+
+
+#the index is sent once to each worker instead of with every task
+_worker_index = None
+
+
+def init_worker(undercut_index):
+    global _worker_index
+    _worker_index = undercut_index
+
+
+#one read-modify-write per graph file, skipped when nothing changed
+#returns the changes and the counters of the worker
+def enrich_file(path):
+    with collect() as collected:
+        with open(path, 'r') as f:
+            aba_json = json.load(f)
+        count("files_read")
+
+        changes = enrich_json_with_attack_rules(aba_json, _worker_index)
+        if changes:
+            with open(path, 'w') as f:
+                json.dump(aba_json, f, indent=4)
+                count("bytes_written", f.tell())
+    return changes, collected.counters
+
+
+def enrich_record(item):
+    name, aba_json = item
+    changes = enrich_json_with_attack_rules(aba_json, _worker_index)
+    return name, aba_json, changes
+
+
+def enrich_source(source, undercut_index, output=None, workers=None):
+    """
+    Enriches a directory of graph_*.json files in place, or a JSON Lines artifact
+    (rewritten to output, by default in place). Returns (graphs, updated graphs).
+    """
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(undercut_index,)) as pool:
+        if os.path.isdir(source):
+            json_files = sorted(glob.glob(os.path.join(source, "graph_*.json")))
+            chunksize = max(1, len(json_files) // (workers * 4))
+            changes = []
+            for c, counters in pool.map(enrich_file, json_files, chunksize=chunksize):
+                changes.append(c)
+                add_counts(counters)
+            count("graphs_enriched", sum(1 for c in changes if c))
+            count("enrich_changes", sum(changes))
+            return len(changes), sum(1 for c in changes if c)
+
+        graphs = list(iter_graphs(source))
+        chunksize = max(1, len(graphs) // (workers * 4))
+        results = list(pool.map(enrich_record, graphs, chunksize=chunksize))
+
+    updated_files = sum(1 for _, _, c in results if c)
+    count("graphs_enriched", updated_files)
+    count("enrich_changes", sum(c for _, _, c in results))
+    if updated_files or output and output != source:
+        write_graphs_jsonl(output or source, ((name, g) for name, g, _ in results))
+    return len(results), updated_files
+
+
+def graph_hash(graph):
+    return hashlib.sha256(json.dumps(graph, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+#a graph only depends on the undercuts of its own assumptions,
+#so fixing a label in a sheet only re-enriches the graphs that use it
+def undercuts_hash(graph, undercut_index):
+    matched = [a for a in graph.get("assumptions", []) if a in undercut_index]
+    relevant = [[a, undercut_index[a]] for a in sorted(matched, key=undercut_index.position)]
+    return hashlib.sha256(json.dumps(relevant, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def manifest_path(output):
+    if os.path.isdir(output):
+        return os.path.join(output, "manifest.json")
+    return str(Path(output).with_suffix(".manifest.json"))
+
+
+def enrich_incremental(source, output, undercut_index, verify_hashes, workers=None):
+    """
+    Enriches source into output (a JSON Lines artifact, or a directory for a
+    directory source), only for the graphs whose input or relevant undercuts changed
+    since the last run. The manifest next to output records, per graph, the hash
+    of its input, of its undercuts and of its output, plus the Verify sheet hashes.
+    Returns (graphs, re-enriched graphs).
+    """
+    to_dir = os.path.isdir(source)
+    if to_dir:
+        os.makedirs(output, exist_ok=True)
+    manifest_file = manifest_path(output)
+
+    previous = {"graphs": {}}
+    if os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            previous = json.load(f)
+    previous_outputs = {}
+    if not to_dir and os.path.exists(output):
+        previous_outputs = dict(iter_graphs(output))
+
+    names, todo, outputs, entries = [], [], {}, {}
+    for name, graph in iter_graphs(source, pattern="graph_*.json"):
+        names.append(name)
+        entry = {"input": graph_hash(graph), "undercuts": undercuts_hash(graph, undercut_index)}
+        old = previous["graphs"].get(name, {})
+        done = (os.path.exists(os.path.join(output, f"{name}.json")) if to_dir
+                else name in previous_outputs)
+        if done and old.get("input") == entry["input"] and old.get("undercuts") == entry["undercuts"]:
+            entry["output"] = old["output"]
+            outputs[name] = previous_outputs.get(name)
+        else:
+            todo.append((name, graph))
+        entries[name] = entry
+
+    if todo:
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, len(todo) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(undercut_index,)) as pool:
+            for name, graph, changes in pool.map(enrich_record, todo, chunksize=chunksize):
+                outputs[name] = graph
+                entries[name]["output"] = graph_hash(graph)
+                count("enrich_changes", changes)
+        count("graphs_enriched", len(todo))
+
+    if to_dir:
+        write_graphs_dir(output, [(name, outputs[name]) for name, _ in todo])
+        #graphs removed from the source
+        for name in set(previous["graphs"]) - set(entries):
+            stale = os.path.join(output, f"{name}.json")
+            if os.path.exists(stale):
+                os.remove(stale)
+    elif todo or set(previous_outputs) != set(names):
+        write_graphs_jsonl(output, ((name, outputs[name]) for name in names))
+
+    with open(manifest_file, 'w') as f:
+        json.dump({"verify": verify_hashes, "graphs": entries}, f)
+
+    return len(names), len(todo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Draw undercut attacks on the generated graphs from the Verify sheets")
+    parser.add_argument("source", nargs="?", default=source_path,
+                        help="JSON Lines artifact or directory of graph_*.json files")
+    parser.add_argument("--output", default=None, help="output artifact for a JSON Lines source (default: in place)")
+    parser.add_argument("--verify-dir", default=verify_dir)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--incremental", action="store_true",
+                        help="enrich source into --output, only for the graphs whose inputs changed since the last run")
+    parser.add_argument("--cache", default=cache_path, help="cache of the parsed Verify sheets")
+    args = parser.parse_args()
+
+    if args.incremental and (args.output is None or args.output == args.source):
+        parser.error("--incremental needs an --output different from the source")
+
+    with stage("enrich", incremental=args.incremental, workers=args.workers):
+        verify_paths = sorted(glob.glob(os.path.join(args.verify_dir, "*Verify*.xlsx")))
+        sheets, verify_hashes = read_verify_sheets(verify_paths, args.cache)
+        undercut_index = build_undercut_index(sheets[path] for path in verify_paths)
+
+        if args.incremental:
+            total, updated_files = enrich_incremental(args.source, args.output, undercut_index, verify_hashes, args.workers)
+            print(f"{updated_files}/{total} fichiers ré-enrichis, {total - updated_files} inchangés.")
+        else:
+            total, updated_files = enrich_source(args.source, undercut_index, args.output, args.workers)
+            print(f"{updated_files}/{total} fichiers enrichis avec règles d'attaque inversées.")
+    print("Available undercut examples :", list(undercut_index.items())[:10])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,21 @@
 import os
 import json
 import random
+import hashlib
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from collections import defaultdict
+import numpy as np
 from tqdm import tqdm
 
+from graph_io import file_hash, iter_graphs, write_graphs_dir, write_graphs_jsonl
+from instrument import add_counts, collect, count, stage
 
-source_dir = Path("./generated_graphs/")
-output_dir = Path("./generated_graphs_augmented_by_topic")
-output_dir.mkdir(exist_ok=True)
 
-for f in output_dir.glob("*.json"):
-    f.unlink()
+#enriched graphs (a directory of graph_*.json files also works)
+source_path = Path("./generated_graphs.jsonl")
+output_dir = Path("./generated_graphs_augmented_by_topic")
 
 distribution = {
     "small": 4000,
@@ -27,72 +31,267 @@ k_values_used = {
 #Topics
 theme_keywords = ["staff", "check-in", "check-out", "price"]
 
-#Load graphs with their topics
+#source graph of a topic as id arrays: rules are ids in the rule table of the topic,
+#connected are the literals used by its rules, contraries an (m, 2) array in dict order
+CompactGraph = namedtuple("CompactGraph", ["language", "assumptions", "rules", "connected", "contraries"])
+
+
+#first keyword found in the language, assumptions or rule heads
 def extract_theme(graph):
-    text = " ".join(graph.get("language", []) + graph.get("assumptions", []) +
-                   [r["head"] for r in graph.get("rules", []) if "head" in r]).lower()
+    literals = graph.get("language", []) + graph.get("assumptions", []) + \
+               [r["head"] for r in graph.get("rules", []) if "head" in r]
+    literals = [x.lower() for x in literals]
     for kw in theme_keywords:
-        if kw in text:
+        if any(kw in x for x in literals):
             return kw
     return None
 
-#Load all valid graphs and group them by topic 
-graphs_by_theme = defaultdict(list)
-for path in source_dir.glob("graph_*.json"):
-    with open(path) as f:
-        g = json.load(f)
+
+def ids_array(ids):
+    return np.array(ids, dtype=np.int32)
+
+
+class TopicIndex:
+    """
+    The graphs of one topic with their literals and rules interned into integer ids.
+    Ids follow the sorted literals, so sorted ids give sorted labels, and the
+    "<topic>:<literal>" labels are only built once per literal.
+    """
+    def __init__(self, theme, graphs):
+        self.theme = theme
+        literals = set()
+        for g in graphs:
+            literals.update(g.get("language", []))
+            literals.update(g.get("assumptions", []))
+            literals.update(g.get("contraries", {}).keys())
+            literals.update(g.get("contraries", {}).values())
+            for r in g.get("rules", []):
+                literals.add(r["head"])
+                literals.update(r["body"])
+        literals = sorted(literals)
+        self.lit2id = {x: i for i, x in enumerate(literals)}
+        self.names = [f"{theme}:{x}" for x in literals]
+
+        self.rules = []
+        self.rule2id = {}
+        self.graphs = [self.compile(g) for g in graphs]
+
+
+    def intern_rule(self, head, body):
+        key = (head, tuple(body))
+        idx = self.rule2id.get(key)
+        if idx is None:
+            idx = len(self.rules)
+            self.rule2id[key] = idx
+            self.rules.append(key)
+        return idx
+
+
+    def compile(self, graph):
+        ids = self.lit2id
+        rules = [self.intern_rule(ids[r["head"]], [ids[b] for b in r["body"]]) for r in graph.get("rules", [])]
+        connected = {h for h, _ in (self.rules[i] for i in rules)}
+        connected.update(b for i in rules for b in self.rules[i][1])
+        contraries = [(ids[a], ids[b]) for a, b in graph.get("contraries", {}).items()]
+        return CompactGraph(
+            language=ids_array([ids[x] for x in graph.get("language", [])]),
+            assumptions=ids_array([ids[x] for x in graph.get("assumptions", [])]),
+            rules=ids_array(rules),
+            connected=ids_array(sorted(connected)),
+            contraries=ids_array(contraries).reshape(-1, 2),
+        )
+
+
+    def merge(self, indices, min_rules=3):
+        """
+        Merges the graphs at indices with id-set unions (boolean masks over the ids
+        of the topic), keeps the literals connected through the rules.
+        Returns None below min_rules distinct rules.
+        """
+        graphs = [self.graphs[i] for i in indices]
+        rule_mask = np.zeros(len(self.rules), dtype=bool)
+        rule_mask[np.concatenate([g.rules for g in graphs])] = True
+        rules = np.flatnonzero(rule_mask)
+        if len(rules) < min_rules:
+            return None
+        count("rules_deduped", sum(len(g.rules) for g in graphs) - len(rules))
+
+        #Clean : delete unconnected entities
+        n = len(self.names)
+        connected_mask = np.zeros(n, dtype=bool)
+        connected_mask[np.concatenate([g.connected for g in graphs])] = True
+        language_mask = np.zeros(n, dtype=bool)
+        language_mask[np.concatenate([g.language for g in graphs])] = True
+        assumption_mask = np.zeros(n, dtype=bool)
+        assumption_mask[np.concatenate([g.assumptions for g in graphs])] = True
+
+        #the contrary of the last graph wins, as with a dict update
+        pairs = np.concatenate([g.contraries for g in graphs])[::-1]
+        _, last = np.unique(pairs[:, 0], return_index=True)
+        pairs = pairs[last]
+        pairs = pairs[connected_mask[pairs[:, 0]] & connected_mask[pairs[:, 1]]]
+
+        return CompactGraph(
+            language=np.flatnonzero(language_mask & connected_mask),
+            assumptions=np.flatnonzero(assumption_mask & connected_mask),
+            rules=rules,
+            connected=np.flatnonzero(connected_mask),
+            contraries=pairs,
+        )
+
+
+    def to_json(self, merged):
+        #strings are only built here, at write time
+        names = self.names
+        return {
+            "language": [names[i] for i in merged.language.tolist()],
+            "rules": [
+                {"head": names[head], "body": [names[b] for b in body]}
+                for head, body in (self.rules[i] for i in merged.rules.tolist())
+            ],
+            "assumptions": [names[i] for i in merged.assumptions.tolist()],
+            "contraries": {names[a]: names[b] for a, b in merged.contraries.tolist()},
+        }
+
+
+#Load all valid graphs and group them by topic
+def load_topics(source):
+    graphs_by_theme = {}
+    for _, g in iter_graphs(source, pattern="graph_*.json"):
         theme = extract_theme(g)
         if theme:
-            graphs_by_theme[theme].append(g)
-
-#merge and clean 
-def merge_graphs(graph_list, theme):
-    merged = {
-        "language": set(),
-        "rules": [],
-        "assumptions": set(),
-        "contraries": {}
-    }
+            graphs_by_theme.setdefault(theme, []).append(g)
+    return {theme: TopicIndex(theme, graphs) for theme, graphs in graphs_by_theme.items()}
+
 
-    #Merge elements of each graph
-    for g in graph_list:
-        merged["language"].update(f"{theme}:{x}" for x in g.get("language", []))
-        merged["assumptions"].update(f"{theme}:{x}" for x in g.get("assumptions", []))
-        merged["rules"].extend({
-            "head": f"{theme}:{r['head']}",
-            "body": [f"{theme}:{b}" for b in r["body"]]
-        } for r in g.get("rules", []))
-        merged["contraries"].update({
-            f"{theme}:{k}": f"{theme}:{v}" for k, v in g.get("contraries", {}).items()
-        })
-
-    #Clean : delete unconnected entities
-    connected = set()
-    for rule in merged["rules"]:
-        connected.add(rule["head"])
-        connected.update(rule["body"])
-    merged["language"] = list(merged["language"].intersection(connected))
-    merged["assumptions"] = list(merged["assumptions"].intersection(connected))
-    merged["rules"] = [r for r in merged["rules"] if r["head"] in connected and all(b in connected for b in r["body"])]
-    merged["contraries"] = {k: v for k, v in merged["contraries"].items() if k in connected and v in connected}
-
-    return merged if len(merged["rules"]) >= 3 else None 
-
-generated = 0
-for category, count in distribution.items():
-    k_range = k_values_used[category]
-    for i in tqdm(range(count), desc=f"Generating {category}"):
-        k = random.randint(*k_range)
-        candidate_themes = [t for t, lst in graphs_by_theme.items() if len(lst) >= k]
-        if not candidate_themes:
+def generate_graphs(topics, category, start, count, k_range, rng):
+    """
+    Yields (name, merged graph) for the merge attempts start+1 .. start+count of
+    category, k source graphs of one topic per merged graph.
+    """
+    candidates_by_k = {}
+    for i in range(start, start + count):
+        k = rng.randint(*k_range)
+        if k not in candidates_by_k:
+            candidates_by_k[k] = [t for t in topics.values() if len(t.graphs) >= k]
+        candidate_topics = candidates_by_k[k]
+        if not candidate_topics:
             continue
-        theme = random.choice(candidate_themes)
-        selected = random.sample(graphs_by_theme[theme], k)
-        merged = merge_graphs(selected, theme)
-        if merged:
-            fname = f"aba_{category}_{theme}_{i+1}.json"
-            with open(output_dir / fname, 'w') as f:
-                json.dump(merged, f, indent=4)
-            generated += 1
-
-print(f"\n{generated} graphes générés avec cohérence thématique.")
\ No newline at end of file
+        topic = rng.choice(candidate_topics)
+        merged = topic.merge(rng.sample(range(len(topic.graphs)), k))
+        if merged is not None:
+            yield f"aba_{category}_{topic.theme}_{i+1}", topic.to_json(merged)
+
+
+#a shard is a fixed slice of one category quota with its own seed, derived from
+#the dataset seed and the shard number: the output does not depend on the workers
+def derive_seed(seed, shard):
+    return int(hashlib.sha256(f"{seed}:{shard}".encode()).hexdigest()[:16], 16)
+
+
+def plan_shards(distribution, shard_size, seed):
+    shards = []
+    for category, count in distribution.items():
+        for start in range(0, count, shard_size):
+            shards.append({
+                "file": f"shard_{len(shards):05d}.jsonl",
+                "category": category,
+                "start": start,
+                "count": min(shard_size, count - start),
+                "seed": derive_seed(seed, len(shards)),
+            })
+    return shards
+
+
+#the topics are sent once to each worker instead of with every shard
+_worker_topics = None
+
+
+def init_worker(topics):
+    global _worker_topics
+    _worker_topics = topics
+
+
+#returns the shard entry of the manifest and the counters of the worker
+def generate_shard(task):
+    shard, out_dir, per_file = task
+    rng = random.Random(shard["seed"])
+    graphs = generate_graphs(_worker_topics, shard["category"], shard["start"], shard["count"],
+                             k_values_used[shard["category"]], rng)
+    shard = dict(shard)
+    with collect() as collected:
+        if per_file:
+            del shard["file"]
+            shard["graphs"] = write_graphs_dir(out_dir, graphs)
+        else:
+            path = Path(out_dir) / shard["file"]
+            shard["graphs"] = write_graphs_jsonl(path, graphs)
+            shard["sha256"] = file_hash(path)
+    return shard, collected.counters
+
+
+def clear_output(out_dir):
+    for pattern in ("*.json", "*.jsonl"):
+        for f in Path(out_dir).glob(pattern):
+            f.unlink()
+
+
+def generate_dataset(topics, out_dir, distribution, seed, shard_size=1000, workers=None, per_file=False):
+    """
+    Generates the shards of the dataset in a process pool and writes the
+    manifest.json of out_dir. Returns the manifest.
+    """
+    shards = plan_shards(distribution, shard_size, seed)
+    tasks = [(shard, str(out_dir), per_file) for shard in shards]
+    workers = workers or os.cpu_count() or 1
+
+    os.makedirs(out_dir, exist_ok=True)
+    clear_output(out_dir)
+    if workers == 1:
+        init_worker(topics)
+        done = [generate_shard(task) for task in tqdm(tasks, desc="Generating")]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(topics,)) as pool:
+            done = list(tqdm(pool.map(generate_shard, tasks), total=len(tasks), desc="Generating"))
+    for _, counters in done:
+        add_counts(counters)
+    done = [shard for shard, _ in done]
+
+    manifest = {
+        "seed": seed,
+        "distribution": distribution,
+        "k_values": {category: list(k_values_used[category]) for category in distribution},
+        "graphs": sum(shard["graphs"] for shard in done),
+        "shards": done,
+    }
+    with open(Path(out_dir) / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the enriched graphs into bigger graphs of one topic")
+    parser.add_argument("source", nargs="?", default=source_path,
+                        help="JSON Lines artifact or directory of graph_*.json files")
+    parser.add_argument("--output-dir", default=output_dir)
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the dataset (random by default, see manifest.json)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the small/medium/large quotas")
+    parser.add_argument("--shard-size", type=int, default=1000, help="merge attempts per shard")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--per-file", action="store_true",
+                        help="write one indented aba_*.json file per graph instead of JSON Lines shards")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    with stage("gen_graph", seed=seed, workers=args.workers):
+        topics = load_topics(args.source)
+        quotas = {category: int(n * args.scale) for category, n in distribution.items()}
+        manifest = generate_dataset(topics, args.output_dir, quotas, seed, args.shard_size,
+                                    args.workers, args.per_file)
+
+    print(f"\n{manifest['graphs']} graphes générés avec cohérence thématique (seed {seed}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from instrument import count
+
+
+#graphs are stored either as one JSON file per graph in a directory,
+#or as one JSON Lines artifact {"name": ..., "graph": {...}} with a byte offset index
+
+def index_path(jsonl_path):
+    return Path(jsonl_path).with_suffix(".index.json")
+
+
+def write_graphs_jsonl(path, items):
+    """
+    Writes (name, graph) pairs to a compact JSON Lines file and the
+    name -> [offset, length] index next to it. Returns the number of graphs.
+    """
+    index = {}
+    with open(path, "wb") as f:
+        for name, graph in items:
+            line = (json.dumps({"name": name, "graph": graph}, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+            index[name] = [f.tell(), len(line)]
+            f.write(line)
+        count("bytes_written", f.tell())
+    count("graphs_written", len(index))
+
+    with open(index_path(path), "w") as f:
+        json.dump(index, f)
+
+    return len(index)
+
+
+def write_graphs_dir(out_dir, items, indent=4):
+    """
+    Per-file export: one <name>.json file per graph.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    written = 0
+    for name, graph in items:
+        with open(os.path.join(out_dir, f"{name}.json"), "w") as f:
+            json.dump(graph, f, indent=indent)
+            count("bytes_written", f.tell())
+        written += 1
+    count("graphs_written", written)
+    return written
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_index(path):
+    with open(index_path(path)) as f:
+        return json.load(f)
+
+
+def load_graph(path, name, index=None):
+    """
+    Random access to one graph of a JSON Lines artifact through its index.
+    """
+    index = index or read_index(path)
+    offset, length = index[name]
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return json.loads(f.read(length))["graph"]
+
+
+def iter_graphs(source, pattern="*.json"):
+    """
+    Yields (name, graph) from a JSON Lines artifact, from a directory of JSON Lines
+    shards, or from a directory of JSON files (files sorted by name).
+    """
+    source = Path(source)
+    if source.is_dir():
+        shards = sorted(source.glob("*.jsonl"))
+        if shards:
+            for shard in shards:
+                yield from iter_graphs(shard)
+            return
+        for path in sorted(source.glob(pattern)):
+            #the manifests of gen_graph.py and enrich.py are not graphs
+            if path.name == "manifest.json":
+                continue
+            count("files_read")
+            count("graphs_read")
+            with open(path) as f:
+                yield path.stem, json.load(f)
+    else:
+        count("files_read")
+        with open(source, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    count("graphs_read")
+                    yield record["name"], record["graph"]
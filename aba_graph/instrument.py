@@ -0,0 +1,185 @@
+import cProfile
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+
+#Instrumentation of the pipeline stages, off unless one of these is set:
+#ABA_METRICS=<path> appends one JSON line per stage to path ("-" for stderr)
+#ABA_PROFILE=cprofile,tracemalloc adds a cProfile dump (next to the log) and the
+#allocation peak of the outermost stage to its line
+METRICS_PATH = os.environ.get("ABA_METRICS")
+PROFILE = {p.strip() for p in os.environ.get("ABA_PROFILE", "").split(",") if p.strip()}
+if PROFILE and not METRICS_PATH:
+    METRICS_PATH = "aba_metrics.jsonl"
+ENABLED = bool(METRICS_PATH)
+
+#open stages, innermost last: counters and timers go to all of them
+_stages = []
+
+
+class Stage:
+    """
+    Counters and timers of one stage of the pipeline, written as a log line
+    (when log is True) with the wall time and a per second rate of each counter.
+    """
+    def __init__(self, name, log=True, **fields):
+        self.name = name
+        self.log = log
+        self.fields = fields
+        self.counters = {}
+        self.timers = {}
+        #forked workers inherit the open stages of their parent
+        self.pid = os.getpid()
+
+
+    def __enter__(self):
+        self.profiler = None
+        self.tracing = False
+        if self.log and not _stages:
+            if "cprofile" in PROFILE:
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+            if "tracemalloc" in PROFILE and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.tracing = True
+        _stages.append(self)
+        self.start = time.time()
+        self.start_perf = time.perf_counter()
+        return self
+
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start_perf
+        _stages.remove(self)
+        if not self.log:
+            return
+        record = {"stage": self.name, "pid": os.getpid(), "start": self.start, "seconds": seconds, **self.fields}
+        if exc[0] is not None:
+            record["error"] = exc[0].__name__
+        record["counters"] = self.counters
+        record["rates"] = {f"{k}_per_sec": v / seconds for k, v in self.counters.items() if seconds > 0}
+        record["timers"] = self.timers
+
+        if self.profiler:
+            self.profiler.disable()
+            record["profile"] = str(profile_path(self.name))
+            self.profiler.dump_stats(record["profile"])
+        if self.tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            record["peak_mb"] = peak / 2 ** 20
+            record["top_allocations"] = [str(stat) for stat in snapshot.statistics("lineno")[:10]]
+        write_record(record)
+
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+
+class NullStage:
+    """
+    Stand-in for Stage when the instrumentation is off.
+    """
+    counters = {}
+    timers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def set(self, **fields):
+        pass
+
+
+_null_stage = NullStage()
+_null_timer = nullcontext()
+
+
+def profile_path(name):
+    log_dir = Path(METRICS_PATH).parent if METRICS_PATH != "-" else Path(".")
+    return log_dir / f"{name}_{os.getpid()}_{int(time.time())}.prof"
+
+
+def write_record(record):
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    if METRICS_PATH == "-":
+        print(line, file=sys.stderr)
+        return
+    with open(METRICS_PATH, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def stage(name, **fields):
+    """
+    with stage("enrich", workers=4): ... logs one line for the stage.
+    """
+    return Stage(name, **fields) if ENABLED else _null_stage
+
+
+def collect():
+    """
+    Counters of a worker process, not logged: the worker returns
+    collected.counters and the parent adds them with add_counts. In the
+    process of an open stage, the counts already go to that stage.
+    """
+    if not ENABLED or any(s.pid == os.getpid() for s in _stages):
+        return _null_stage
+    return Stage("worker", log=False)
+
+
+def count(name, n=1):
+    for s in _stages:
+        s.counters[name] = s.counters.get(name, 0) + n
+
+
+def add_counts(counters):
+    for name, n in counters.items():
+        count(name, n)
+
+
+@contextmanager
+def _timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        for s in _stages:
+            t = s.timers.setdefault(name, {"seconds": 0.0, "calls": 0})
+            t["seconds"] += elapsed
+            t["calls"] += 1
+
+
+def timer(name):
+    """
+    with timer("solve"): ... adds the elapsed time to the open stages.
+    """
+    return _timer(name) if _stages else _null_timer
+
+
+def timed(name=None):
+    """
+    Decorator version of timer, the function is returned as is when the
+    instrumentation is off.
+    """
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
@@ -0,0 +1,349 @@
+import os
+import sys
+import argparse
+import importlib.util
+from contextlib import nullcontext
+import numpy as np
+from pathlib import Path
+
+from util import load_triples, output_npz_path, triples_factory
+from graph_io import file_hash
+from instrument import count, stage, timer
+
+#from scratch models of the emb_tech folder (they import sampler and evaluate from there)
+emb_tech_models = Path(__file__).resolve().parents[2] / "emb_tech" / "models"
+cache_dir = Path("../.cache/splits")
+
+#model name -> backend and default hyperparameters
+MODELS = {
+    "TransE": {
+        "backend": "pykeen",
+        "model_kwargs": {"embedding_dim": 100},
+        "epochs": 100,
+    },
+    "RotatE": {
+        "backend": "pykeen",
+        "model_kwargs": {"embedding_dim": 512},
+        "epochs": 200,
+    },
+    "emb_tech.TransE": {
+        "backend": "emb_tech",
+        "module": "transE",
+        "model_kwargs": {"emb_dim": 100, "lr": 0.01, "margin": 1.0},
+        "epochs": 100,
+    },
+    "emb_tech.RotatE": {
+        "backend": "emb_tech",
+        "module": "rotatE",
+        "model_kwargs": {"emb_dim": 100, "lr": 0.01, "gamma": 6.0},
+        "epochs": 100,
+    },
+}
+
+
+def resolve_device(device="auto"):
+    """
+    "auto" picks cuda when available, an unavailable cuda device falls back to cpu.
+    """
+    import torch
+
+    if device == "auto":
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    if device.startswith("cuda") and not torch.cuda.is_available():
+        print(f"{device} is not available, falling back to cpu")
+        return "cpu"
+    return device
+
+
+def set_threads(threads):
+    if not threads:
+        return
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+
+
+def coverage_split(triples, valid_size=0.1, test_size=0.1, seed=42):
+    """
+    Random train/valid/test split of an (N, 3) id array where every entity and
+    relation of valid and test also appears in train: a triple is only held out
+    when its head, tail and relation keep another triple in train.
+    Returns (train, valid, test) id arrays.
+    """
+    n_valid = int(round(len(triples) * valid_size))
+    n_test = int(round(len(triples) * test_size))
+    order = np.random.default_rng(seed).permutation(len(triples))
+
+    ent_count = np.bincount(triples[:, [0, 2]].ravel(), minlength=int(triples[:, [0, 2]].max(initial=-1)) + 1)
+    rel_count = np.bincount(triples[:, 1])
+    held_out = []
+    for i in order.tolist():
+        if len(held_out) == n_valid + n_test:
+            break
+        h, r, t = triples[i].tolist()
+        #a self loop uses its entity twice
+        if rel_count[r] > 1 and ent_count[h] > 1 + (h == t) and ent_count[t] > 1 + (h == t):
+            rel_count[r] -= 1
+            ent_count[h] -= 1
+            ent_count[t] -= 1
+            held_out.append(i)
+
+    if len(held_out) < n_valid + n_test:
+        print(f"only {len(held_out)} triples can be held out with a covered train split")
+        #shared between valid and test in the requested proportions
+        n_test = int(round(len(held_out) * n_test / (n_valid + n_test)))
+    train_mask = np.ones(len(triples), dtype=bool)
+    train_mask[held_out] = False
+    return triples[train_mask], triples[held_out[n_test:]], triples[held_out[:n_test]]
+
+
+def load_split(data_path, valid_size=0.1, test_size=0.1, seed=42, cache_dir=cache_dir):
+    """
+    Train/valid/test id arrays of the triples in data_path (see coverage_split),
+    cached in cache_dir under a key made of the dataset hash and the split parameters.
+    Returns {"train", "valid", "test", "entities", "relations"}.
+    """
+    key = file_hash(data_path)[:16] + f"_{valid_size}_{test_size}_{seed}"
+    cache_path = Path(cache_dir) / f"split_{key}.npz"
+    if cache_path.exists():
+        with np.load(cache_path) as data:
+            split = {name: data[name] for name in ("train", "valid", "test")}
+            split["entities"] = data["entities"].tolist()
+            split["relations"] = data["relations"].tolist()
+            return split
+
+    triples, entities, relations = load_triples(data_path)
+    train, valid, test = coverage_split(triples, valid_size, test_size, seed)
+    split = {"train": train, "valid": valid, "test": test, "entities": entities, "relations": relations}
+
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(cache_path, train=train, valid=valid, test=test,
+             entities=np.array(entities, dtype=np.str_), relations=np.array(relations, dtype=np.str_))
+    return split
+
+
+class EarlyStopper:
+    """
+    Stops when the validation MRR, checked every frequency epochs, has not improved
+    by more than relative_delta for patience checks. Keeps a copy of the best embeddings.
+    """
+    def __init__(self, frequency=5, patience=2, relative_delta=0.002):
+        self.frequency = frequency
+        self.patience = patience
+        self.relative_delta = relative_delta
+        self.best_mrr = None
+        self.best_epoch = None
+        self.best_state = None
+        self.bad_checks = 0
+
+
+    def report(self, epoch, mrr, state):
+        """
+        Records the MRR after epoch, returns True when training should stop.
+        """
+        if self.best_mrr is None or mrr > self.best_mrr * (1 + self.relative_delta):
+            self.best_mrr, self.best_epoch = mrr, epoch
+            self.best_state = {name: array.copy() for name, array in state.items()}
+            self.bad_checks = 0
+            return False
+        self.bad_checks += 1
+        return self.bad_checks >= self.patience
+
+
+def labels(ids, entities, relations):
+    return [(entities[h], relations[r], entities[t]) for h, r, t in ids.tolist()]
+
+
+def train_pykeen(name, spec, split, args):
+    from pykeen.pipeline import pipeline
+
+    entities, relations = split["entities"], split["relations"]
+    model_kwargs = dict(spec["model_kwargs"])
+    if args.dim:
+        model_kwargs["embedding_dim"] = args.dim
+    optimizer_kwargs = dict(lr=args.lr) if args.lr else None
+
+    stopper_kwargs = {}
+    if args.patience:
+        stopper_kwargs = dict(
+            stopper='early',
+            stopper_kwargs=dict(frequency=args.eval_frequency, patience=args.patience,
+                                relative_delta=args.relative_delta, metric='mean_reciprocal_rank'),
+        )
+
+    with timer("pipeline"):
+        result = pipeline(
+            model=name,
+            training=triples_factory(split["train"], entities, relations),
+            validation=triples_factory(split["valid"], entities, relations),
+            testing=triples_factory(split["test"], entities, relations),
+            training_loop='sLCWA',
+            model_kwargs=model_kwargs,
+            optimizer_kwargs=optimizer_kwargs,
+            training_kwargs=dict(num_epochs=args.epochs or spec["epochs"], batch_size=args.batch_size),
+            evaluator_kwargs=dict(filtered=True),
+            evaluation_kwargs=dict(batch_size=args.eval_batch_size, slice_size=args.slice_size),
+            random_seed=args.seed,
+            device=resolve_device(args.device),
+            **stopper_kwargs,
+        )
+    count("triples_trained", len(split["train"]) * len(result.losses))
+    return {
+        "mrr": result.get_metric('mean_reciprocal_rank'),
+        "hits@10": result.get_metric('hits@10'),
+    }
+
+
+def load_emb_tech_class(module_name, class_name):
+    if str(emb_tech_models) not in sys.path:
+        sys.path.append(str(emb_tech_models))
+    #loaded from its path, the PyKeen scripts of this folder have the same file names
+    spec = importlib.util.spec_from_file_location(f"emb_tech_{module_name}", emb_tech_models / f"{module_name}.py")
+    module = importlib.util.module_from_spec(spec)
+    #registered so that hogwild.py finds the file of the class for its worker processes
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return getattr(module, class_name)
+
+
+def best_checkpoint_path(path):
+    """
+    model.npz -> model.best.npz, the weights of the best validation MRR.
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.best{ext}"
+
+
+#the embedding matrices of a model, copied for the best validation MRR
+def embedding_matrices(model):
+    return {name: getattr(model, name) for name in ("ent_emb", "rel_emb", "rel_phase") if hasattr(model, name)}
+
+
+def train_emb_tech(name, spec, split, args):
+    model_class = load_emb_tech_class(spec["module"], name.split(".")[-1])
+    from evaluate import evaluate
+    from hogwild import HogwildTrainer
+
+    entities, relations = split["entities"], split["relations"]
+    model_kwargs = dict(spec["model_kwargs"])
+    if args.dim:
+        model_kwargs["emb_dim"] = args.dim
+    if args.lr:
+        model_kwargs["lr"] = args.lr
+
+    train_triplets = labels(split["train"], entities, relations)
+    valid_triplets = labels(split["valid"], entities, relations)
+    if args.checkpoint and (args.resume or args.eval_only) and os.path.exists(args.checkpoint):
+        model = model_class.load(args.checkpoint, training=not args.eval_only)
+        print(f"{args.checkpoint} loaded at epoch {model.epoch}")
+    elif args.eval_only:
+        raise SystemExit("--eval-only needs an existing --checkpoint")
+    else:
+        model = model_class(split["train"], seed=args.seed, entities=entities, relations=relations, **model_kwargs)
+
+    epochs = args.epochs or spec["epochs"]
+    batch_size = args.batch_size or 1024
+    eval_batch_size = args.eval_batch_size or 256
+    stopper = EarlyStopper(args.eval_frequency, args.patience, args.relative_delta) if args.patience else None
+    #Hogwild training in worker processes sharing the embedding matrices, closed
+    #(pool and shared files) even when training or validation fails
+    hogwild = args.workers and args.workers > 1 and not args.eval_only
+    with HogwildTrainer(model, args.workers) if hogwild else nullcontext() as trainer:
+        #a resumed model starts after its last epoch
+        for epoch in range(model.epoch + 1, epochs + 1 if not args.eval_only else 0):
+            with timer("epoch"):
+                if trainer:
+                    print(f"Epoch {epoch}/{epochs}, Loss: {trainer.epoch(batch_size):.4f}")
+                else:
+                    model.train_batch(until_epoch=epoch, batch_size=batch_size)
+            count("triples_trained", len(train_triplets))
+            if args.checkpoint:
+                model.save(args.checkpoint)
+            if stopper and len(valid_triplets) and (epoch % stopper.frequency == 0 or epoch == epochs):
+                with timer("validation"):
+                    valid_mrr, _, _ = evaluate(model, valid_triplets, [10], known_triplets=train_triplets,
+                                               batch_size=eval_batch_size)
+                print(f"Epoch {epoch}/{epochs}, validation MRR: {valid_mrr:.4f}")
+                if stopper.report(epoch, valid_mrr, embedding_matrices(model)):
+                    print(f"Early stopping at epoch {epoch}, best epoch {stopper.best_epoch}")
+                    break
+
+    if stopper and stopper.best_state is not None:
+        matrices = embedding_matrices(model)
+        for name, array in stopper.best_state.items():
+            matrices[name][:] = array
+        model.epoch = stopper.best_epoch
+        #--checkpoint keeps the last epoch (weights, epoch counter and RNGs) for --resume
+        if args.checkpoint:
+            model.save(best_checkpoint_path(args.checkpoint))
+
+    test_triplets = labels(split["test"], entities, relations)
+    with timer("test"):
+        mrr, _, hits = evaluate(model, test_triplets, [1, 3, 10],
+                                known_triplets=train_triplets + valid_triplets, batch_size=eval_batch_size)
+    count("triples_evaluated", len(test_triplets))
+    return {"mrr": mrr, "hits@10": hits[10]}
+
+
+TRAINERS = {
+    "pykeen": train_pykeen,
+    "emb_tech": train_emb_tech,
+}
+
+
+def parse_args(argv=None, model=None):
+    parser = argparse.ArgumentParser(description="Train a KGE model on the ABA triples")
+    parser.add_argument("--model", default=model or "TransE", choices=sorted(MODELS))
+    parser.add_argument("--data", default=output_npz_path, help="id arrays written by util.py")
+    parser.add_argument("--epochs", type=int, default=None, help="default: the one of the model")
+    parser.add_argument("--dim", type=int, default=None, help="default: the one of the model")
+    parser.add_argument("--lr", type=float, default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--eval-batch-size", type=int, default=None)
+    parser.add_argument("--slice-size", type=int, default=None,
+                        help="PyKeen evaluation slice size, for large entity sets")
+    parser.add_argument("--device", default="auto", help="auto, cpu, cuda, cuda:1, ...")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Hogwild worker processes for the emb_tech models")
+    parser.add_argument("--valid-size", type=float, default=0.1)
+    parser.add_argument("--test-size", type=float, default=0.1)
+    parser.add_argument("--patience", type=int, default=2,
+                        help="validation checks without improvement before stopping (0: no early stopping)")
+    parser.add_argument("--eval-frequency", type=int, default=5, help="epochs between two validation checks")
+    parser.add_argument("--relative-delta", type=float, default=0.002)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache-dir", default=cache_dir)
+    parser.add_argument("--checkpoint", default=None,
+                        help="checkpoint of the emb_tech models, written after every epoch "
+                             "(with early stopping, the best weights go to <name>.best.npz)")
+    parser.add_argument("--resume", action="store_true", help="resume training from --checkpoint")
+    parser.add_argument("--eval-only", action="store_true", help="evaluate --checkpoint without training")
+    return parser.parse_args(argv)
+
+
+def main(argv=None, model=None):
+    args = parse_args(argv, model)
+    set_threads(args.threads)
+
+    spec = MODELS[args.model]
+    with stage("train", model=args.model, seed=args.seed) as train_stage:
+        split = load_split(args.data, args.valid_size, args.test_size, args.seed, args.cache_dir)
+        metrics = TRAINERS[spec["backend"]](args.model, spec, split, args)
+        train_stage.set(**metrics)
+
+    print(f"\nEvaluation Results of {args.model} :")
+    print(f"Mean Reciprocal Rank: {metrics['mrr']}")
+    print(f"Hits@10: {metrics['hits@10']}")
+    return metrics
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,105 @@
-import os
-import json
-import pandas as pd
+import sys
+import csv
+import numpy as np
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from graph_io import iter_graphs
+from instrument import count, stage
+
+#JSON Lines shards of gen_graph.py (a directory of *.json files also works)
 input_dir = Path("../generated_graphs_augmented_by_topic")
 output_tsv_path = Path("../aba_triples.tsv")
+#id arrays + vocabularies of the same triples
+output_npz_path = Path("../aba_triples.npz")
 
-triples = []
+relations = ["supports", "attacks"]
 
-for file in input_dir.glob("*.json"):
-    with open(file, 'r') as f:
-        graph = json.load(f)
-    
-    assumptions = set(graph.get("assumptions", []))
-    contraries = graph.get("contraries", {})
-    rules = graph.get("rules", [])
 
-    #add rules as triplets
-    for rule in rules:
+def graph_triples(graph):
+    """
+    Label triples of one graph: body literal -supports-> head for every rule,
+    a -attacks-> contrary of a for every contrary (undercut).
+    """
+    for rule in graph.get("rules", []):
         head = rule.get("head")
         for body_literal in rule.get("body", []):
-            triples.append((body_literal, "supports", head))
+            yield body_literal, "supports", head
+    for a, not_a in graph.get("contraries", {}).items():
+        yield a, "attacks", not_a
+
+
+def export_triples(source):
+    """
+    Streams the graphs of source, interns the literals and keeps each (h, r, t)
+    once, in first seen order. Returns (triples as an (N, 3) int32 array, entities, relations).
+    """
+    entities, ent2id = [], {}
+    rel2id = {r: i for i, r in enumerate(relations)}
+    seen = set()
+    ids = []
+    total = 0
+
+    for _, graph in iter_graphs(source):
+        for h, r, t in graph_triples(graph):
+            total += 1
+            for literal in (h, t):
+                if literal not in ent2id:
+                    ent2id[literal] = len(entities)
+                    entities.append(literal)
+            triple = (ent2id[h], rel2id[r], ent2id[t])
+            if triple not in seen:
+                seen.add(triple)
+                ids.append(triple)
+
+    count("triples", len(ids))
+    count("triples_deduped", total - len(ids))
+    return np.array(ids, dtype=np.int32).reshape(-1, 3), entities, list(relations)
+
+
+def write_tsv(path, triples, entities, relations):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        writer.writerows((entities[h], relations[r], entities[t]) for h, r, t in triples.tolist())
+        count("bytes_written", f.tell())
+
+
+def save_triples(path, triples, entities, relations):
+    np.savez(path, triples=triples, entities=np.array(entities, dtype=np.str_),
+             relations=np.array(relations, dtype=np.str_))
+    count("bytes_written", Path(path).stat().st_size)
+
+
+def load_triples(path=output_npz_path):
+    """
+    Returns (triples, entities, relations) written by save_triples.
+    """
+    with np.load(path) as data:
+        return data["triples"], data["entities"].tolist(), data["relations"].tolist()
+
+
+def triples_factory(triples, entities, relations):
+    """
+    PyKEEN TriplesFactory straight from the id arrays. All the factories built
+    from the same vocabularies share their entity and relation ids.
+    """
+    import torch
+    from pykeen.triples import TriplesFactory
+
+    return TriplesFactory(
+        mapped_triples=torch.as_tensor(np.asarray(triples), dtype=torch.long),
+        entity_to_id={e: i for i, e in enumerate(entities)},
+        relation_to_id={r: i for i, r in enumerate(relations)},
+    )
+
 
-    #add contraries as attacks (undercut)
-    for a, not_a in contraries.items():
-        triples.append((a, "attacks", not_a))
+def main():
+    with stage("export_triples"):
+        triples, entities, relations = export_triples(input_dir)
+        write_tsv(output_tsv_path, triples, entities, relations)
+        save_triples(output_npz_path, triples, entities, relations)
+    print(output_tsv_path, output_npz_path, triples.shape, f"{len(entities)} entities")
 
-df_triples = pd.DataFrame(triples, columns=["head", "relation", "tail"])
-df_triples.to_csv(output_tsv_path, sep="\t", index=False, header=False)
 
-output_tsv_path, df_triples.shape
+if __name__ == "__main__":
+    main()
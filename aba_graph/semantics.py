@@ -0,0 +1,248 @@
+from py_arg.abstract_argumentation_classes.abstract_argumentation_framework import AbstractArgumentationFramework
+
+
+class BitsetAF:
+    """
+    Abstract argumentation framework over integer bitsets.
+    Argument i is bit i, attackers[j] is the mask of the arguments attacking j
+    and attacks[i] the mask of the arguments attacked by i.
+    """
+    def __init__(self, n, attack_pairs, arguments=None):
+        self.n = n
+        self.all = (1 << n) - 1
+        self.arguments = arguments
+        self.attackers = [0] * n
+        self.attacks = [0] * n
+        for i, j in attack_pairs:
+            self.attackers[j] |= 1 << i
+            self.attacks[i] |= 1 << j
+
+
+    @classmethod
+    def from_aaf(cls, af):
+        """
+        Build the bitset view of a py_arg AbstractArgumentationFramework.
+        """
+        arguments = list(af.arguments)
+        index = {arg.name: i for i, arg in enumerate(arguments)}
+        pairs = [(index[d.from_argument.name], index[d.to_argument.name]) for d in af.defeats]
+        return cls(len(arguments), pairs, arguments)
+
+
+    def to_arguments(self, mask):
+        return frozenset(self.arguments[i] for i in iter_bits(mask))
+
+
+    def attacked_by(self, mask):
+        out = 0
+        for i in iter_bits(mask):
+            out |= self.attacks[i]
+        return out
+
+
+    def grounded_labelling(self):
+        """
+        Least fixpoint of the characteristic function: an argument is IN once all
+        its attackers are OUT, and OUT as soon as one attacker is IN.
+        Returns the (in_mask, out_mask) pair, UNDEC being the rest.
+        """
+        in_mask, out_mask = 0, 0
+        changed = True
+        while changed:
+            changed = False
+            for i in iter_bits(self.all & ~(in_mask | out_mask)):
+                if self.attackers[i] & ~out_mask == 0:
+                    in_mask |= 1 << i
+                    changed = True
+            new_out = self.attacked_by(in_mask) & ~out_mask
+            if new_out:
+                out_mask |= new_out
+                changed = True
+        return in_mask, out_mask
+
+
+    def grounded(self):
+        return self.grounded_labelling()[0]
+
+
+    def complete(self):
+        return [in_mask for in_mask, _ in self._labellings("complete")]
+
+
+    def preferred(self):
+        return [in_mask for in_mask, _ in self._labellings("preferred")]
+
+
+    def stable(self):
+        return [in_mask for in_mask, _ in self._labellings("stable")]
+
+
+    def _labellings(self, semantics):
+        """
+        Enumerates the labellings of the given semantics as (in_mask, out_mask).
+
+        The grounded labelling is computed first and shared by every complete
+        labelling, so only its UNDEC arguments are left to search. Those are split
+        into strongly connected components that are labelled one at a time in
+        topological order, each conditioned on the labels of its upstream components.
+        """
+        g_in, g_out = self.grounded_labelling()
+        remaining = self.all & ~(g_in | g_out)
+
+        partial = [(g_in, g_out)]
+        labelled = g_in | g_out
+        for scc in self.strongly_connected_components(remaining):
+            expanded = []
+            for in_mask, out_mask in partial:
+                undec_mask = labelled & ~(in_mask | out_mask)
+                local = self._scc_labellings(scc, in_mask, out_mask, undec_mask)
+                if semantics == "preferred":
+                    local = maximal(local)
+                elif semantics == "stable":
+                    local = [(l_in, l_out) for l_in, l_out in local if l_in | l_out == scc]
+                expanded.extend((in_mask | l_in, out_mask | l_out) for l_in, l_out in local)
+            partial = expanded
+            labelled |= scc
+            if not partial:
+                break
+
+        if semantics == "stable":
+            partial = [(in_mask, out_mask) for in_mask, out_mask in partial
+                       if in_mask | out_mask == self.all]
+        return partial
+
+
+    def _scc_labellings(self, scc, in_mask, out_mask, undec_mask):
+        """
+        Complete labellings of one component given the labels of the arguments
+        upstream of it. Returns the (in, out) masks restricted to the component.
+        """
+        forced_out = 0
+        candidates = 0
+        for i in iter_bits(scc):
+            if self.attackers[i] & in_mask:
+                forced_out |= 1 << i
+            elif not self.attackers[i] & undec_mask:
+                # an UNDEC attacker outside the component keeps i out of any IN set
+                candidates |= 1 << i
+
+        order = list(iter_bits(candidates))
+        results = []
+
+        def check(local_in):
+            local_out = (self.attacked_by(local_in) & scc) | forced_out
+            all_out = out_mask | local_out
+            for i in iter_bits(scc & ~local_out):
+                legally_in = self.attackers[i] & ~all_out == 0
+                if legally_in != bool(local_in >> i & 1):
+                    return
+            results.append((local_in, local_out))
+
+        def search(k, local_in, excluded):
+            if k == len(order):
+                check(local_in)
+                return
+            i = order[k]
+            bit = 1 << i
+            # branch 1: i is IN, provided it stays conflict-free
+            if not excluded & bit and not self.attackers[i] & (local_in | bit):
+                search(k + 1, local_in | bit, excluded | self.attacks[i] | self.attackers[i])
+            # branch 2: i is not IN
+            search(k + 1, local_in, excluded)
+
+        search(0, 0, 0)
+        return results
+
+
+    def strongly_connected_components(self, mask):
+        """
+        Tarjan's algorithm on the attack graph restricted to mask.
+        Components are returned as bitmasks in topological order (attackers first).
+        """
+        index = {}
+        low = {}
+        stack = []
+        on_stack = 0
+        components = []
+        counter = 0
+
+        for root in iter_bits(mask):
+            if root in index:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack |= 1 << root
+            work = [(root, iter_bits(self.attacks[root] & mask))]
+            while work:
+                node, successors = work[-1]
+                pushed = False
+                for succ in successors:
+                    if succ not in index:
+                        index[succ] = low[succ] = counter
+                        counter += 1
+                        stack.append(succ)
+                        on_stack |= 1 << succ
+                        work.append((succ, iter_bits(self.attacks[succ] & mask)))
+                        pushed = True
+                        break
+                    elif on_stack >> succ & 1:
+                        low[node] = min(low[node], index[succ])
+                if pushed:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = 0
+                    while True:
+                        member = stack.pop()
+                        on_stack &= ~(1 << member)
+                        component |= 1 << member
+                        if member == node:
+                            break
+                    components.append(component)
+
+        # Tarjan emits sinks first
+        components.reverse()
+        return components
+
+
+def iter_bits(mask):
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+def maximal(labellings):
+    """
+    Keeps the labellings whose IN set is subset-maximal.
+    """
+    in_sets = {in_mask for in_mask, _ in labellings}
+    return [(in_mask, out_mask) for in_mask, out_mask in labellings
+            if not any(other != in_mask and other & in_mask == in_mask for other in in_sets)]
+
+
+# Same call shape as py_arg.algorithms.semantics: take an AbstractArgumentationFramework,
+# return sets of Arguments
+
+def get_grounded_extension(af: AbstractArgumentationFramework):
+    bitset_af = BitsetAF.from_aaf(af)
+    return set(bitset_af.to_arguments(bitset_af.grounded()))
+
+
+def get_complete_extensions(af: AbstractArgumentationFramework):
+    bitset_af = BitsetAF.from_aaf(af)
+    return {bitset_af.to_arguments(mask) for mask in bitset_af.complete()}
+
+
+def get_preferred_extensions(af: AbstractArgumentationFramework):
+    bitset_af = BitsetAF.from_aaf(af)
+    return {bitset_af.to_arguments(mask) for mask in bitset_af.preferred()}
+
+
+def get_stable_extensions(af: AbstractArgumentationFramework):
+    bitset_af = BitsetAF.from_aaf(af)
+    return {bitset_af.to_arguments(mask) for mask in bitset_af.stable()}
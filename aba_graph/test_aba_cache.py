@@ -0,0 +1,130 @@
+import itertools
+
+import pytest
+
+import aba_cache
+from aba_cache import FrameworkCache, canonical_key, framework_key, graph_key, pack_entry, unpack_entry
+from aba_graph import ABA_Graph
+from compact import CompactFramework
+from test_aba_graph import random_framework
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Strictly increasing time.time of aba_cache, so that last_used orders every put and hit.
+    """
+    ticks = itertools.count(1)
+    monkeypatch.setattr(aba_cache.time, "time", lambda: float(next(ticks)))
+
+
+def entry(n):
+    return {
+        "arguments": [(frozenset([f"a{i}"]), f"a{i}") for i in range(n)] + [(frozenset(), "p")],
+        "defeats": [(n, 0)],
+        "extensions": {"preferred": {frozenset(f"a{i}" for i in range(1, n))}},
+    }
+
+
+def test_key_ignores_order_duplicates_and_language():
+    rules = [("p", ["a", "b"]), ("q", [])]
+    key = canonical_key(["a", "b"], rules, {"a": "p", "b": "q"})
+    assert canonical_key(["b", "a", "a"], [("q", []), ("p", ["b", "a"]), ("p", ["a", "b"])],
+                         {"b": "q", "a": "p"}) == key
+
+    graph = {"language": ["a", "b", "p", "q"], "assumptions": ["a", "b"],
+             "rules": [{"head": "p", "body": ["a", "b"]}, {"head": "q", "body": []}],
+             "contraries": {"a": "p", "b": "q"}}
+    assert graph_key(graph) == key
+    assert graph_key(dict(graph, language=["a", "b", "p", "q", "unused"])) == key
+
+
+def test_key_changes_with_the_framework_and_the_version(monkeypatch):
+    rules = [("p", ["a"])]
+    key = canonical_key(["a", "b"], rules, {"a": "p", "b": "p"})
+    assert canonical_key(["a", "b"], rules, {"a": "p", "b": "a"}) != key
+    assert canonical_key(["a", "b"], [("p", ["b"])], {"a": "p", "b": "p"}) != key
+    assert canonical_key(["a"], rules, {"a": "p", "b": "p"}) != key
+    monkeypatch.setattr(aba_cache, "CACHE_VERSION", aba_cache.CACHE_VERSION + 1)
+    assert canonical_key(["a", "b"], rules, {"a": "p", "b": "p"}) != key
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_keys_agree_across_representations(seed):
+    graph = random_framework(seed)
+    build = ABA_Graph()
+    build.load_json(graph)
+    assert build.framework.key() == graph_key(graph)
+    assert framework_key(build.create_aba_framework()) == graph_key(graph)
+    assert CompactFramework.from_abaf(build.create_aba_framework()).key() == graph_key(graph)
+
+
+def test_pack_round_trip():
+    assert unpack_entry(pack_entry(entry(4))) == entry(4)
+
+
+def test_hit_partial_hit_and_miss(tmp_path):
+    with FrameworkCache(tmp_path / "cache.sqlite") as cache:
+        assert cache.get("k") is None
+        cache.put("k", entry(3))
+        assert cache.get("k", "preferred") == entry(3)
+        assert cache.get("k", "stable") == entry(3)
+        assert (cache.hits, cache.partial_hits, cache.misses) == (1, 1, 1)
+
+
+def test_hits_are_copies(tmp_path):
+    with FrameworkCache(tmp_path / "cache.sqlite") as cache:
+        cache.put("k", entry(3))
+        cache.get("k")["extensions"]["stable"] = set()
+        assert "stable" not in cache.get("k")["extensions"]
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    with FrameworkCache(tmp_path / "cache.sqlite", max_entries=10) as cache:
+        for i in range(10):
+            cache.put(f"k{i}", entry(2))
+        # k0 is used again, k1 becomes the oldest
+        assert cache.get("k0") is not None
+        cache.put("k10", entry(2))
+
+        entries, _ = cache.totals()
+        assert entries == int(10 * aba_cache.EVICT_TO)
+        assert cache.get("k0") is not None
+        assert cache.get("k1") is None
+        assert cache.get("k10") is not None
+        assert cache.evictions == 11 - entries
+
+
+def test_evicts_down_to_max_bytes(tmp_path, clock):
+    size = len(pack_entry(entry(20)))
+    with FrameworkCache(tmp_path / "cache.sqlite", max_bytes=5 * size) as cache:
+        for i in range(20):
+            cache.put(f"k{i}", entry(20))
+            assert cache.totals()[1] <= 5 * size
+        assert cache.get("k19") is not None
+
+
+def test_totals_follow_the_table(tmp_path, clock):
+    with FrameworkCache(tmp_path / "cache.sqlite", max_entries=6) as cache:
+        for i in range(10):
+            cache.put(f"k{i % 8}", entry(1 + i))
+        rows = cache.db.execute("SELECT COUNT(*), SUM(size) FROM frameworks").fetchone()
+        assert cache.totals() == rows
+    # the totals are kept in the file, for the next connections
+    with FrameworkCache(tmp_path / "cache.sqlite", max_entries=6) as cache:
+        assert cache.totals() == rows
+
+
+def test_graph_with_cache_derives_the_same(tmp_path):
+    graph = random_framework(7, n_rules=8)
+    plain = ABA_Graph()
+    plain.load_json(graph)
+    expected = plain.derive(plain, "preferred")
+
+    with FrameworkCache(tmp_path / "cache.sqlite") as cache:
+        for _ in range(2):
+            build = ABA_Graph(cache)
+            build.load_json(graph)
+            assert build.derive(build, "preferred") == expected
+            assert build.get_extensions(build, "preferred") == expected[2]
+        assert cache.misses == 1
@@ -0,0 +1,114 @@
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+from aba_graph import ABA_Graph
+
+
+def random_framework(seed, n_assumptions=4, n_literals=4, n_rules=6, acyclic=False):
+    """
+    Small flat ABA framework as the JSON of load_json: every assumption has a
+    contrary and no rule concludes an assumption. With acyclic, the body of a
+    rule for p<k> only uses assumptions and p<i> with i < k.
+    """
+    rng = random.Random(seed)
+    assumptions = [f"a{i}" for i in range(n_assumptions)]
+    literals = [f"p{i}" for i in range(n_literals)]
+    language = assumptions + literals
+    rules = []
+    for _ in range(n_rules):
+        head = rng.randrange(n_literals)
+        premises = assumptions + literals[:head] if acyclic else language
+        rules.append({"head": literals[head], "body": rng.sample(premises, rng.randint(0, 2))})
+    contraries = {a: rng.choice(literals) for a in assumptions}
+    return {"language": language, "rules": rules, "assumptions": assumptions, "contraries": contraries}
+
+
+def naive_arguments(aba):
+    """
+    Every (support, conclusion) by firing all the rules until nothing changes.
+    """
+    arguments = {(frozenset([a]), a) for a in aba["assumptions"]}
+    changed = True
+    while changed:
+        changed = False
+        for rule in aba["rules"]:
+            supports = [frozenset()]
+            for premise in rule["body"]:
+                supports = [s | t for s in supports for t, c in arguments if c == premise]
+            for support in supports:
+                if (support, rule["head"]) not in arguments:
+                    arguments.add((support, rule["head"]))
+                    changed = True
+    return arguments
+
+
+def load(aba):
+    build = ABA_Graph()
+    build.load_json(aba)
+    return build, build.create_aba_framework()
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_arguments_match_naive_fixpoint(seed):
+    aba = random_framework(seed)
+    build, aba_framework = load(aba)
+    arguments = build.generate_arguments_from_framework(aba_framework)
+    assert len(arguments) == len(set(arguments))
+    assert set(arguments) == naive_arguments(aba)
+
+
+def test_arguments_of_example():
+    with open(Path(__file__).parent / "json" / "ex3_1.json") as f:
+        aba = json.load(f)
+    build, aba_framework = load(aba)
+    arguments = set(build.generate_arguments_from_framework(aba_framework))
+    assert (frozenset(), "good_food") in arguments
+    assert (frozenset(["eating"]), "happy") in arguments
+    assert (frozenset(["no_fork", "dirty_hands"]), "not_eating") in arguments
+    assert arguments == naive_arguments(aba)
+
+
+def test_graph_and_abaf_give_the_same_arguments():
+    build, aba_framework = load(random_framework(0))
+    assert build.generate_arguments_from_framework(build) == build.generate_arguments_from_framework(aba_framework)
+
+
+def test_changed_abaf_is_encoded_again():
+    build, aba_framework = load(random_framework(1))
+    aba_framework.assumptions.discard("a0")
+    arguments = build.generate_arguments_from_framework(aba_framework)
+    assert all("a0" not in support for support, _ in arguments)
+
+
+def pairwise_attacks(arguments, contraries):
+    """
+    (i, j) when argument i concludes the contrary of an assumption of argument j.
+    """
+    return sorted(
+        (i, j)
+        for i, (_, conclusion) in enumerate(arguments)
+        for j, (support, _) in enumerate(arguments)
+        if any(contraries.get(a) == conclusion for a in support)
+    )
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_attacks_match_pairwise_definition(seed):
+    aba = random_framework(seed)
+    build, aba_framework = load(aba)
+    arguments = build.generate_arguments_from_framework(aba_framework)
+    attacks = build.compute_attacks(arguments, aba_framework)
+    assert attacks == pairwise_attacks(arguments, aba["contraries"])
+
+
+def test_adjacency_matches_attacks():
+    build, aba_framework = load(random_framework(3, n_rules=10))
+    arguments, adjacency = build.aba_to_adjacency(aba_framework)
+    attacks = build.compute_attacks(arguments, aba_framework)
+    assert sorted(zip(*adjacency.nonzero())) == attacks
+    af = build.aba_to_aaf(aba_framework)
+    assert len(af.arguments) == len(arguments)
+    assert len(af.defeats) == len(attacks)
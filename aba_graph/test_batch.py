@@ -0,0 +1,65 @@
+import json
+
+from batch import process_graph, run_batch
+from test_aba_graph import random_framework
+
+
+def write_graphs(directory, n):
+    directory.mkdir()
+    graphs = {f"graph_{i:02d}": random_framework(i) for i in range(n)}
+    # an assumption without contrary, rejected by py_arg's checks
+    del graphs["graph_03"]["contraries"]["a0"]
+    for name, graph in graphs.items():
+        with open(directory / f"{name}.json", "w") as f:
+            json.dump(graph, f)
+    return graphs
+
+
+def read_records(path):
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    for record in records:
+        del record["timings"]
+    return records
+
+
+def test_records_in_input_order(tmp_path):
+    graphs = write_graphs(tmp_path / "graphs", 12)
+    output = tmp_path / "out.jsonl"
+    stats = run_batch(tmp_path / "graphs", output, workers=2, chunksize=1)
+
+    records = read_records(output)
+    assert [r["file"] for r in records] == sorted(graphs)
+    assert stats["files"] == 12 and stats["errors"] == 1
+    assert "error" in records[3]
+
+    expected = [json.loads(json.dumps(process_graph(name, graph))) for name, graph in sorted(graphs.items())]
+    for record in expected:
+        del record["timings"]
+    assert records == expected
+
+
+def test_no_validate_keeps_the_rejected_graph(tmp_path):
+    write_graphs(tmp_path / "graphs", 5)
+    output = tmp_path / "out.jsonl"
+    run_batch(tmp_path / "graphs", output, validate=False, workers=1)
+    assert not any("error" in record for record in read_records(output))
+
+
+def test_cache_gives_the_same_records(tmp_path):
+    source = tmp_path / "graphs"
+    write_graphs(source, 8)
+    cache_args = (str(tmp_path / "cache.sqlite"), 1000, 2 ** 20)
+
+    run_batch(source, tmp_path / "plain.jsonl", workers=1)
+    first = run_batch(source, tmp_path / "cold.jsonl", workers=2, cache_args=cache_args)
+    second = run_batch(source, tmp_path / "warm.jsonl", workers=2, cache_args=cache_args)
+    assert first["cache_hits"] + first["cache_misses"] == 7
+    assert second["cache_hits"] == 7
+
+    plain = read_records(tmp_path / "plain.jsonl")
+    for name in ("cold.jsonl", "warm.jsonl"):
+        records = read_records(tmp_path / name)
+        for record in records:
+            record.pop("cache", None)
+        assert records == plain
@@ -0,0 +1,47 @@
+import pytest
+
+from aba_graph import ABA_Graph
+from compact import ArgumentSet, CompactFramework
+from test_aba_graph import random_framework
+
+
+def test_assumptions_come_first_in_name_order():
+    framework = CompactFramework.from_json(random_framework(0))
+    assert framework.names[:framework.n_assumptions] == ("a0", "a1", "a2", "a3")
+    for a, c in framework.contraries:
+        assert framework.contrary_of[a] == c
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_abaf_round_trip(seed):
+    framework = CompactFramework.from_json(random_framework(seed))
+    again = CompactFramework.from_abaf(framework.to_abaf())
+    assert again.names == framework.names
+    assert again.rules == framework.rules
+    assert again.contrary_of == framework.contrary_of
+    assert again.key() == framework.key()
+
+
+def test_argument_set_round_trip():
+    build = ABA_Graph()
+    build.load_json(random_framework(2, n_rules=10))
+    arguments = build.generate_arguments_from_framework(build)
+    compact = ArgumentSet.from_tuples(arguments, build.framework)
+    assert compact.to_tuples(build.framework) == arguments
+
+
+def test_no_instance_dict():
+    framework = CompactFramework.from_json(random_framework(0))
+    with pytest.raises(AttributeError):
+        framework.extra = 1
+    with pytest.raises(AttributeError):
+        ABA_Graph().extra = 1
+
+
+def test_views_are_copies():
+    build = ABA_Graph()
+    build.load_json(random_framework(0))
+    build.assumption_set().add("x")
+    build.contrary_dict()["a0"] = "x"
+    assert "x" not in build.assumption_set()
+    assert build.contrary_dict()["a0"] != "x"
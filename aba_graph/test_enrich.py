@@ -0,0 +1,96 @@
+import copy
+import json
+import os
+
+from enrich import build_undercut_index, enrich_incremental, enrich_json_with_attack_rules, enrich_source
+from graph_io import iter_graphs, write_graphs_jsonl
+
+
+def sheets():
+    return [{"slow service": "rude staff", "dirty room": "no cleaning"}, {"slow service": "long queue"}]
+
+
+def graph(i):
+    return {
+        "language": ["slow service", "dirty room", "not_slow", f"topic_{i}"],
+        "rules": [{"head": "not_slow", "body": [f"topic_{i}"]}],
+        "assumptions": ["slow service", "dirty room"],
+        "contraries": {"slow service": "not_slow"},
+    }
+
+
+def test_enrich_adds_undercuts_once():
+    index = build_undercut_index(sheets())
+    data = graph(0)
+    assert enrich_json_with_attack_rules(data, index) > 0
+    assert {"head": "not_slow", "body": ["rude staff"]} in data["rules"]
+    assert {"head": "not_slow", "body": ["long queue"]} in data["rules"]
+    assert {"head": "no_evident_not_dirty room", "body": ["no cleaning"]} in data["rules"]
+    assert data["contraries"]["rude staff"] == "slow service"
+    assert "long queue" in data["assumptions"]
+
+    enriched = copy.deepcopy(data)
+    assert enrich_json_with_attack_rules(data, index) == 0
+    assert data == enriched
+
+
+def test_shared_contrary_goes_to_the_last_assumption():
+    index = build_undercut_index([{"a": "b", "c": "b"}])
+    data = {"language": ["a", "c"], "rules": [], "assumptions": ["c", "a"], "contraries": {}}
+    enrich_json_with_attack_rules(data, index)
+    assert data["contraries"]["b"] == "c"
+    assert enrich_json_with_attack_rules(data, index) == 0
+
+
+def test_duplicates_are_removed():
+    index = build_undercut_index(sheets())
+    data = graph(0)
+    data["assumptions"].append("slow service")
+    data["language"].append("dirty room")
+    enrich_json_with_attack_rules(data, index)
+    assert data["assumptions"].count("slow service") == 1
+    assert data["language"].count("dirty room") == 1
+
+
+def test_second_run_rewrites_no_file(tmp_path):
+    for i in range(6):
+        with open(tmp_path / f"graph_{i}.json", "w") as f:
+            json.dump(graph(i), f)
+    # an unmatched graph is never written
+    with open(tmp_path / "graph_6.json", "w") as f:
+        json.dump({"language": ["x"], "rules": [], "assumptions": ["x"], "contraries": {}}, f)
+    index = build_undercut_index(sheets())
+
+    assert enrich_source(str(tmp_path), index, workers=1) == (7, 6)
+    written = {path: os.stat(path).st_mtime_ns for path in tmp_path.iterdir()}
+    os.utime(tmp_path / "graph_0.json", ns=(0, 0))
+    written[tmp_path / "graph_0.json"] = 0
+
+    assert enrich_source(str(tmp_path), index, workers=1) == (7, 0)
+    assert {path: os.stat(path).st_mtime_ns for path in tmp_path.iterdir()} == written
+
+
+def test_second_run_on_json_lines_changes_nothing(tmp_path):
+    source = tmp_path / "graphs.jsonl"
+    write_graphs_jsonl(source, [(f"graph_{i}", graph(i)) for i in range(4)])
+    index = build_undercut_index(sheets())
+
+    assert enrich_source(str(source), index, workers=1) == (4, 4)
+    enriched = source.read_bytes()
+    assert enrich_source(str(source), index, workers=1) == (4, 0)
+    assert source.read_bytes() == enriched
+
+
+def test_incremental_only_redoes_changed_graphs(tmp_path):
+    source, output = tmp_path / "graphs.jsonl", tmp_path / "enriched.jsonl"
+    graphs = [(f"graph_{i}", graph(i)) for i in range(4)]
+    write_graphs_jsonl(source, graphs)
+    index = build_undercut_index(sheets())
+
+    assert enrich_incremental(str(source), str(output), index, {}, workers=1) == (4, 4)
+    assert enrich_incremental(str(source), str(output), index, {}, workers=1) == (4, 0)
+
+    graphs[2][1]["assumptions"].append("topic_2")
+    write_graphs_jsonl(source, graphs)
+    assert enrich_incremental(str(source), str(output), index, {}, workers=1) == (4, 1)
+    assert "topic_2" in dict(iter_graphs(output))["graph_2"]["assumptions"]
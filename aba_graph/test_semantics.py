@@ -0,0 +1,95 @@
+import random
+from itertools import combinations
+
+import pytest
+from py_arg.aba_classes.semantics.get_complete_extensions import get_complete_extensions
+from py_arg.aba_classes.semantics.get_grounded_extensions import get_preferred_extensions as get_grounded_extensions
+from py_arg.aba_classes.semantics.get_preferred_extensions import get_preferred_extensions
+from py_arg.aba_classes.semantics.get_stable_extensions import get_stable_extensions
+
+from aba_graph import ABA_Graph
+from semantics import BitsetAF, iter_bits
+from test_aba_graph import random_framework
+
+
+def random_af(seed, n=7, density=0.2):
+    rng = random.Random(seed)
+    return n, [(i, j) for i in range(n) for j in range(n) if rng.random() < density]
+
+
+def brute_force(n, attacks):
+    """
+    Complete, grounded, preferred and stable extensions by enumerating every subset.
+    """
+    attackers = {j: {i for i, k in attacks if k == j} for j in range(n)}
+
+    def attacked(s):
+        return {j for i, j in attacks if i in s}
+
+    complete = []
+    for size in range(n + 1):
+        for s in map(set, combinations(range(n), size)):
+            out = attacked(s)
+            if s & out:
+                continue
+            defended = {a for a in range(n) if attackers[a] <= out}
+            if defended == s:
+                complete.append(frozenset(s))
+    grounded = frozenset.intersection(*complete)
+    preferred = [s for s in complete if not any(s < t for t in complete)]
+    stable = [s for s in complete if s | attacked(s) == set(range(n))]
+    return {"complete": set(complete), "grounded": {grounded}, "preferred": set(preferred), "stable": set(stable)}
+
+
+def as_sets(masks):
+    return {frozenset(iter_bits(mask)) for mask in masks}
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_bitset_semantics_match_brute_force(seed):
+    n, attacks = random_af(seed, density=0.1 + seed % 4 * 0.1)
+    expected = brute_force(n, attacks)
+    af = BitsetAF(n, attacks)
+    assert as_sets([af.grounded()]) == expected["grounded"]
+    assert as_sets(af.complete()) == expected["complete"]
+    assert as_sets(af.preferred()) == expected["preferred"]
+    assert as_sets(af.stable()) == expected["stable"]
+
+
+def test_odd_cycle_has_no_stable_extension():
+    af = BitsetAF(3, [(0, 1), (1, 2), (2, 0)])
+    assert af.grounded() == 0
+    assert af.preferred() == [0]
+    assert af.stable() == []
+
+
+def test_self_attacker_is_never_accepted():
+    af = BitsetAF(2, [(0, 0), (0, 1)])
+    assert af.grounded() == 0
+    assert as_sets(af.complete()) == {frozenset()}
+
+
+def test_components_are_in_topological_order():
+    # 0 <-> 1 attack 2 <-> 3, which attack 4
+    af = BitsetAF(5, [(0, 1), (1, 0), (1, 2), (2, 3), (3, 2), (3, 4)])
+    components = af.strongly_connected_components(af.all)
+    assert [set(iter_bits(c)) for c in components] == [{0, 1}, {2, 3}, {4}]
+
+
+PY_ARG_SEMANTICS = {
+    "grounded": get_grounded_extensions,
+    "complete": get_complete_extensions,
+    "preferred": get_preferred_extensions,
+    "stable": get_stable_extensions,
+}
+
+
+# py_arg builds the arguments backwards from the contraries, which is only right
+# without cyclic rules: from p2 <- p1, p2 it derives p2 out of the arguments for p1
+@pytest.mark.parametrize("semantics", sorted(PY_ARG_SEMANTICS))
+@pytest.mark.parametrize("seed", range(20))
+def test_extensions_match_py_arg(seed, semantics):
+    build = ABA_Graph()
+    build.load_json(random_framework(seed, acyclic=True))
+    aba_framework = build.create_aba_framework()
+    assert build.get_extensions(aba_framework, semantics) == PY_ARG_SEMANTICS[semantics](aba_framework)
@@ -1,64 +1,91 @@
-import os
-import json
+import argparse
 import pandas as pd
-import glob
+
+from graph_io import write_graphs_dir, write_graphs_jsonl
+from instrument import count, stage
 
 file_path = "./data/data_reviews.xlsx"
-xls = pd.ExcelFile(file_path)
+output_path = "./generated_graphs.jsonl"
+output_dir = "./generated_graphs"
 
-sheet_names = xls.sheet_names
+body_cols = [f"Body {i}" for i in range(1, 16)]
+contr_cols = [f"Cont. Body {i}" for i in range(1, 16)]
 
-df = xls.parse(sheet_names[0])
-df.head()
 
-output_dir = "./generated_graphs"
-os.makedirs(output_dir, exist_ok=True)
-
-#At least a Head and one Body + corresponding Contrary
-def is_valid_row(row):
-    if pd.isna(row["Head"]):
-        return False
-    body_cols = [f"Body {i}" for i in range(1, 16)]
-    contr_cols = [f"Cont. Body {i}" for i in range(1, 16)]
-    has_valid_body = any(not pd.isna(row[col]) for col in body_cols)
-    has_valid_contrary = any(not pd.isna(row[col]) for col in contr_cols)
-    return has_valid_body and has_valid_contrary
+#At least a Head and one Body + corresponding Contrary, checked on whole columns
+def valid_rows_mask(df):
+    has_head = df["Head"].notna()
+    has_valid_body = df[body_cols].notna().any(axis=1)
+    has_valid_contrary = df[contr_cols].notna().any(axis=1)
+    return has_head & has_valid_body & has_valid_contrary
+
 
 #clean and convert to literal format
-def clean_literal(literal):
-    return str(literal).strip().lower()
-
-generated = 0
-for idx, row in df.iterrows():
-    if not is_valid_row(row):
-        continue
-
-    head = clean_literal(row["Head"])
-
-    body_literals = [clean_literal(row[f"Body {i}"]) for i in range(1, 16) if not pd.isna(row[f"Body {i}"])]
-    contraries_literals = [clean_literal(row[f"Cont. Body {i}"]) for i in range(1, 16) if not pd.isna(row[f"Cont. Body {i}"])]
-
-    #build ABA 
-    aba_json = {
-        "language": list(set([head] + body_literals + contraries_literals)),
-        "rules": [
-            {
-                "head": head,
-                "body": body_literals
+def clean_literals(series):
+    return series.astype(str).str.strip().str.lower()
+
+
+#melt the Body i / Cont. Body i columns in bulk: one list of cleaned literals per row,
+#in column order and without the empty cells
+def melt_literals(df, cols):
+    stacked = df[cols].stack().dropna()
+    cleaned = clean_literals(stacked)
+    lists = cleaned.groupby(level=0, sort=False).agg(list)
+    return lists.reindex(df.index).apply(lambda x: x if isinstance(x, list) else [])
+
+
+def build_graphs(df):
+    """
+    Yields (name, aba_json) for every valid row of the reviews sheet.
+    """
+    df = df[valid_rows_mask(df)]
+
+    heads = clean_literals(df["Head"])
+    bodies = melt_literals(df, body_cols)
+    contraries = melt_literals(df, contr_cols)
+
+    for idx, head, body_literals, contraries_literals in zip(df.index, heads, bodies, contraries):
+        #build ABA
+        aba_json = {
+            "language": sorted(set([head] + body_literals + contraries_literals)),
+            "rules": [
+                {
+                    "head": head,
+                    "body": body_literals
+                }
+            ],
+            "assumptions": body_literals,
+            "contraries": {
+                assumption: contrary
+                for assumption, contrary in zip(body_literals, contraries_literals)
             }
-        ],
-        "assumptions": body_literals,
-        "contraries": {
-            assumption: contrary
-            for assumption, contrary in zip(body_literals, contraries_literals)
         }
-    }
+        yield f"graph_{idx+1}", aba_json
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate simple ABA graphs from the reviews dataset")
+    parser.add_argument("--input", default=file_path)
+    parser.add_argument("--output", default=output_path, help="JSON Lines artifact (an index is written next to it)")
+    parser.add_argument("--per-file", action="store_true",
+                        help="also export one graph_<i>.json file per graph in --output-dir")
+    parser.add_argument("--output-dir", default=output_dir)
+    args = parser.parse_args()
+
+    with stage("xlsx_to_json", input=str(args.input)):
+        xls = pd.ExcelFile(args.input)
+        df = xls.parse(xls.sheet_names[0])
+        count("files_read")
+        count("rows_read", len(df))
 
-    json_filename = os.path.join(output_dir, f"graph_{idx+1}.json")
-    with open(json_filename, 'w') as f:
-        json.dump(aba_json, f, indent=4)
+        graphs = list(build_graphs(df))
+        generated = write_graphs_jsonl(args.output, graphs)
+        print(f"{generated} graphs written to {args.output}")
 
-    generated += 1
+        if args.per_file:
+            write_graphs_dir(args.output_dir, graphs)
+            print(f"{generated} graphs exported to {args.output_dir}")
 
-generated
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+
+from triple_store import TripleStore, load_dataset
+
+
+def write_split(path, triplets):
+    with open(path, "w", encoding="utf-8") as f:
+        for triplet in triplets:
+            f.write("\t".join(triplet) + "\n")
+
+
+def test_labels_are_interned_once_for_all_splits():
+    store = TripleStore()
+    train = store.add_triplets("train", [("a", "r", "b"), ("b", "s", "c")])
+    test = store.add_triplets("test", [("c", "r", "a"), ("d", "s", "a")])
+    assert train.dtype == np.int32 and train.shape == (2, 3)
+    assert store.entities == ["a", "b", "c", "d"]
+    assert store.relations == ["r", "s"]
+    assert store.labels(test) == [("c", "r", "a"), ("d", "s", "a")]
+
+
+def test_filter_by_entities_and_relations():
+    store = TripleStore()
+    ids = store.add_triplets("all", [("a", "r", "b"), ("a", "s", "c"), ("c", "r", "b")])
+    ent_ids = store.entity_ids(["a", "b", "unknown"])
+    assert store.labels(store.filter(ids, ent_ids)) == [("a", "r", "b")]
+    assert store.labels(store.filter(ids, rel_ids=store.relation_ids(["r"]))) == [("a", "r", "b"), ("c", "r", "b")]
+    assert np.array_equal(store.split_entities("all"), [0, 1, 2])
+
+
+def test_save_and_memory_mapped_load(tmp_path):
+    store = TripleStore()
+    store.add_triplets("train", [("a", "r", "b"), ("b", "r", "c")])
+    store.save(tmp_path)
+    loaded = TripleStore.load(tmp_path)
+    assert isinstance(loaded.splits["train"], np.memmap)
+    assert loaded.labels(loaded.splits["train"]) == store.labels(store.splits["train"])
+    assert loaded.ent2id == store.ent2id
+
+
+def test_load_dataset_reuses_then_rebuilds_the_cache(tmp_path):
+    for name in ("train", "valid", "test"):
+        write_split(tmp_path / f"{name}.txt", [("a", "r", "b"), (name, "r", "a")])
+    store = load_dataset(tmp_path)
+    assert store.labels(store.splits["valid"]) == [("a", "r", "b"), ("valid", "r", "a")]
+
+    cached = load_dataset(tmp_path)
+    assert isinstance(cached.splits["train"], np.memmap)
+
+    # a newer source file invalidates the cache
+    write_split(tmp_path / "test.txt", [("new", "r", "a")])
+    future = os.path.getmtime(tmp_path / "cache" / "entities.npy") + 10
+    os.utime(tmp_path / "test.txt", (future, future))
+    rebuilt = load_dataset(tmp_path)
+    assert rebuilt.labels(rebuilt.splits["test"]) == [("new", "r", "a")]
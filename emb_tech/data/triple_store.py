@@ -0,0 +1,133 @@
+import os
+import numpy as np
+
+
+class TripleStore:
+    """
+    Triplet splits interned once into integer ids.
+    Entity and relation labels are shared by all the splits, each split is an
+    (N, 3) int32 array of (h, r, t) ids.
+    """
+    def __init__(self, entities=None, relations=None):
+        self.entities = list(entities) if entities is not None else []
+        self.relations = list(relations) if relations is not None else []
+        self.ent2id = {e: i for i, e in enumerate(self.entities)}
+        self.rel2id = {r: i for i, r in enumerate(self.relations)}
+        self.splits = {}
+
+
+    def intern(self, label, label2id, labels):
+        idx = label2id.get(label)
+        if idx is None:
+            idx = len(labels)
+            label2id[label] = idx
+            labels.append(label)
+        return idx
+
+
+    def add_triplets(self, name, triplets):
+        ids = np.array([
+            (self.intern(h, self.ent2id, self.entities),
+             self.intern(r, self.rel2id, self.relations),
+             self.intern(t, self.ent2id, self.entities))
+            for h, r, t in triplets
+        ], dtype=np.int32).reshape(-1, 3)
+        self.splits[name] = ids
+        return ids
+
+
+    def add_file(self, name, path):
+        ids = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.strip().split('\t')
+                if len(parts) == 3:
+                    h, r, t = parts
+                    ids.append((self.intern(h, self.ent2id, self.entities),
+                                self.intern(r, self.rel2id, self.relations),
+                                self.intern(t, self.ent2id, self.entities)))
+        self.splits[name] = np.array(ids, dtype=np.int32).reshape(-1, 3)
+        return self.splits[name]
+
+
+    def labels(self, ids):
+        """
+        Back to label triplets, e.g. for the dict-based models.
+        """
+        return [(self.entities[h], self.relations[r], self.entities[t]) for h, r, t in ids.tolist()]
+
+
+    def entity_ids(self, labels):
+        return np.array([self.ent2id[e] for e in labels if e in self.ent2id], dtype=np.int32)
+
+
+    def relation_ids(self, labels):
+        return np.array([self.rel2id[r] for r in labels if r in self.rel2id], dtype=np.int32)
+
+
+    def filter(self, ids, ent_ids=None, rel_ids=None):
+        """
+        Keeps the triplets whose head and tail are in ent_ids and relation in rel_ids
+        (None means no constraint), with vectorized membership tests.
+        """
+        keep = np.ones(len(ids), dtype=bool)
+        if ent_ids is not None:
+            keep &= np.isin(ids[:, 0], ent_ids) & np.isin(ids[:, 2], ent_ids)
+        if rel_ids is not None:
+            keep &= np.isin(ids[:, 1], rel_ids)
+        return ids[keep]
+
+
+    def split_entities(self, name):
+        split = self.splits[name]
+        return np.unique(np.concatenate([split[:, 0], split[:, 2]]))
+
+
+    def split_relations(self, name):
+        return np.unique(self.splits[name][:, 1])
+
+
+    def save(self, out_dir):
+        """
+        One .npy file per split plus the two vocabularies, so that load can memory-map them.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        np.save(os.path.join(out_dir, "entities.npy"), np.array(self.entities, dtype=np.str_))
+        np.save(os.path.join(out_dir, "relations.npy"), np.array(self.relations, dtype=np.str_))
+        for name, ids in self.splits.items():
+            np.save(os.path.join(out_dir, f"split_{name}.npy"), ids)
+
+
+    @classmethod
+    def load(cls, in_dir, mmap=True):
+        mode = 'r' if mmap else None
+        entities = np.load(os.path.join(in_dir, "entities.npy"), mmap_mode=mode)
+        relations = np.load(os.path.join(in_dir, "relations.npy"), mmap_mode=mode)
+        store = cls(entities.tolist(), relations.tolist())
+        for fname in sorted(os.listdir(in_dir)):
+            if fname.startswith("split_") and fname.endswith(".npy"):
+                store.splits[fname[len("split_"):-len(".npy")]] = np.load(os.path.join(in_dir, fname), mmap_mode=mode)
+        return store
+
+
+def load_dataset(data_dir, splits=("train", "valid", "test"), cache_dir=None):
+    """
+    Loads <data_dir>/<split>.txt files into a TripleStore, cached as .npy files
+    in cache_dir (default <data_dir>/cache). The cache is rebuilt when a source
+    file is newer than it.
+    """
+    cache_dir = cache_dir or os.path.join(data_dir, "cache")
+    paths = {name: os.path.join(data_dir, f"{name}.txt") for name in splits}
+    cached = [os.path.join(cache_dir, f"split_{name}.npy") for name in splits]
+    cached += [os.path.join(cache_dir, "entities.npy"), os.path.join(cache_dir, "relations.npy")]
+
+    if all(os.path.exists(p) for p in cached):
+        cache_time = min(os.path.getmtime(p) for p in cached)
+        if all(os.path.getmtime(p) <= cache_time for p in paths.values()):
+            return TripleStore.load(cache_dir)
+
+    store = TripleStore()
+    for name, path in paths.items():
+        store.add_file(name, path)
+    store.save(cache_dir)
+    return store
@@ -0,0 +1,222 @@
+import time
+import argparse
+import numpy as np
+
+# max number of floats of the intermediate distance arrays
+MAX_ELEMENTS = 2 ** 24
+
+
+def real_view(vectors):
+    """
+    Complex vectors as [real, imag] float32 rows: the euclidean distances are the same.
+    """
+    if np.iscomplexobj(vectors):
+        return np.concatenate([vectors.real, vectors.imag], axis=-1).astype(np.float32)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def sq_distances(queries, points):
+    """
+    (B, N) squared euclidean distances with one matrix product.
+    """
+    sq = (queries ** 2).sum(axis=1)[:, None] + (points ** 2).sum(axis=1)[None, :] - 2 * queries @ points.T
+    return np.maximum(sq, 0)
+
+
+class IVFIndex:
+    """
+    Inverted file index in NumPy: the vectors are clustered with k-means, a query
+    only scans the lists of its n_probe closest centroids. The lists are stored
+    as one array of vector ids sorted by list, with list offsets.
+    """
+    def __init__(self, vectors, n_lists=None, n_iter=10, seed=0):
+        self.vectors = real_view(vectors)
+        n = len(self.vectors)
+        if n == 0:
+            raise ValueError("IVFIndex needs at least one vector")
+        self.n_lists = min(n, n_lists or max(1, int(np.sqrt(n))))
+        self.rng = np.random.default_rng(seed)
+        self.centroids = self.kmeans(n_iter)
+
+        assign = self.assign(self.vectors, self.centroids)
+        self.ids = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=self.n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+
+    def assign(self, vectors, centroids):
+        step = max(1, MAX_ELEMENTS // max(len(centroids), 1))
+        return np.concatenate([
+            sq_distances(vectors[start:start + step], centroids).argmin(axis=1)
+            for start in range(0, len(vectors), step)
+        ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+
+    def kmeans(self, n_iter):
+        centroids = self.vectors[self.rng.choice(len(self.vectors), self.n_lists, replace=False)]
+        for _ in range(n_iter):
+            assign = self.assign(self.vectors, centroids)
+            counts = np.bincount(assign, minlength=self.n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, self.vectors)
+            empty = counts == 0
+            centroids = sums / np.maximum(counts, 1)[:, None]
+            # an empty list restarts from a random vector
+            centroids[empty] = self.vectors[self.rng.choice(len(self.vectors), empty.sum())]
+        return centroids.astype(np.float32)
+
+
+    def search(self, queries, k=10, n_probe=8):
+        """
+        Approximate k nearest vectors of each query, as (B, k) ids and squared
+        distances, padded with -1 / inf when the probed lists hold less than k vectors.
+        k is at most the number of vectors.
+        """
+        queries = real_view(queries)
+        k = min(k, len(self.vectors))
+        n_probe = min(n_probe, self.n_lists)
+        probes = np.argpartition(sq_distances(queries, self.centroids), n_probe - 1, axis=1)[:, :n_probe]
+
+        # the queries are grouped by probed list, so that each list is scanned with
+        # one matrix product for all its queries; k candidates per (query, list)
+        cand_ids = np.full((len(queries), n_probe, k), -1, dtype=np.int64)
+        cand_dists = np.full((len(queries), n_probe, k), np.inf, dtype=np.float32)
+        flat = probes.ravel()
+        order = np.argsort(flat, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(flat, minlength=self.n_lists))])
+        for l in np.flatnonzero(bounds[1:] > bounds[:-1]):
+            members = self.ids[self.offsets[l]:self.offsets[l + 1]]
+            if len(members) == 0:
+                continue
+            rows, slots = np.divmod(order[bounds[l]:bounds[l + 1]], n_probe)
+            dists = sq_distances(queries[rows], self.vectors[members])
+            kk = min(k, len(members))
+            part = np.argpartition(dists, kk - 1, axis=1)[:, :kk]
+            cand_ids[rows, slots, :kk] = members[part]
+            cand_dists[rows, slots, :kk] = np.take_along_axis(dists, part, axis=1)
+
+        cand_ids = cand_ids.reshape(len(queries), -1)
+        cand_dists = cand_dists.reshape(len(queries), -1)
+        best = np.argsort(cand_dists, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(cand_ids, best, axis=1), np.take_along_axis(cand_dists, best, axis=1)
+
+
+class QueryIndex:
+    """
+    Tail and head prediction queries of a trained TransE or RotatE model answered
+    through an IVF index over the entity embeddings: the query vectors are
+    h + r / t - r (TransE) or h * exp(i r) / t * exp(-i r) (RotatE), the rerank * k
+    closest entities of the index are re-ranked with the exact distance of the model.
+    Re-ranking makes the returned distances exact, not the result set: the index is
+    euclidean, so for an L1 TransE the true L1 top-k can fall outside the candidates
+    (recall() measures it against the L1 brute force).
+    """
+    def __init__(self, model, n_lists=None, n_iter=10, seed=0):
+        self.model = model
+        self.index = IVFIndex(model.ent_emb, n_lists, n_iter, seed)
+        self.id2rel = sorted(model.rel2id, key=model.rel2id.get)
+        self.id2ent = sorted(model.ent2id, key=model.ent2id.get)
+
+
+    def search(self, queries, k=10, n_probe=8, rerank=4):
+        """
+        Returns (B, k) approximate nearest entity ids and their exact distances
+        for a batch of query vectors (k at most the number of entities).
+        """
+        k = min(k, len(self.index.vectors))
+        cands, _ = self.index.search(queries, k * rerank, n_probe)
+        dists = self.model.candidate_scores(queries, np.maximum(cands, 0))
+        dists[cands < 0] = np.inf
+        order = np.argsort(dists, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(cands, order, axis=1), np.take_along_axis(dists, order, axis=1)
+
+
+    def tails(self, h, r, k=10, n_probe=8, rerank=4):
+        return self.search(self.model.tail_queries(h, r), k, n_probe, rerank)
+
+
+    def heads(self, r, t, k=10, n_probe=8, rerank=4):
+        return self.search(self.model.head_queries(r, t), k, n_probe, rerank)
+
+
+    def predict_tails(self, queries, k=10, n_probe=8):
+        """
+        [(entity, distance), ...] of each (h, r) label query.
+        """
+        h = np.array([self.model.ent2id[h] for h, _ in queries])
+        r = np.array([self.model.rel2id[r] for _, r in queries])
+        return self.labels(*self.tails(h, r, k, n_probe))
+
+
+    def predict_heads(self, queries, k=10, n_probe=8):
+        """
+        [(entity, distance), ...] of each (r, t) label query.
+        """
+        r = np.array([self.model.rel2id[r] for r, _ in queries])
+        t = np.array([self.model.ent2id[t] for _, t in queries])
+        return self.labels(*self.heads(r, t, k, n_probe))
+
+
+    def labels(self, ids, dists):
+        return [
+            [(self.id2ent[e], float(d)) for e, d in zip(row_ids, row_dists) if e >= 0]
+            for row_ids, row_dists in zip(ids.tolist(), dists.tolist())
+        ]
+
+
+def recall(query_index, queries, k=10, n_probe=8, rerank=4, batch_size=256):
+    """
+    Recall@k of the index against the brute-force k nearest entities (score over
+    all entities, with the distance of the model, L1 for an L1 TransE) on a batch
+    of query vectors, with both timings.
+    Returns (recall, ann seconds, brute-force seconds).
+    """
+    k = min(k, len(query_index.index.vectors))
+    hits, ann_time, brute_time = 0, 0.0, 0.0
+    for start in range(0, len(queries), batch_size):
+        chunk = queries[start:start + batch_size]
+
+        t0 = time.perf_counter()
+        ids, _ = query_index.search(chunk, k, n_probe, rerank)
+        ann_time += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        exact = np.argpartition(query_index.model.batch_scores(chunk), k - 1, axis=1)[:, :k]
+        brute_time += time.perf_counter() - t0
+
+        hits += sum(len(set(a) & set(b)) for a, b in zip(ids.tolist(), exact.tolist()))
+    return hits / (len(queries) * k), ann_time, brute_time
+
+
+def main():
+    from transE import TransE
+    from rotatE import RotatE
+
+    parser = argparse.ArgumentParser(description="Recall and speed of the IVF index against brute-force queries")
+    parser.add_argument("checkpoint", help="checkpoint of a trained model (see checkpoint.py)")
+    parser.add_argument("--model", default="TransE", choices=["TransE", "RotatE"])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--rerank", type=int, default=4)
+    args = parser.parse_args()
+
+    model = {"TransE": TransE, "RotatE": RotatE}[args.model].load(args.checkpoint)
+    rng = np.random.default_rng(0)
+    sample = model.triplet_ids[rng.choice(len(model.triplet_ids), min(args.queries, len(model.triplet_ids)), replace=False)]
+    queries = model.tail_queries(sample[:, 0], sample[:, 1])
+
+    t0 = time.perf_counter()
+    query_index = QueryIndex(model, args.n_lists)
+    print(f"{query_index.index.n_lists} lists built in {time.perf_counter() - t0:.2f}s")
+    distance = getattr(model, "norm", "L2")
+    print(f"recall against the exact {distance} top-{args.k}" + (", the index lists are L2" if distance != "L2" else ""))
+    for n_probe in (1, 2, 4, 8, 16, 32):
+        if n_probe > query_index.index.n_lists:
+            break
+        r, ann_time, brute_time = recall(query_index, queries, args.k, n_probe, args.rerank)
+        print(f"n_probe={n_probe}: recall@{args.k} {r:.4f}, ann {ann_time:.3f}s, brute force {brute_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import json
+import random
+import numpy as np
+
+from hogwild import MATRICES, bind_matrix
+
+CHECKPOINT_VERSION = 1
+
+
+def model_params(model):
+    """
+    Constructor arguments of a TransE or RotatE model.
+    """
+    params = {name: getattr(model, name) for name in model.checkpoint_params}
+    params.update(sampling=model.sampler.mode, n_neg=model.n_neg, filter_negatives=model.sampler.filtered)
+    return params
+
+
+def save_checkpoint(model, path):
+    """
+    Writes the embedding matrices, the hyperparameters, the epoch counter, the
+    state of the model's numpy and python RNGs and its triplet ids to one
+    .npz file. The file is written next to path then renamed, so a crash never
+    leaves a partial checkpoint. Plain SGD has no optimizer state besides lr.
+    """
+    py_version, py_state, py_gauss = model.py_rng.getstate()
+    meta = {
+        "version": CHECKPOINT_VERSION,
+        "class": type(model).__name__,
+        "epoch": model.epoch,
+        "params": model_params(model),
+        "rng": model.rng.bit_generator.state,
+        "py_random": [py_version, list(py_state), py_gauss],
+    }
+    arrays = {name: getattr(model, name) for name in MATRICES if hasattr(model, name)}
+    arrays["entities"] = np.array(model.id2ent, dtype=np.str_)
+    arrays["relations"] = np.array(sorted(model.rel2id, key=model.rel2id.get), dtype=np.str_)
+    arrays["triplet_ids"] = model.triplet_ids.astype(np.int32)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8), **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_checkpoint(path):
+    with np.load(path) as data:
+        meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+        arrays = {name: data[name] for name in data.files if name != "meta"}
+    if meta["version"] != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version: {meta['version']}")
+    return meta, arrays
+
+
+def restore_rngs(model, meta):
+    model.rng.bit_generator.state = meta["rng"]
+    py_version, py_state, py_gauss = meta["py_random"]
+    model.py_rng.setstate((py_version, tuple(py_state), py_gauss))
+
+
+def restore_state(model, meta, arrays):
+    for name in MATRICES:
+        if name in arrays:
+            # in place, so that the per-label views see the checkpoint
+            getattr(model, name)[:] = arrays[name]
+    model.epoch = meta["epoch"]
+    restore_rngs(model, meta)
+
+
+def load_checkpoint(cls, path, training=True):
+    """
+    Rebuilds a model from a checkpoint. With training=True the model is built from
+    its triplets (sampler included) and can resume training where it stopped.
+    With training=False only the vocabularies and the matrices are loaded, enough
+    for score, score_tails/score_heads and evaluate.
+    """
+    meta, arrays = read_checkpoint(path)
+    if meta["class"] != cls.__name__:
+        raise ValueError(f"Checkpoint of a {meta['class']} model, not {cls.__name__}")
+    entities = arrays["entities"].tolist()
+    relations = arrays["relations"].tolist()
+
+    if training:
+        model = cls(arrays["triplet_ids"], entities=entities, relations=relations, **meta["params"])
+        restore_state(model, meta, arrays)
+        return model
+
+    model = cls.__new__(cls)
+    model.__dict__.update({k: v for k, v in meta["params"].items() if k in cls.checkpoint_params})
+    model.epoch = meta["epoch"]
+    model.rng = np.random.default_rng()
+    model.py_rng = random.Random()
+    restore_rngs(model, meta)
+    model.id2ent = entities
+    model.entities = set(entities)
+    model.rel = set(relations)
+    model.ent2id = {e: i for i, e in enumerate(entities)}
+    model.rel2id = {r: i for i, r in enumerate(relations)}
+    for name in MATRICES:
+        if name in arrays:
+            bind_matrix(model, name, arrays[name])
+    return model
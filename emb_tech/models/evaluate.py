@@ -0,0 +1,111 @@
+import numpy as np
+
+
+def to_ids(model, triplets):
+    """
+    Converts label triplets to a (N, 3) id array, skipping unknown labels.
+    """
+    ids = [
+        (model.ent2id[h], model.rel2id[r], model.ent2id[t]) for h, r, t in triplets
+        if h in model.ent2id and r in model.rel2id and t in model.ent2id
+    ]
+    return np.array(ids, dtype=np.int64).reshape(-1, 3)
+
+
+class FilterIndex:
+    """
+    Known (h, r) -> tails and (r, t) -> heads, stored as sorted key arrays so that
+    the known answers of a whole batch of queries are gathered without Python loops.
+    """
+    def __init__(self, known_ids, n_ent, n_rel):
+        self.n_ent = n_ent
+        self.n_rel = n_rel
+        h, r, t = known_ids[:, 0], known_ids[:, 1], known_ids[:, 2]
+        self.tail_keys, self.tails = self.sort_by(h * n_rel + r, t)
+        self.head_keys, self.heads = self.sort_by(r * n_ent + t, h)
+
+
+    def sort_by(self, keys, values):
+        order = np.argsort(keys, kind="stable")
+        return keys[order], values[order]
+
+
+    def gather(self, sorted_keys, values, query_keys):
+        """
+        Returns (rows, entities): entity values[...] is a known answer of query row.
+        """
+        lo = np.searchsorted(sorted_keys, query_keys, side="left")
+        hi = np.searchsorted(sorted_keys, query_keys, side="right")
+        counts = hi - lo
+        rows = np.repeat(np.arange(len(query_keys)), counts)
+        # position of each answer inside its query's range
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return rows, values[np.repeat(lo, counts) + offsets]
+
+
+    def known_tails(self, h, r):
+        return self.gather(self.tail_keys, self.tails, h * self.n_rel + r)
+
+
+    def known_heads(self, r, t):
+        return self.gather(self.head_keys, self.heads, r * self.n_ent + t)
+
+
+def ranks(scores, targets, known=None):
+    """
+    Rank of each target among its row of distances (lower is better), computed by
+    counting the better candidates instead of sorting. Ties get the realistic rank,
+    the mean of the optimistic (1 + strictly better) and pessimistic (better or
+    equal, the target included) ones, so that a model scoring everything the same
+    does not get a perfect MRR. In the filtered setting, the other known answers of
+    the row are removed first.
+    """
+    rows = np.arange(len(targets))
+    target_scores = scores[rows, targets]
+    if known is not None:
+        known_rows, known_ents = known
+        keep = known_ents != targets[known_rows]
+        scores[known_rows[keep], known_ents[keep]] = np.inf
+    better = (scores < target_scores[:, None]).sum(axis=1)
+    better_or_equal = (scores <= target_scores[:, None]).sum(axis=1)
+    return (1 + better + better_or_equal) / 2
+
+
+def evaluate(model, test_triplets, k_list=[1, 3, 10], known_triplets=None, batch_size=256):
+    """
+    Head and tail prediction for every test triplet, scored against all entities
+    with one matrix operation per chunk of batch_size triplets.
+    Works with any model exposing ent2id, rel2id, score_tails and score_heads.
+
+    known_triplets (e.g. train + valid) switches to the filtered setting.
+    Returns (MRR, MR, {k: Hits@k}).
+    """
+    test_ids = to_ids(model, test_triplets)
+    if len(test_ids) == 0:
+        return 0.0, 0.0, {k: 0.0 for k in k_list}
+
+    filter_index = None
+    if known_triplets is not None:
+        # the test triplets themselves are true answers too
+        known_ids = np.concatenate([to_ids(model, known_triplets), test_ids])
+        filter_index = FilterIndex(known_ids, len(model.ent2id), len(model.rel2id))
+
+    all_ranks = []
+    for start in range(0, len(test_ids), batch_size):
+        chunk = test_ids[start:start + batch_size]
+        h, r, t = chunk[:, 0], chunk[:, 1], chunk[:, 2]
+
+        # Tail prediction: (h, r, ?)
+        known = filter_index.known_tails(h, r) if filter_index else None
+        all_ranks.append(ranks(model.score_tails(h, r), t, known))
+
+        # Head prediction: (?, r, t)
+        known = filter_index.known_heads(r, t) if filter_index else None
+        all_ranks.append(ranks(model.score_heads(r, t), h, known))
+
+    all_ranks = np.concatenate(all_ranks).astype(np.float64)
+    mrr = float(np.mean(1.0 / all_ranks))
+    mr = float(np.mean(all_ranks))
+    hits_at_k = {k: float(np.mean(all_ranks <= k)) for k in k_list}
+
+    return mrr, mr, hits_at_k
@@ -0,0 +1,162 @@
+import os
+import sys
+import shutil
+import tempfile
+import importlib
+import importlib.util
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# embedding matrix -> (per-label views, label -> id) of the models
+MATRICES = {
+    "ent_emb": ("ent2vec", "ent2id"),
+    "rel_emb": ("rel2vec", "rel2id"),
+    "rel_phase": ("rel2phase", "rel2id"),
+}
+# label data the workers do not need for train_step
+LABEL_ATTRS = ("entities", "rel", "id2ent", "ent2id", "rel2id", "ent2vec", "rel2vec", "rel2phase")
+
+
+def bind_matrix(model, name, array):
+    """
+    Replaces an embedding matrix of the model and rebuilds its per-label views.
+    """
+    setattr(model, name, array)
+    views, ids = MATRICES[name]
+    if hasattr(model, ids):
+        setattr(model, views, {label: array[i] for label, i in getattr(model, ids).items()})
+
+
+# the model of a worker process, its matrices are the shared ones
+_worker_model = None
+
+
+def class_ref(cls):
+    """
+    (module name, module file, class name) of a model class, what a worker needs to
+    import it again.
+    """
+    return cls.__module__, getattr(sys.modules[cls.__module__], "__file__", None), cls.__qualname__
+
+
+def import_class(module_name, path, class_name):
+    """
+    Class of the model in a worker. Without fork the worker does not have the
+    modules its parent loaded from a file (load_emb_tech_class of
+    aba_graph/models/train.py), they are loaded again from the same file.
+    """
+    module = sys.modules.get(module_name)
+    if module is None and path is not None:
+        #the models import sampler, evaluate... from their folder
+        if os.path.dirname(path) not in sys.path:
+            sys.path.append(os.path.dirname(path))
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    elif module is None:
+        module = importlib.import_module(module_name)
+    return getattr(module, class_name)
+
+
+def init_worker(model_class, state, shared):
+    global _worker_model
+    cls = import_class(*model_class)
+    _worker_model = cls.__new__(cls)
+    _worker_model.__dict__.update(state)
+    for name, (path, shape, dtype) in shared.items():
+        setattr(_worker_model, name, np.memmap(path, dtype=dtype, mode="r+", shape=shape))
+
+
+def train_shard(task):
+    """
+    Trains the worker model on its shard of triplet indices, without locks on the
+    shared matrices. Returns the shard loss.
+    """
+    indices, batch_size, seed = task
+    model = _worker_model
+    # own negatives in each worker
+    model.rng = np.random.default_rng(seed)
+    model.sampler.rng = model.rng
+    loss = 0.0
+    for start in range(0, len(indices), batch_size):
+        loss += model.train_step(model.triplet_ids[indices[start:start + batch_size]])
+    return loss
+
+
+class HogwildTrainer:
+    """
+    Hogwild training (Recht et al., 2011) of a TransE or RotatE model: the embedding
+    matrices are moved to memory-mapped files shared by worker processes, each epoch
+    is shuffled and cut into one disjoint shard per worker, and the workers apply
+    their updates asynchronously. While the trainer is open the model reads the
+    shared matrices, close() gives it private copies back.
+    """
+    def __init__(self, model, workers=None):
+        self.model = model
+        self.workers = workers or os.cpu_count() or 1
+        # /dev/shm keeps the shared matrices in memory
+        self.tmp_dir = tempfile.mkdtemp(prefix="hogwild_", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+
+        self.shared = {}
+        self.pool = None
+        try:
+            for name in MATRICES:
+                if not hasattr(model, name):
+                    continue
+                array = getattr(model, name)
+                path = os.path.join(self.tmp_dir, f"{name}.dat")
+                mm = np.memmap(path, dtype=array.dtype, mode="w+", shape=array.shape)
+                mm[:] = array
+                bind_matrix(model, name, mm)
+                self.shared[name] = (path, array.shape, array.dtype.str)
+
+            state = {k: v for k, v in model.__dict__.items() if k not in LABEL_ATTRS and k not in self.shared}
+            #the class goes by reference, the workers import it again with any start method
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                            initargs=(class_ref(type(model)), state, self.shared))
+        except BaseException:
+            self.close()
+            raise
+
+
+    def epoch(self, batch_size=1024):
+        """
+        One epoch over all the triplets, returns the summed loss of the workers.
+        """
+        order = self.model.rng.permutation(len(self.model.triplet_ids))
+        seeds = self.model.rng.integers(2 ** 63, size=self.workers)
+        tasks = [(shard, batch_size, int(seed)) for shard, seed in zip(np.array_split(order, self.workers), seeds)]
+        loss = sum(self.pool.map(train_shard, tasks))
+        self.model.epoch += 1
+        return loss
+
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        for name in self.shared:
+            bind_matrix(self.model, name, np.array(getattr(self.model, name)))
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def train_hogwild(model, epochs=100, batch_size=1024, workers=None, checkpoint_path=None, checkpoint_every=1,
+                  until_epoch=None):
+    """
+    Trains epochs more epochs, or up to until_epoch in total, like train_batch of the models.
+    """
+    epoch_range = model.epoch_range(epochs, until_epoch)
+    with HogwildTrainer(model, workers) as trainer:
+        for e in epoch_range:
+            total_loss = trainer.epoch(batch_size)
+            print(f"Epoch {e+1}/{epoch_range.stop}, Loss: {total_loss:.4f}")
+            model.checkpoint(checkpoint_path, checkpoint_every)
@@ -0,0 +1,270 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from sampler import NegativeSampler
+from vocab import index_triplets
+
+
+class RGCN:
+    """
+    R-GCN encoder (Schlichtkrull et al., 2018) with a DistMult or TransE decoder,
+    trained with negative sampling and a logistic loss.
+
+    Each layer computes H' = act(H W_0 + sum_r A_r H W_r) where A_r is the
+    in-degree normalized adjacency of relation r (inverse relations included)
+    and W_r = sum_b a_rb V_b (basis decomposition). Since
+    sum_r A_r H W_r = sum_b (sum_r a_rb A_r) H V_b, a layer is one scipy CSR
+    product per basis, whatever the number of relations. With fanout set, each
+    step keeps at most fanout random incoming edges per entity.
+    Gradients are written by hand and applied with Adam.
+    """
+    def __init__(self, triplets, emb_dim=32, nlayers=2, n_bases=4, decoder="distmult", gamma=6.0,
+                 lr=0.01, fanout=None, n_neg=1, seed=None, sampling="unif", entities=None, relations=None):
+        """
+        triplets are (h, r, t) label tuples, or an (N, 3) id array with the entities
+        and relations vocabularies it indexes (e.g. a TripleStore split).
+        """
+        if decoder not in ("distmult", "transe"):
+            raise ValueError(f"Unknown decoder: {decoder}")
+        self.emb_dim = emb_dim
+        self.nlayers = nlayers
+        self.decoder = decoder
+        self.gamma = gamma
+        self.lr = lr
+        self.fanout = fanout
+        self.n_neg = n_neg
+        self.rng = np.random.default_rng(seed)
+        self.epoch = 0
+
+        self.id2ent, id2rel, self.triplet_ids = index_triplets(triplets, entities, relations)
+        self.entities = set(self.id2ent)
+        self.rel = set(id2rel)
+        self.ent2id = {e: i for i, e in enumerate(self.id2ent)}
+        self.rel2id = {r: i for i, r in enumerate(id2rel)}
+        n_ent, n_rel = len(self.ent2id), len(self.rel2id)
+        self.sampler = NegativeSampler(self.triplet_ids, n_ent, n_rel, mode=sampling, rng=self.rng)
+
+        # message edges source -> target sorted by target, relation r + n_rel for the inverse direction
+        h, r, t = self.triplet_ids[:, 0], self.triplet_ids[:, 1], self.triplet_ids[:, 2]
+        order = np.argsort(np.concatenate([t, h]), kind="stable")
+        self.src = np.concatenate([h, t])[order]
+        self.dst = np.concatenate([t, h])[order]
+        self.edge_rel = np.concatenate([r, r + n_rel])[order]
+        self.in_degree = np.bincount(self.dst, minlength=n_ent)
+        self.n_edge_rel = 2 * n_rel
+
+        n_bases = min(n_bases, self.n_edge_rel)
+        self.params = {"ent_emb": self.glorot((n_ent, emb_dim)), "rel_emb": self.glorot((n_rel, emb_dim))}
+        for l in range(nlayers):
+            self.params[f"bases_{l}"] = self.glorot((n_bases, emb_dim, emb_dim))
+            self.params[f"coeffs_{l}"] = self.glorot((self.n_edge_rel, n_bases))
+            self.params[f"self_{l}"] = self.glorot((emb_dim, emb_dim))
+        self.adam_m = {k: np.zeros_like(v) for k, v in self.params.items()}
+        self.adam_v = {k: np.zeros_like(v) for k, v in self.params.items()}
+        self.adam_t = 0
+
+        self.encode()
+
+
+    def glorot(self, shape):
+        l = np.sqrt(6 / (shape[-2] + shape[-1]))
+        return self.rng.uniform(-l, l, shape)
+
+
+    def adjacency(self, edges=None):
+        """
+        CSR structure (indptr, source ids, target ids, relations, norms) of the message
+        edges (sorted ids, all by default), the norm of an edge is 1 / in-degree of
+        its (target, relation).
+        """
+        src, dst, rel = self.src, self.dst, self.edge_rel
+        if edges is not None:
+            src, dst, rel = src[edges], dst[edges], rel[edges]
+        n_ent = len(self.ent2id)
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(dst, minlength=n_ent))])
+        degree = np.bincount(dst * self.n_edge_rel + rel, minlength=n_ent * self.n_edge_rel)
+        norm = 1.0 / degree[dst * self.n_edge_rel + rel]
+        return indptr, src, dst, rel, norm
+
+
+    def sample_neighbors(self, fanout):
+        """
+        Sorted ids of the message edges, with at most fanout random incoming edges
+        per entity.
+        """
+        # the edges are sorted by target, shuffle inside each target with a random fraction
+        order = np.argsort(self.dst + self.rng.random(len(self.dst)))
+        counts = self.in_degree
+        rank = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.sort(order[rank < fanout])
+
+
+    def forward(self, adj):
+        """
+        Encoder output and the cache of each layer for backward.
+        """
+        indptr, src, dst, rel, norm = adj
+        n_ent = len(self.ent2id)
+        h = self.params["ent_emb"]
+        cache = []
+        for l in range(self.nlayers):
+            coeffs, bases = self.params[f"coeffs_{l}"], self.params[f"bases_{l}"]
+            # M_b = sum_r a_rb A_r shares the sparsity pattern of the edges
+            mats = [csr_matrix((coeffs[rel, b] * norm, src, indptr), shape=(n_ent, n_ent))
+                    for b in range(len(bases))]
+            msgs = [m @ h for m in mats]
+            z = h @ self.params[f"self_{l}"] + sum(p @ v for p, v in zip(msgs, bases))
+            cache.append((h, mats, msgs, z))
+            h = np.maximum(z, 0) if l < self.nlayers - 1 else z
+        return h, cache
+
+
+    def backward(self, grad_out, adj, cache):
+        indptr, src, dst, rel, norm = adj
+        grads = {}
+        g = grad_out
+        for l in reversed(range(self.nlayers)):
+            h, mats, msgs, z = cache[l]
+            if l < self.nlayers - 1:
+                g = g * (z > 0)
+            bases = self.params[f"bases_{l}"]
+            grads[f"self_{l}"] = h.T @ g
+            grads[f"bases_{l}"] = np.stack([p.T @ g for p in msgs])
+            grad_h = g @ self.params[f"self_{l}"].T
+            grad_coeffs = np.zeros_like(self.params[f"coeffs_{l}"])
+            # edges sorted by target: g[dst] is a repeat
+            g_dst = np.repeat(g, np.diff(indptr), axis=0)
+            h_src = h[src]
+            for b, (m, v) in enumerate(zip(mats, bases)):
+                grad_h += m.T @ (g @ v.T)
+                # d/da_rb: sum over the edges of r of norm * <g[target] V_b^T, h[source]>
+                edge_grad = norm * np.einsum("ij,ij->i", g_dst @ v.T, h_src)
+                grad_coeffs[:, b] = np.bincount(rel, weights=edge_grad, minlength=self.n_edge_rel)
+            grads[f"coeffs_{l}"] = grad_coeffs
+            g = grad_h
+        grads["ent_emb"] = g
+        return grads
+
+
+    def logits(self, out, h, r, t):
+        rel = self.params["rel_emb"][r]
+        if self.decoder == "distmult":
+            return (out[h] * rel * out[t]).sum(axis=1)
+        return self.gamma - np.linalg.norm(out[h] + rel - out[t], axis=1)
+
+
+    def decoder_grads(self, out, h, r, t, grad_logit):
+        """
+        Gradients of sum(grad_logit * logit) for the encoder output and the relations.
+        """
+        rel = self.params["rel_emb"][r]
+        g = grad_logit[:, None]
+        if self.decoder == "distmult":
+            grad_h, grad_t, grad_r = g * rel * out[t], g * rel * out[h], g * out[h] * out[t]
+        else:
+            diff = out[h] + rel - out[t]
+            unit = diff / np.maximum(np.linalg.norm(diff, axis=1, keepdims=True), 1e-12)
+            grad_h, grad_t, grad_r = -g * unit, g * unit, -g * unit
+        grad_out = np.zeros_like(out)
+        np.add.at(grad_out, h, grad_h)
+        np.add.at(grad_out, t, grad_t)
+        grad_rel = np.zeros_like(self.params["rel_emb"])
+        np.add.at(grad_rel, r, grad_r)
+        return grad_out, grad_rel
+
+
+    def adam(self, grads, beta1=0.9, beta2=0.999, eps=1e-8):
+        self.adam_t += 1
+        for k, g in grads.items():
+            self.adam_m[k] = beta1 * self.adam_m[k] + (1 - beta1) * g
+            self.adam_v[k] = beta2 * self.adam_v[k] + (1 - beta2) * g * g
+            m_hat = self.adam_m[k] / (1 - beta1 ** self.adam_t)
+            v_hat = self.adam_v[k] / (1 - beta2 ** self.adam_t)
+            self.params[k] -= self.lr * m_hat / (np.sqrt(v_hat) + eps)
+
+
+    def train_step(self, batch):
+        """
+        One Adam step on a (B, 3) array of triplet ids, returns the batch loss.
+        """
+        neg = self.sampler.sample(batch, self.n_neg).reshape(-1, 3)
+        triples = np.concatenate([batch, neg])
+        labels = np.concatenate([np.ones(len(batch)), np.zeros(len(neg))])
+        h, r, t = triples[:, 0], triples[:, 1], triples[:, 2]
+
+        edges = self.sample_neighbors(self.fanout) if self.fanout else None
+        adj = self.adjacency(edges)
+        out, cache = self.forward(adj)
+
+        logit = self.logits(out, h, r, t)
+        # mean logistic loss, d/dlogit = sigmoid(logit) - label
+        loss = np.logaddexp(0, logit) - labels * logit
+        grad_logit = (1 / (1 + np.exp(-logit)) - labels) / len(triples)
+
+        grad_out, grad_rel = self.decoder_grads(out, h, r, t, grad_logit)
+        grads = self.backward(grad_out, adj, cache)
+        grads["rel_emb"] = grad_rel
+        self.adam(grads)
+        return float(loss.sum())
+
+
+    def train(self, epochs=50, batch_size=1024, until_epoch=None):
+        """
+        Trains epochs more epochs, or up to until_epoch in total, then encodes the
+        full graph for scoring.
+        """
+        last = self.epoch + epochs if until_epoch is None else until_epoch
+        for e in range(self.epoch, last):
+            order = self.rng.permutation(len(self.triplet_ids))
+            total_loss = 0.0
+
+            for start in range(0, len(order), batch_size):
+                total_loss += self.train_step(self.triplet_ids[order[start:start + batch_size]])
+
+            self.epoch = e + 1
+            print(f"Epoch {e+1}/{last}, Loss: {total_loss:.4f}")
+        self.encode()
+
+
+    def encode(self):
+        """
+        Entity embeddings of the encoder on all the edges, used for scoring.
+        """
+        self.ent_out, _ = self.forward(self.adjacency())
+        self.ent2vec = {e: self.ent_out[i] for e, i in self.ent2id.items()}
+        self.rel2vec = {r: self.params["rel_emb"][i] for r, i in self.rel2id.items()}
+
+
+    def score_tails(self, h, r):
+        """
+        Distances of (h, r, e) for every entity e (lower is better), as a (B, n_ent) array.
+        """
+        rel = self.params["rel_emb"][r]
+        if self.decoder == "distmult":
+            return -(self.ent_out[h] * rel) @ self.ent_out.T
+        return self.batch_l2(self.ent_out[h] + rel)
+
+
+    def score_heads(self, r, t):
+        """
+        Distances of (e, r, t) for every entity e.
+        """
+        rel = self.params["rel_emb"][r]
+        if self.decoder == "distmult":
+            return -(self.ent_out[t] * rel) @ self.ent_out.T
+        return self.batch_l2(self.ent_out[t] - rel)
+
+
+    def batch_l2(self, queries):
+        sq = ((queries ** 2).sum(axis=1)[:, None] + (self.ent_out ** 2).sum(axis=1)[None, :]
+              - 2 * queries @ self.ent_out.T)
+        return np.sqrt(np.maximum(sq, 0))
+
+
+    def score(self, h, r, t):
+        """
+        Distance of one label triplet, lower is better like the other models.
+        """
+        ids = (np.array([self.ent2id[h]]), np.array([self.rel2id[r]]), np.array([self.ent2id[t]]))
+        logit = self.logits(self.ent_out, *ids)[0]
+        return float(-logit if self.decoder == "distmult" else self.gamma - logit)
@@ -1,33 +1,58 @@
 import numpy as np
 import random
 
+from sampler import NegativeSampler
+from vocab import index_triplets
+from hogwild import train_hogwild
+from evaluate import evaluate
+from checkpoint import save_checkpoint, load_checkpoint
+
 class RotatE:
-    def __init__(self, triplets, emb_dim=50, gamma=6.0, lr=0.01):
-        self.triplets = triplets 
+    # constructor arguments saved in checkpoints
+    checkpoint_params = ("emb_dim", "gamma", "lr")
+
+    def __init__(self, triplets, emb_dim=50, gamma=6.0, lr=0.01, seed=None,
+                 sampling="unif", n_neg=1, filter_negatives=False, entities=None, relations=None):
+        """
+        triplets are (h, r, t) label tuples, or an (N, 3) id array with the entities
+        and relations vocabularies it indexes (e.g. a TripleStore split).
+        """
         self.emb_dim = emb_dim
         self.gamma = gamma
         self.lr = lr
-
-        self.entities = set([h for h,_,t in triplets] + [t for h,_,t in triplets])
-        self.rel = set([r for _,r,_ in triplets])
-
-        self.ent2vec = {
-            e: self.init_complex_emb() for e in self.entities
-        }
-
-        self.rel2phase = {
-            r: self.init_phase_emb() for r in self.rel
-        }
-
-
-    def init_complex_emb(self):
-        phase = np.random.uniform(0, 2 * np.pi, self.emb_dim)
-        rad = np.random.uniform(0, 1, self.emb_dim)
-        return rad * (np.cos(phase) + 1j * np.sin(phase))
+        self.rng = np.random.default_rng(seed)
+        # python RNG of the negatives of train, saved in checkpoints
+        self.py_rng = random.Random(seed)
+        # epochs done, training resumes from there
+        self.epoch = 0
+
+        self.id2ent, id2rel, self.triplet_ids = index_triplets(triplets, entities, relations)
+        self.entities = set(self.id2ent)
+        self.rel = set(id2rel)
+
+        # complex64 entity matrix and float32 phase matrix indexed by integer ids
+        self.ent2id = {e: i for i, e in enumerate(self.id2ent)}
+        self.rel2id = {r: i for i, r in enumerate(id2rel)}
+        self.ent_emb = self.init_complex_emb(len(self.ent2id))
+        self.rel_phase = self.init_phase_emb(len(self.rel2id))
+
+        # per-label views on the matrix rows, they stay in sync with in-place updates
+        self.ent2vec = {e: self.ent_emb[i] for e, i in self.ent2id.items()}
+        self.rel2phase = {r: self.rel_phase[i] for r, i in self.rel2id.items()}
+
+        self.n_neg = n_neg
+        self.sampler = NegativeSampler(self.triplet_ids, len(self.ent2id), len(self.rel2id),
+                                       mode=sampling, filtered=filter_negatives, rng=self.rng)
+
+
+    def init_complex_emb(self, n):
+        phase = self.rng.uniform(0, 2 * np.pi, (n, self.emb_dim))
+        rad = self.rng.uniform(0, 1, (n, self.emb_dim))
+        return (rad * (np.cos(phase) + 1j * np.sin(phase))).astype(np.complex64)
     
     
-    def init_phase_emb(self):
-        return np.random.uniform(-np.pi, np.pi, self.emb_dim)
+    def init_phase_emb(self, n):
+        return self.rng.uniform(-np.pi, np.pi, (n, self.emb_dim)).astype(np.float32)
 
 
     def dist(self, h, r, t):
@@ -37,25 +62,44 @@ class RotatE:
 
     def project_disk(self, vec):
         norm = np.abs(vec)
-        return np.where(norm > 1, vec / norm, vec)
+        return np.where(norm > 1, vec / np.maximum(norm, 1), vec)
 
 
     def corrupt_triplets(self, h, r, t):
-        corrupt_h = random.random() < 0.5
+        corrupt_h = self.py_rng.random() < 0.5
         if corrupt_h:
-            h_corr = random.choice(list(self.entities - {h}))
+            h_corr = self.random_entity_except(h)
             return (h_corr, r, t)
         else:
-            t_corr = random.choice(list(self.entities - {t}))
+            t_corr = self.random_entity_except(t)
             return (h, r, t_corr)
         
 
-    def train(self, epochs=10):
-        for e in range(epochs):
+    def random_entity_except(self, ent):
+        # rejection sampling, no copy of the entity set per call
+        if len(self.id2ent) < 2:
+            return ent
+        while True:
+            candidate = self.py_rng.choice(self.id2ent)
+            if candidate != ent:
+                return candidate
+
+
+    def train(self, epochs=10, checkpoint_path=None, checkpoint_every=1, until_epoch=None):
+        """
+        Trains epochs more epochs, or up to until_epoch in total, with a checkpoint
+        every checkpoint_every epochs when checkpoint_path is set. The triplets are
+        visited in a permutation of the model's RNG, so that a resumed run is the
+        same as an uninterrupted one.
+        """
+        epoch_range = self.epoch_range(epochs, until_epoch)
+        id2rel = sorted(self.rel2id, key=self.rel2id.get)
+        for e in epoch_range:
             loss_total = 0.0
-            random.shuffle(self.triplets)
 
-            for h, r, t in self.triplets:
+            for i in self.rng.permutation(len(self.triplet_ids)):
+                h, r, t = self.triplet_ids[i]
+                h, r, t = self.id2ent[h], id2rel[r], self.id2ent[t]
                 h_c, r_c, t_c = self.corrupt_triplets(h, r, t)
 
                 h_vec = self.ent2vec[h]
@@ -76,16 +120,128 @@ class RotatE:
                     self.ent2vec[h] -= self.lr * grad
                     self.ent2vec[t] += self.lr * grad
 
-                    gneg = (hc_vec * np.exp(1j * r_phase) - t_vec)
+                    gneg = (hc_vec * np.exp(1j * r_phase) - tc_vec)
                     self.ent2vec[h_c] += self.lr * gneg
                     self.ent2vec[t_c] -= self.lr * gneg
 
-                    self.ent2vec[h] = self.project_disk(self.ent2vec[h])
-                    self.ent2vec[t] = self.project_disk(self.ent2vec[t])
-                    self.ent2vec[h_c] = self.project_disk(self.ent2vec[h_c])
-                    self.ent2vec[t_c] = self.project_disk(self.ent2vec[t_c])
+                    # in place, so that ent_emb sees the update
+                    self.ent2vec[h][:] = self.project_disk(self.ent2vec[h])
+                    self.ent2vec[t][:] = self.project_disk(self.ent2vec[t])
+                    self.ent2vec[h_c][:] = self.project_disk(self.ent2vec[h_c])
+                    self.ent2vec[t_c][:] = self.project_disk(self.ent2vec[t_c])
+
+            print(f"Epoch {e+1}/{epoch_range.stop}, Loss : {loss_total:.4f}")
+            self.epoch = e + 1
+            self.checkpoint(checkpoint_path, checkpoint_every)
+
+
+    def train_batch(self, epochs=10, batch_size=1024, checkpoint_path=None, checkpoint_every=1, until_epoch=None):
+        """
+        Mini-batched training on the embedding matrices, updating both the entity
+        vectors and the relation phases. Same epoch counting and checkpoints as train.
+        """
+        epoch_range = self.epoch_range(epochs, until_epoch)
+        for e in epoch_range:
+            order = self.rng.permutation(len(self.triplet_ids))
+            loss_total = 0.0
 
-            print(f"Epoch {e+1}/{epochs}, Loss : {loss_total:.4f}")
+            for start in range(0, len(order), batch_size):
+                loss_total += self.train_step(self.triplet_ids[order[start:start + batch_size]])
+
+            print(f"Epoch {e+1}/{epoch_range.stop}, Loss : {loss_total:.4f}")
+            self.epoch = e + 1
+            self.checkpoint(checkpoint_path, checkpoint_every)
+
+
+    def train_parallel(self, epochs=100, batch_size=1024, workers=None, checkpoint_path=None, checkpoint_every=1,
+                       until_epoch=None):
+        """
+        Hogwild training: worker processes share the embedding matrices and train
+        on disjoint shards of each epoch without locks (see hogwild.py).
+        """
+        train_hogwild(self, epochs, batch_size, workers, checkpoint_path, checkpoint_every, until_epoch)
+
+
+    def save(self, path):
+        """
+        Checkpoint of the model, see checkpoint.py.
+        """
+        save_checkpoint(self, path)
+
+
+    @classmethod
+    def load(cls, path, training=True):
+        """
+        Model of a checkpoint, training=False only loads what scoring needs.
+        """
+        return load_checkpoint(cls, path, training)
+
+
+    def checkpoint(self, path, every):
+        if path and (self.epoch % every == 0):
+            save_checkpoint(self, path)
+
+
+    def epoch_range(self, epochs, until_epoch=None):
+        """
+        Epochs to run: epochs more, or up to until_epoch in total (a resumed model
+        then only runs the missing ones).
+        """
+        last = self.epoch + epochs if until_epoch is None else until_epoch
+        if last <= self.epoch:
+            print(f"Already trained for {self.epoch} epochs, no epoch to run")
+        return range(self.epoch, last)
+
+
+    def batch_grads(self, h_vec, r_phase, t_vec):
+        """
+        Distances ||h * exp(i r) - t|| of a batch and their gradients with respect
+        to h, r and t (for complex parameters, the real gradient packed as a complex number).
+        """
+        rot = np.exp(1j * r_phase)
+        diff = h_vec * rot - t_vec
+        dist = np.linalg.norm(diff, axis=1)
+        unit = diff / np.maximum(dist, 1e-12)[:, None]
+
+        grad_h = unit * np.conj(rot)
+        grad_r = np.real(np.conj(unit) * 1j * h_vec * rot)
+        grad_t = -unit
+        return dist, grad_h, grad_r, grad_t
+
+
+    def train_step(self, batch):
+        """
+        One SGD step on a (B, 3) array of triplet ids, returns the batch loss.
+        """
+        # k negatives per positive, the positives are repeated to match
+        neg = self.sampler.sample(batch, self.n_neg).reshape(-1, 3)
+        batch = np.repeat(batch, self.n_neg, axis=0)
+        h, r, t = batch[:, 0], batch[:, 1], batch[:, 2]
+        h_c, t_c = neg[:, 0], neg[:, 2]
+
+        r_phase = self.rel_phase[r]
+        pos_dist, gh, gr, gt = self.batch_grads(self.ent_emb[h], r_phase, self.ent_emb[t])
+        neg_dist, gh_c, gr_c, gt_c = self.batch_grads(self.ent_emb[h_c], r_phase, self.ent_emb[t_c])
+
+        loss = np.maximum(0, self.gamma + pos_dist - neg_dist)
+        active = loss > 0
+        if not active.any():
+            return 0.0
+
+        lr = self.lr
+        np.add.at(self.ent_emb, h[active], (-lr * gh[active]).astype(np.complex64))
+        np.add.at(self.ent_emb, t[active], (-lr * gt[active]).astype(np.complex64))
+        np.add.at(self.ent_emb, h_c[active], (lr * gh_c[active]).astype(np.complex64))
+        np.add.at(self.ent_emb, t_c[active], (lr * gt_c[active]).astype(np.complex64))
+        np.add.at(self.rel_phase, r[active], (-lr * (gr[active] - gr_c[active])).astype(np.float32))
+
+        # one projection per batch on the touched rows
+        touched = np.unique(np.concatenate([h[active], t[active], h_c[active], t_c[active]]))
+        self.ent_emb[touched] = self.project_disk(self.ent_emb[touched])
+        touched_rel = np.unique(r[active])
+        self.rel_phase[touched_rel] = np.angle(np.exp(1j * self.rel_phase[touched_rel]))
+
+        return float(loss.sum())
 
     def score(self, h, r, t):
         h_vec = self.ent2vec[h]
@@ -93,49 +249,53 @@ class RotatE:
         t_vec = self.ent2vec[t]
         return self.dist(h_vec, r_phase, t_vec)
 
+    def tail_queries(self, h, r):
+        """
+        Query vectors h * exp(i r) of (h, r, ?): the distance of (h, r, e) is ||q - e||.
+        """
+        return self.ent_emb[h] * np.exp(1j * self.rel_phase[r])
+
+
+    def head_queries(self, r, t):
+        """
+        Query vectors t * exp(-i r) of (?, r, t): since |exp(i r)| = 1,
+        ||e * exp(i r) - t|| = ||e - t * exp(-i r)||.
+        """
+        return self.ent_emb[t] * np.exp(-1j * self.rel_phase[r])
 
-def eval(model, test_triplets, k_list=[1, 3, 10]):
-    hits_at_k = {k: 0 for k in k_list}
-    mrr = 0.0
-    total = 0
 
-    entities = list(model.ent2vec.keys())
+    def score_tails(self, h, r):
+        """
+        Distances of (h, r, e) for every entity e, as a (B, n_ent) array.
+        """
+        return self.batch_scores(self.tail_queries(h, r))
 
-    for h, r, t in test_triplets:
-        if h not in model.ent2vec or r not in model.rel2phase or t not in model.ent2vec:
-            continue
 
-        # Tail prediction: (h, r, ?)
-        tail_scores = []
-        for candidate in entities:
-            score = model.score(h, r, candidate)
-            tail_scores.append((candidate, score))
-        tail_scores = sorted(tail_scores, key=lambda x: x[1])
-        tail_ranked = [ent for ent, _ in tail_scores]
-        tail_rank = tail_ranked.index(t) + 1
+    def score_heads(self, r, t):
+        """
+        Distances of (e, r, t) for every entity e.
+        """
+        return self.batch_scores(self.head_queries(r, t))
 
-        mrr += 1.0 / tail_rank
-        for k in k_list:
-            if tail_rank <= k:
-                hits_at_k[k] += 1
 
-        # Head prediction: (?, r, t)
-        head_scores = []
-        for candidate in entities:
-            score = model.score(candidate, r, t)
-            head_scores.append((candidate, score))
-        head_scores = sorted(head_scores, key=lambda x: x[1])
-        head_ranked = [ent for ent, _ in head_scores]
-        head_rank = head_ranked.index(h) + 1
+    def candidate_scores(self, queries, candidates):
+        """
+        Distances between each query and its own (B, C) candidate entity ids.
+        """
+        return np.linalg.norm(queries[:, None, :] - self.ent_emb[candidates], axis=2)
 
-        mrr += 1.0 / head_rank
-        for k in k_list:
-            if head_rank <= k:
-                hits_at_k[k] += 1
 
-        total += 2  # two predictions per test triplet
+    def batch_scores(self, queries):
+        # ||q - e||^2 = |q|^2 + |e|^2 - 2 Re(q . conj(e)), a single matrix product
+        sq = ((np.abs(queries) ** 2).sum(axis=1)[:, None] + (np.abs(self.ent_emb) ** 2).sum(axis=1)[None, :]
+              - 2 * np.real(queries @ np.conj(self.ent_emb).T))
+        return np.sqrt(np.maximum(sq, 0))
 
-    mrr /= total
-    hits_at_k = {k: v / total for k, v in hits_at_k.items()}
 
+def eval(model, test_triplets, k_list=[1, 3, 10], known_triplets=None, batch_size=256):
+    """
+    Link prediction on the test triplets, returns (MRR, Hits@k).
+    Pass the train/valid triplets as known_triplets for the filtered setting.
+    """
+    mrr, _, hits_at_k = evaluate(model, test_triplets, k_list, known_triplets, batch_size)
     return mrr, hits_at_k
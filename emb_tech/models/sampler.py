@@ -0,0 +1,106 @@
+import numpy as np
+
+
+class NegativeSampler:
+    """
+    Negative sampling over integer triplet ids (h, r, t).
+
+    mode="unif" corrupts the head or the tail with probability 1/2,
+    mode="bern" corrupts the head with probability tph / (tph + hpt) of the relation
+    (Wang et al., 2014), so that 1-to-N relations mostly get their head replaced.
+    With filtered=True, corruptions that are known true triplets are rejected.
+    """
+    def __init__(self, triplet_ids, n_ent, n_rel, mode="unif", filtered=False, known_triplets=None, rng=None):
+        self.n_ent = n_ent
+        self.n_rel = n_rel
+        self.mode = mode
+        self.filtered = filtered
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # negatives returned as known triplets, none of their corruptions being valid
+        self.unfiltered = 0
+
+        if mode == "bern":
+            self.head_prob = self.bernoulli_probs(triplet_ids)
+        elif mode == "unif":
+            self.head_prob = np.full(n_rel, 0.5)
+        else:
+            raise ValueError(f"Unknown sampling mode: {mode}")
+
+        # sorted encoded keys, membership is a vectorized binary search
+        known = triplet_ids if known_triplets is None else np.concatenate([triplet_ids, known_triplets])
+        self.known_keys = np.unique(self.encode(known))
+
+
+    def encode(self, triplets):
+        triplets = triplets.astype(np.int64)
+        return (triplets[..., 0] * self.n_rel + triplets[..., 1]) * self.n_ent + triplets[..., 2]
+
+
+    def is_known(self, triplets):
+        keys = self.encode(triplets)
+        pos = np.searchsorted(self.known_keys, keys)
+        pos = np.minimum(pos, len(self.known_keys) - 1)
+        return self.known_keys[pos] == keys
+
+
+    def bernoulli_probs(self, triplet_ids):
+        """
+        Probability of corrupting the head for each relation: tph / (tph + hpt).
+        """
+        h, r, t = triplet_ids[:, 0], triplet_ids[:, 1], triplet_ids[:, 2]
+        # distinct (r, h) and (r, t) pairs per relation
+        n_heads = np.bincount(np.unique(r * self.n_ent + h) // self.n_ent, minlength=self.n_rel)
+        n_tails = np.bincount(np.unique(r * self.n_ent + t) // self.n_ent, minlength=self.n_rel)
+        n_triplets = np.bincount(r, minlength=self.n_rel)
+
+        tph = n_triplets / np.maximum(n_heads, 1)
+        hpt = n_triplets / np.maximum(n_tails, 1)
+        return np.where(tph + hpt > 0, tph / np.maximum(tph + hpt, 1e-12), 0.5)
+
+
+    def sample(self, batch, k=1, max_tries=10):
+        """
+        Returns k corrupted triplets per positive as a (B, k, 3) array.
+        The replacement entity is never the original one. When filtered, draws
+        that are known triplets are drawn again, at most max_tries times, then
+        the leftovers are drawn among their valid corruptions (draw_valid).
+        """
+        if self.n_ent < 2:
+            raise ValueError("Negative sampling needs at least 2 entities")
+        neg = np.repeat(batch[:, None, :], k, axis=1)
+        corrupt_h = self.rng.random((len(batch), k)) < self.head_prob[batch[:, 1]][:, None]
+        col = np.where(corrupt_h, 0, 2)
+        original = np.take_along_axis(neg, col[..., None], axis=2)[..., 0]
+
+        todo = np.ones((len(batch), k), dtype=bool)
+        for _ in range(max_tries if self.filtered else 1):
+            rows, slots = np.nonzero(todo)
+            if len(rows) == 0:
+                break
+            # n_ent - 1 values shifted past the original entity, which is never drawn
+            draw = self.rng.integers(0, self.n_ent - 1, len(rows))
+            draw += draw >= original[rows, slots]
+            neg[rows, slots, col[rows, slots]] = draw
+            todo[rows, slots] = self.is_known(neg[rows, slots]) if self.filtered else False
+
+        for row, slot in zip(*np.nonzero(todo)):
+            neg[row, slot] = self.draw_valid(batch[row], col[row, slot])
+        return neg
+
+
+    def draw_valid(self, triplet, col):
+        """
+        Uniform draw among the corruptions of column col (0 or 2) of triplet that
+        are not known triplets, or of the other column if there is none. Triplets
+        with no valid corruption at all are returned as is and counted in
+        self.unfiltered.
+        """
+        for c in (col, 2 - col):
+            candidates = np.repeat(triplet[None, :], self.n_ent, axis=0)
+            candidates[:, c] = np.arange(self.n_ent)
+            valid = ~self.is_known(candidates)
+            valid[triplet[c]] = False
+            if valid.any():
+                return candidates[self.rng.choice(np.flatnonzero(valid))]
+        self.unfiltered += 1
+        return triplet
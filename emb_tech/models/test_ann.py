@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from ann import IVFIndex, QueryIndex, recall
+from rotatE import RotatE
+from transE import TransE
+
+TRIPLETS = [(f"e{(i * 7) % 60}", f"r{i % 5}", f"e{(i * 13 + 1) % 60}") for i in range(300)]
+
+
+def test_empty_index_is_rejected():
+    with pytest.raises(ValueError):
+        IVFIndex(np.zeros((0, 4)))
+
+
+def test_full_probe_is_exact():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 8)).astype(np.float32)
+    queries = rng.normal(size=(20, 8)).astype(np.float32)
+    index = IVFIndex(vectors, n_lists=10)
+    ids, dists = index.search(queries, k=5, n_probe=10)
+
+    exact = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    assert np.array_equal(np.sort(ids, axis=1), np.sort(np.argsort(exact, axis=1)[:, :5], axis=1))
+    assert np.allclose(dists, np.sort(exact, axis=1)[:, :5], rtol=1e-4, atol=1e-4)
+
+
+def test_lists_partition_the_vectors():
+    index = IVFIndex(np.random.default_rng(1).normal(size=(50, 3)), n_lists=7)
+    assert np.array_equal(np.sort(index.ids), np.arange(50))
+    assert index.offsets[-1] == 50
+
+
+def test_k_larger_than_the_entities_is_clamped():
+    index = IVFIndex(np.eye(3))
+    ids, dists = index.search(np.eye(3), k=10)
+    assert ids.shape == (3, 3)
+    assert np.array_equal(ids[:, 0], [0, 1, 2])
+
+
+@pytest.mark.parametrize("cls", [TransE, RotatE])
+def test_reranked_queries_match_brute_force(cls):
+    kwargs = {"norm": "L2"} if cls is TransE else {}
+    model = cls(TRIPLETS, emb_dim=8, seed=0, **kwargs)
+    model.train_batch(2, batch_size=64)
+    query_index = QueryIndex(model, n_lists=4)
+    h, r = model.triplet_ids[:30, 0], model.triplet_ids[:30, 1]
+    queries = model.tail_queries(h, r)
+
+    ids, dists = query_index.tails(h, r, k=5, n_probe=4, rerank=2)
+    assert np.allclose(dists, np.take_along_axis(model.score_tails(h, r), ids, axis=1), rtol=1e-4, atol=1e-4)
+    assert recall(query_index, queries, k=5, n_probe=4, rerank=2)[0] == 1.0
+    assert recall(query_index, queries, k=100, n_probe=4)[0] == 1.0
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from checkpoint import read_checkpoint
+from rotatE import RotatE
+from transE import TransE
+
+TRIPLETS = [(f"e{i % 40}", f"r{i % 3}", f"e{(i * 7) % 50}") for i in range(300)]
+
+
+def matrices(model):
+    return [getattr(model, name) for name in ("ent_emb", "rel_emb", "rel_phase") if hasattr(model, name)]
+
+
+def assert_same(a, b):
+    assert a.epoch == b.epoch
+    for x, y in zip(matrices(a), matrices(b)):
+        assert np.array_equal(x, y)
+
+
+@pytest.mark.parametrize("method", ["train", "train_batch", "train_parallel"])
+@pytest.mark.parametrize("cls", [TransE, RotatE])
+def test_resume_is_bit_exact(tmp_path, cls, method):
+    kwargs = {"workers": 1} if method == "train_parallel" else {}
+    path = str(tmp_path / "model.npz")
+
+    uninterrupted = cls(TRIPLETS, seed=0)
+    getattr(uninterrupted, method)(4, **kwargs)
+
+    stopped = cls(TRIPLETS, seed=0)
+    getattr(stopped, method)(2, **kwargs)
+    stopped.save(path)
+
+    resumed = cls.load(path)
+    getattr(resumed, method)(until_epoch=4, **kwargs)
+    assert_same(uninterrupted, resumed)
+
+    # epochs are additive without until_epoch
+    resumed = cls.load(path)
+    getattr(resumed, method)(2, **kwargs)
+    assert_same(uninterrupted, resumed)
+
+
+@pytest.mark.parametrize("cls", [TransE, RotatE])
+def test_checkpoint_every(tmp_path, cls):
+    path = str(tmp_path / "model.npz")
+    model = cls(TRIPLETS, seed=1)
+    model.train_batch(5, checkpoint_path=path, checkpoint_every=2)
+    meta, _ = read_checkpoint(path)
+    assert meta["epoch"] == 4
+
+
+@pytest.mark.parametrize("cls", [TransE, RotatE])
+def test_scoring_model_matches(tmp_path, cls):
+    path = str(tmp_path / "model.npz")
+    model = cls(TRIPLETS, seed=2)
+    model.train_batch(2)
+    model.save(path)
+
+    scoring = cls.load(path, training=False)
+    assert scoring.epoch == 2
+    for h, r, t in TRIPLETS[:20]:
+        assert scoring.score(h, r, t) == model.score(h, r, t)
+
+
+def test_wrong_class_is_rejected(tmp_path):
+    path = str(tmp_path / "model.npz")
+    TransE(TRIPLETS, seed=0).save(path)
+    with pytest.raises(ValueError):
+        RotatE.load(path)
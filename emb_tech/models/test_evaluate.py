@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from evaluate import evaluate, ranks
+from transE import TransE
+
+TRIPLETS = [(f"e{i % 15}", f"r{i % 3}", f"e{(i * 4 + 2) % 15}") for i in range(60)]
+
+
+def test_ties_get_the_realistic_rank():
+    scores = np.array([[1.0, 1.0, 1.0, 1.0], [0.5, 2.0, 2.0, 3.0]])
+    assert ranks(scores.copy(), np.array([0, 1])).tolist() == [2.5, 2.5]
+
+
+def test_filtered_rank_ignores_the_other_known_answers():
+    scores = np.array([[0.1, 0.2, 0.3, 0.4]])
+    known = (np.array([0, 0, 0]), np.array([0, 1, 3]))
+    assert ranks(scores.copy(), np.array([3]), known).tolist() == [2.0]
+
+
+def brute_force_ranks(model, test, known):
+    """
+    Tail then head rank of each test triplet, one candidate at a time.
+    """
+    entities = model.id2ent
+    result = []
+    for h, r, t in test:
+        for target, corrupt in ((t, lambda e: (h, r, e)), (h, lambda e: (e, r, t))):
+            target_score = model.score(*corrupt(target))
+            scores = [model.score(*corrupt(e)) for e in entities
+                      if e == target or known is None or corrupt(e) not in known]
+            better = sum(s < target_score for s in scores)
+            equal = sum(s == target_score for s in scores)
+            result.append(1 + better + (equal - 1) / 2)
+    return np.array(result)
+
+
+@pytest.mark.parametrize("filtered", [False, True])
+def test_matches_brute_force(filtered):
+    model = TransE(TRIPLETS[:45], emb_dim=8, seed=0, norm="L2")
+    model.train_batch(3, batch_size=16)
+    test = [triplet for triplet in TRIPLETS[45:] if triplet[0] in model.ent2id and triplet[2] in model.ent2id]
+    assert test
+    known = set(TRIPLETS[:45]) | set(test) if filtered else None
+
+    mrr, mr, hits = evaluate(model, test, [1, 3, 10], TRIPLETS[:45] if filtered else None, batch_size=4)
+    expected = brute_force_ranks(model, test, known)
+    assert mr == pytest.approx(expected.mean(), rel=1e-6)
+    assert mrr == pytest.approx((1 / expected).mean(), rel=1e-6)
+    assert hits[10] == pytest.approx((expected <= 10).mean())
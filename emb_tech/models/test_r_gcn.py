@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from r_gcn import RGCN
+
+TRIPLETS = [(f"e{i % 12}", f"r{i % 3}", f"e{(i * 5 + 1) % 12}") for i in range(40)]
+
+
+def loss_and_grads(model, triples, labels, adj):
+    """
+    Mean logistic loss of train_step and its gradients, without the Adam update.
+    """
+    h, r, t = triples[:, 0], triples[:, 1], triples[:, 2]
+    out, cache = model.forward(adj)
+    logit = model.logits(out, h, r, t)
+    loss = (np.logaddexp(0, logit) - labels * logit).sum() / len(triples)
+    grad_logit = (1 / (1 + np.exp(-logit)) - labels) / len(triples)
+    grad_out, grad_rel = model.decoder_grads(out, h, r, t, grad_logit)
+    grads = model.backward(grad_out, adj, cache)
+    grads["rel_emb"] = grad_rel
+    return loss, grads
+
+
+@pytest.mark.parametrize("fanout", [None, 2])
+@pytest.mark.parametrize("decoder", ["distmult", "transe"])
+def test_gradients_match_finite_differences(decoder, fanout):
+    model = RGCN(TRIPLETS, emb_dim=6, nlayers=2, n_bases=2, decoder=decoder, gamma=1.0, seed=0)
+    batch = model.triplet_ids[:10]
+    neg = model.sampler.sample(batch, 1).reshape(-1, 3)
+    triples = np.concatenate([batch, neg])
+    labels = np.concatenate([np.ones(len(batch)), np.zeros(len(neg))])
+    adj = model.adjacency(model.sample_neighbors(fanout) if fanout else None)
+
+    _, grads = loss_and_grads(model, triples, labels, adj)
+    assert set(grads) == set(model.params)
+
+    rng = np.random.default_rng(1)
+    eps = 1e-6
+    for name, param in model.params.items():
+        # a few random coordinates of each parameter
+        for index in zip(*(rng.integers(0, n, 5) for n in param.shape)):
+            saved = param[index]
+            param[index] = saved + eps
+            plus, _ = loss_and_grads(model, triples, labels, adj)
+            param[index] = saved - eps
+            minus, _ = loss_and_grads(model, triples, labels, adj)
+            param[index] = saved
+            numeric = (plus - minus) / (2 * eps)
+            assert grads[name][index] == pytest.approx(numeric, rel=1e-4, abs=1e-7), (name, index)
+
+
+def test_fanout_keeps_at_most_fanout_edges_per_entity():
+    model = RGCN(TRIPLETS, emb_dim=4, seed=0)
+    edges = model.sample_neighbors(2)
+    assert np.all(np.bincount(model.dst[edges], minlength=len(model.ent2id)) <= 2)
+    assert np.all(np.diff(edges) > 0)
+
+
+def test_train_counts_additive_epochs():
+    model = RGCN(TRIPLETS, emb_dim=4, seed=0)
+    model.train(epochs=2, batch_size=16)
+    model.train(epochs=1, batch_size=16)
+    assert model.epoch == 3
+    model.train(until_epoch=3)
+    assert model.epoch == 3
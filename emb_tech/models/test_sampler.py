@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from sampler import NegativeSampler
+
+
+def triplets(n=200, n_ent=30, n_rel=4, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.unique(np.stack([rng.integers(0, n_ent, n), rng.integers(0, n_rel, n), rng.integers(0, n_ent, n)], axis=1), axis=0)
+
+
+@pytest.mark.parametrize("mode", ["unif", "bern"])
+def test_one_column_changes_never_to_the_original(mode):
+    ids = triplets()
+    sampler = NegativeSampler(ids, 30, 4, mode=mode, rng=np.random.default_rng(1))
+    neg = sampler.sample(ids, k=5)
+    assert neg.shape == (len(ids), 5, 3)
+    changed = neg != ids[:, None, :]
+    assert np.all(changed.sum(axis=2) == 1)
+    assert not changed[..., 1].any()
+
+
+def test_replacements_are_uniform():
+    ids = np.array([[0, 0, 0]])
+    sampler = NegativeSampler(ids, 5, 1, rng=np.random.default_rng(2))
+    neg = sampler.sample(np.repeat(ids, 4000, axis=0))[:, 0]
+    drawn = np.where(neg[:, 0] != 0, neg[:, 0], neg[:, 2])
+    counts = np.bincount(drawn, minlength=5)
+    assert counts[0] == 0
+    assert np.all(np.abs(counts[1:] / counts.sum() - 0.25) < 0.03)
+
+
+def test_filtered_negatives_are_not_known():
+    # dense enough for single draws to hit known triplets
+    ids = triplets(n=400, n_ent=16, n_rel=2)
+    sampler = NegativeSampler(ids, 16, 2, filtered=True, rng=np.random.default_rng(3))
+    neg = sampler.sample(ids, k=3, max_tries=1).reshape(-1, 3)
+    assert not sampler.is_known(neg).any()
+    assert sampler.unfiltered == 0
+
+
+def test_no_valid_corruption_is_counted():
+    # every (0, 0, e) and (e, 0, 0) is known
+    ids = np.array([(0, 0, e) for e in range(3)] + [(e, 0, 0) for e in range(1, 3)])
+    sampler = NegativeSampler(ids, 3, 1, filtered=True, rng=np.random.default_rng(4))
+    neg = sampler.sample(np.array([[0, 0, 0]]), k=1)
+    assert np.array_equal(neg[0, 0], [0, 0, 0])
+    assert sampler.unfiltered == 1
+
+
+def test_bernoulli_favours_the_head_of_one_to_many_relations():
+    # relation 0: one head, many tails
+    ids = np.array([(0, 0, t) for t in range(1, 10)])
+    sampler = NegativeSampler(ids, 10, 1, mode="bern")
+    assert sampler.head_prob[0] == pytest.approx(0.9)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from r_gcn import RGCN
+from rotatE import RotatE
+from transE import TransE
+from vocab import index_triplets
+
+TRIPLETS = [(f"e{(i * 11) % 23}", f"r{i % 4}", f"e{(i * 5 + 3) % 23}") for i in range(80)]
+
+
+def store_ids(triplets):
+    """
+    Ids in first-seen order over a vocabulary with extra unused labels, like a
+    TripleStore holding other splits.
+    """
+    entities, relations = ["unused"], ["unused"]
+    for h, r, t in triplets:
+        for label, labels in ((h, entities), (r, relations), (t, entities)):
+            if label not in labels:
+                labels.append(label)
+    ids = np.array([(entities.index(h), relations.index(r), entities.index(t)) for h, r, t in triplets],
+                   dtype=np.int32)
+    return ids, entities, relations
+
+
+def test_ids_and_labels_give_the_same_index():
+    ids, entities, relations = store_ids(TRIPLETS)
+    id2ent, id2rel, triplet_ids = index_triplets(TRIPLETS)
+    assert id2ent == sorted({h for h, _, _ in TRIPLETS} | {t for _, _, t in TRIPLETS})
+    from_ids = index_triplets(ids, entities, relations)
+    assert from_ids[0] == id2ent
+    assert from_ids[1] == id2rel
+    assert np.array_equal(from_ids[2], triplet_ids)
+
+
+@pytest.mark.parametrize("cls", [TransE, RotatE])
+def test_models_from_ids_train_the_same(cls):
+    ids, entities, relations = store_ids(TRIPLETS)
+    a = cls(TRIPLETS, emb_dim=8, seed=0)
+    b = cls(ids, emb_dim=8, seed=0, entities=entities, relations=relations)
+    for model in (a, b):
+        model.train(1)
+        model.train_batch(1, batch_size=16)
+    assert a.ent2id == b.ent2id and a.rel2id == b.rel2id
+    assert np.array_equal(a.ent_emb, b.ent_emb)
+
+
+def test_rgcn_from_ids_trains_the_same():
+    ids, entities, relations = store_ids(TRIPLETS)
+    a = RGCN(TRIPLETS, emb_dim=4, seed=0)
+    b = RGCN(ids, emb_dim=4, seed=0, entities=entities, relations=relations)
+    a.train(1, batch_size=32)
+    b.train(1, batch_size=32)
+    assert np.array_equal(a.ent_out, b.ent_out)
@@ -1,29 +1,58 @@
 import numpy as np
 import random
 
+from sampler import NegativeSampler
+from vocab import index_triplets
+from hogwild import train_hogwild
+from checkpoint import save_checkpoint, load_checkpoint
+
+# max number of floats of the intermediate array when scoring against all entities
+MAX_ELEMENTS = 2 ** 24
+
 class TransE:
-    def __init__(self, triplets, emb_dim=50, lr=0.01, margin=1.0, norm="L1"):
-        self.triplets = triplets
+    # constructor arguments saved in checkpoints
+    checkpoint_params = ("emb_dim", "lr", "margin", "norm")
+
+    def __init__(self, triplets, emb_dim=50, lr=0.01, margin=1.0, norm="L1", seed=None,
+                 sampling="unif", n_neg=1, filter_negatives=False, entities=None, relations=None):
+        """
+        triplets are (h, r, t) label tuples, or an (N, 3) id array with the entities
+        and relations vocabularies it indexes (e.g. a TripleStore split).
+        """
         self.emb_dim = emb_dim
         self.lr = lr
         self.margin = margin
         self.norm = norm
+        self.rng = np.random.default_rng(seed)
+        # python RNG of the negatives of train, saved in checkpoints
+        self.py_rng = random.Random(seed)
+        # epochs done, training resumes from there
+        self.epoch = 0
+
+        self.id2ent, id2rel, self.triplet_ids = index_triplets(triplets, entities, relations)
+        self.entities = set(self.id2ent)
+        self.rel = set(id2rel)
 
-        self.entities = set([h for h,_,t in triplets] + [t for h,_,t in triplets])
-        self.rel = set([r for _,r,_ in triplets])
+        # contiguous embedding matrices indexed by integer ids
+        self.ent2id = {e: i for i, e in enumerate(self.id2ent)}
+        self.rel2id = {r: i for i, r in enumerate(id2rel)}
+        self.ent_emb = self.init_emb(len(self.ent2id))
+        self.rel_emb = self.init_emb(len(self.rel2id))
 
-        self.ent2vec = {
-            e: self.init_emb() for e in self.entities
-        }
+        # per-label views on the matrix rows, they stay in sync with in-place updates
+        self.ent2vec = {e: self.ent_emb[i] for e, i in self.ent2id.items()}
+        self.rel2vec = {r: self.rel_emb[i] for r, i in self.rel2id.items()}
 
-        self.rel2vec = {
-            r: self.init_emb() for r in self.rel
-        }
+        self.n_neg = n_neg
+        self.sampler = NegativeSampler(self.triplet_ids, len(self.ent2id), len(self.rel2id),
+                                       mode=sampling, filtered=filter_negatives, rng=self.rng)
 
 
-    def init_emb(self):
+    def init_emb(self, n=None):
         l = 6 / (np.sqrt(self.emb_dim))
-        return np.random.uniform(-l, l, self.emb_dim)
+        if n is None:
+            return self.rng.uniform(-l, l, self.emb_dim)
+        return self.rng.uniform(-l, l, (n, self.emb_dim))
 
 
     def dist(self, h, r, t):
@@ -33,26 +62,67 @@ class TransE:
             return np.linalg.norm(h+r-t)
 
 
+    def batch_dist(self, diff):
+        if self.norm == "L1":
+            return np.abs(diff).sum(axis=1)
+        elif self.norm == "L2":
+            return np.linalg.norm(diff, axis=1)
+
+
+    def batch_grad(self, diff):
+        """
+        Gradient of the distance with respect to h+r-t, one row per triplet.
+        """
+        if self.norm == "L1":
+            return np.sign(diff)
+        elif self.norm == "L2":
+            return diff / np.maximum(np.linalg.norm(diff, axis=1, keepdims=True), 1e-12)
+
+
     def normalize(self, vec):
         return vec / (np.linalg.norm(vec))
-    
+
+
+    def normalize_rows(self, emb, ids):
+        rows = emb[ids]
+        emb[ids] = rows / np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-12)
+
 
     def corrupt_triplets(self, h, r, t):
-        corrupt_h = random.random() < 0.5
+        corrupt_h = self.py_rng.random() < 0.5
         if corrupt_h:
-            h_corr = random.choice(list(self.entities - {h}))
+            h_corr = self.random_entity_except(h)
             return (h_corr, r, t)
         else:
-            t_corr = random.choice(list(self.entities - {t}))
+            t_corr = self.random_entity_except(t)
             return (h, r, t_corr)
-        
 
-    def train(self, epochs=100):
-        for e in range(epochs):
-            random.shuffle(self.triplets)
+
+    def random_entity_except(self, ent):
+        # rejection sampling, no copy of the entity set per call
+        if len(self.id2ent) < 2:
+            return ent
+        while True:
+            candidate = self.py_rng.choice(self.id2ent)
+            if candidate != ent:
+                return candidate
+
+
+    def train(self, epochs=100, checkpoint_path=None, checkpoint_every=1, until_epoch=None):
+        """
+        Trains epochs more epochs, or up to until_epoch in total, with a checkpoint
+        every checkpoint_every epochs when checkpoint_path is set. The triplets are
+        visited in a permutation of the model's RNG, so that a resumed run is the
+        same as an uninterrupted one.
+        """
+        epoch_range = self.epoch_range(epochs, until_epoch)
+        id2rel = sorted(self.rel2id, key=self.rel2id.get)
+        for e in epoch_range:
             total_loss = 0
 
-            for h, r, t in self.triplets:
+            for i in self.rng.permutation(len(self.triplet_ids)):
+                h, r, t = self.triplet_ids[i]
+                h, r, t = self.id2ent[h], id2rel[r], self.id2ent[t]
                 h_c, r_c, t_c = self.corrupt_triplets(h, r, t)
 
                 h_vec = self.ent2vec[h]
@@ -79,26 +149,171 @@ class TransE:
                    self.ent2vec[h_c] += self.lr * grad_c
                    self.ent2vec[t_c] -= self.lr * grad_c
 
+                   # in place, so that ent_emb/rel_emb see the update
                    for ent in [h, t, h_c, t_c]:
-                       self.ent2vec[ent] = self.normalize(self.ent2vec[ent])
-                   self.rel2vec[r] = self.normalize(self.rel2vec[r])
+                       self.ent2vec[ent][:] = self.normalize(self.ent2vec[ent])
+                   self.rel2vec[r][:] = self.normalize(self.rel2vec[r])
+
+            print(f"Epoch {e+1}/{epoch_range.stop}, Loss: {total_loss:.4f}")
+            self.epoch = e + 1
+            self.checkpoint(checkpoint_path, checkpoint_every)
+
+
+    def train_batch(self, epochs=100, batch_size=1024, checkpoint_path=None, checkpoint_every=1, until_epoch=None):
+        """
+        Mini-batched training on the embedding matrices: negatives are sampled
+        for the whole batch, margin losses and gradients are computed with array
+        operations and the updates are scattered with np.add.at.
+        Same epoch counting and checkpoints as train.
+        """
+        epoch_range = self.epoch_range(epochs, until_epoch)
+        for e in epoch_range:
+            order = self.rng.permutation(len(self.triplet_ids))
+            total_loss = 0.0
+
+            for start in range(0, len(order), batch_size):
+                total_loss += self.train_step(self.triplet_ids[order[start:start + batch_size]])
+
+            print(f"Epoch {e+1}/{epoch_range.stop}, Loss: {total_loss:.4f}")
+            self.epoch = e + 1
+            self.checkpoint(checkpoint_path, checkpoint_every)
+
+
+    def train_parallel(self, epochs=100, batch_size=1024, workers=None, checkpoint_path=None, checkpoint_every=1,
+                       until_epoch=None):
+        """
+        Hogwild training: worker processes share the embedding matrices and train
+        on disjoint shards of each epoch without locks (see hogwild.py).
+        """
+        train_hogwild(self, epochs, batch_size, workers, checkpoint_path, checkpoint_every, until_epoch)
+
+
+    def save(self, path):
+        """
+        Checkpoint of the model, see checkpoint.py.
+        """
+        save_checkpoint(self, path)
+
+
+    @classmethod
+    def load(cls, path, training=True):
+        """
+        Model of a checkpoint, training=False only loads what scoring needs.
+        """
+        return load_checkpoint(cls, path, training)
+
 
-            print(f"Epoch {e+1}/{epochs}, Loss: {total_loss:.4f}")
+    def checkpoint(self, path, every):
+        if path and (self.epoch % every == 0):
+            save_checkpoint(self, path)
+
+
+    def epoch_range(self, epochs, until_epoch=None):
+        """
+        Epochs to run: epochs more, or up to until_epoch in total (a resumed model
+        then only runs the missing ones).
+        """
+        last = self.epoch + epochs if until_epoch is None else until_epoch
+        if last <= self.epoch:
+            print(f"Already trained for {self.epoch} epochs, no epoch to run")
+        return range(self.epoch, last)
+
+
+    def train_step(self, batch):
+        """
+        One SGD step on a (B, 3) array of triplet ids, returns the batch loss.
+        """
+        # k negatives per positive, the positives are repeated to match
+        neg = self.sampler.sample(batch, self.n_neg).reshape(-1, 3)
+        batch = np.repeat(batch, self.n_neg, axis=0)
+        h, r, t = batch[:, 0], batch[:, 1], batch[:, 2]
+        h_c, t_c = neg[:, 0], neg[:, 2]
+
+        pos_diff = self.ent_emb[h] + self.rel_emb[r] - self.ent_emb[t]
+        neg_diff = self.ent_emb[h_c] + self.rel_emb[r] - self.ent_emb[t_c]
+
+        loss = np.maximum(0, self.margin + self.batch_dist(pos_diff) - self.batch_dist(neg_diff))
+        active = loss > 0
+        if not active.any():
+            return 0.0
+
+        grad = self.lr * self.batch_grad(pos_diff[active])
+        grad_c = self.lr * self.batch_grad(neg_diff[active])
+        h, r, t, h_c, t_c = h[active], r[active], t[active], h_c[active], t_c[active]
+
+        np.add.at(self.ent_emb, h, -grad)
+        np.add.at(self.ent_emb, t, grad)
+        np.add.at(self.rel_emb, r, grad_c - grad)
+        np.add.at(self.ent_emb, h_c, grad_c)
+        np.add.at(self.ent_emb, t_c, -grad_c)
+
+        self.normalize_rows(self.ent_emb, np.unique(np.concatenate([h, t, h_c, t_c])))
+        self.normalize_rows(self.rel_emb, np.unique(r))
+
+        return float(loss.sum())
+
+    def tail_queries(self, h, r):
+        """
+        Query vectors h + r of (h, r, ?): the distance of (h, r, e) is ||q - e||.
+        """
+        return self.ent_emb[h] + self.rel_emb[r]
+
+
+    def head_queries(self, r, t):
+        """
+        Query vectors t - r of (?, r, t): ||e + r - t|| = ||e - (t - r)||.
+        """
+        return self.ent_emb[t] - self.rel_emb[r]
+
+
+    def score_tails(self, h, r):
+        """
+        Distances of (h, r, e) for every entity e, as a (B, n_ent) array.
+        """
+        return self.batch_scores(self.tail_queries(h, r))
+
+
+    def score_heads(self, r, t):
+        """
+        Distances of (e, r, t) for every entity e.
+        """
+        return self.batch_scores(self.head_queries(r, t))
+
+
+    def candidate_scores(self, queries, candidates):
+        """
+        Distances between each query and its own (B, C) candidate entity ids.
+        """
+        diff = queries[:, None, :] - self.ent_emb[candidates]
+        if self.norm == "L1":
+            return np.abs(diff).sum(axis=2)
+        return np.linalg.norm(diff, axis=2)
+
+
+    def batch_scores(self, queries):
+        if self.norm == "L2":
+            # ||q - e||^2 = ||q||^2 + ||e||^2 - 2 q.e, a single matrix product
+            sq = ((queries ** 2).sum(axis=1)[:, None] + (self.ent_emb ** 2).sum(axis=1)[None, :]
+                  - 2 * queries @ self.ent_emb.T)
+            return np.sqrt(np.maximum(sq, 0))
+
+        # L1 has no product form, bound the (rows, n_ent, dim) intermediate array
+        n_ent = len(self.ent_emb)
+        step = max(1, MAX_ELEMENTS // max(n_ent * self.emb_dim, 1))
+        scores = np.empty((len(queries), n_ent))
+        for start in range(0, len(queries), step):
+            chunk = queries[start:start + step]
+            scores[start:start + step] = np.abs(chunk[:, None, :] - self.ent_emb[None, :, :]).sum(axis=2)
+        return scores
 
     def get_ent_emb(self, ent):
         return self.ent2vec.get(ent)
-    
+
     def get_rel_emb(self, rel):
         return self.rel2vec.get(rel)
-    
+
     def score(self, h, r, t):
         h_vec = self.ent2vec[h]
         r_vec = self.rel2vec[r]
         t_vec = self.ent2vec[t]
         return self.dist(h_vec, r_vec, t_vec)
-
-
-
-
-        
-                 
\ No newline at end of file
@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def index_triplets(triplets, entities=None, relations=None):
+    """
+    (id2ent, id2rel, triplet_ids) of the training triplets of a model.
+    triplets are (h, r, t) label tuples, or an (N, 3) id array into the entities
+    and relations label lists (a TripleStore split and its vocabularies). Either
+    way only the labels used by the triplets get an id, in label order, so both
+    inputs build the same model.
+    """
+    if entities is None:
+        id2ent = sorted(set([h for h,_,t in triplets] + [t for h,_,t in triplets]))
+        id2rel = sorted(set([r for _,r,_ in triplets]))
+        ent2id = {e: i for i, e in enumerate(id2ent)}
+        rel2id = {r: i for i, r in enumerate(id2rel)}
+        triplet_ids = np.array(
+            [(ent2id[h], rel2id[r], ent2id[t]) for h, r, t in triplets],
+            dtype=np.int64
+        ).reshape(-1, 3)
+        return id2ent, id2rel, triplet_ids
+
+    ids = np.asarray(triplets, dtype=np.int64).reshape(-1, 3)
+    id2ent, ent_map = used_labels(ids[:, [0, 2]], entities)
+    id2rel, rel_map = used_labels(ids[:, 1], relations)
+    triplet_ids = np.stack([ent_map(ids[:, 0]), rel_map(ids[:, 1]), ent_map(ids[:, 2])], axis=1)
+    return id2ent, id2rel, triplet_ids
+
+
+def used_labels(ids, labels):
+    """
+    Sorted labels of the ids used, and the function mapping the ids to their
+    position in them.
+    """
+    used = np.unique(ids)
+    names = [str(labels[i]) for i in used.tolist()]
+    order = sorted(range(len(used)), key=names.__getitem__)
+    new_ids = np.empty(len(used), dtype=np.int64)
+    new_ids[order] = np.arange(len(used))
+    return [names[i] for i in order], lambda x: new_ids[np.searchsorted(used, x)]
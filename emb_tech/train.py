@@ -4,31 +4,28 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), './data')))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), './models')))
 
-from data_process import load_triplets_from_file, filter_triplets
+from triple_store import load_dataset
 from transE import TransE
 from rotatE import RotatE, eval
 from r_gcn import RGCN
 
 def main():
     data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), './data/FB15k'))
-    train_file = os.path.join(data_dir, 'train.txt')
-    test_file = os.path.join(data_dir, 'test.txt')
-    valid_file = os.path.join(data_dir, "valid.txt")
-
-    train_triplets = load_triplets_from_file(train_file)[:10000] 
-    #model = TransE(train_triplets, emb_dim=100, lr=0.01, margin=1.0)
-    #model = RotatE(train_triplets, emb_dim=100, lr=0.01, gamma=6.0)
-    model = RGCN(train_triplets, emb_dim=32, nlayers=2)
-    #model.train(epochs=50)
-
-    test_triplets = load_triplets_from_file(test_file)[:1000]
-    #filtered_test = filter_triplets(test_triplets, model.ent2vec.keys(), model.rel2vec.keys())
-    #filtered_test = filter_triplets(test_triplets, model.ent2vec.keys(), model.rel2phase.keys())
-    filtered_test = filter_triplets(test_triplets, model.ent2id.keys(), model.rel2id.keys())
-
-    valid_triplets = load_triplets_from_file(valid_file)
-    #valid_triplets = filter_triplets(valid_triplets, model.ent2vec.keys(), model.rel2vec.keys())
-    valid_triplets = filter_triplets(valid_triplets, model.ent2vec.keys(), model.rel2phase.keys())
+    # train/valid/test.txt interned once, then reloaded from data/FB15k/cache
+    store = load_dataset(data_dir)
+    vocab = {"entities": store.entities, "relations": store.relations}
+
+    train_ids = store.splits["train"][:10000]
+    #model = TransE(train_ids, emb_dim=100, lr=0.01, margin=1.0, **vocab)
+    #model = RotatE(train_ids, emb_dim=100, lr=0.01, gamma=6.0, **vocab)
+    model = RGCN(train_ids, emb_dim=32, nlayers=2, **vocab)
+    model.train(epochs=50)
+
+    # the model only knows the entities and relations of its training triplets
+    ent_ids = store.entity_ids(model.id2ent)
+    rel_ids = store.relation_ids(model.rel2id)
+    filtered_test = store.labels(store.filter(store.splits["test"][:1000], ent_ids, rel_ids))
+    valid_triplets = store.labels(store.filter(store.splits["valid"], ent_ids, rel_ids))
 
     eval_sub = filtered_test[:100]
     mrr, hits = eval(model, eval_sub)